@@ -0,0 +1,180 @@
+"""
+Account deletion in two steps.
+
+Deleting a user only tombstones it: the User row gets a `deletedAt` timestamp and a DeletionJob row, in one short
+transaction, and the user disappears from every lookup right away. The deletion engine then removes the user's
+Interaction rows in bounded chunks from a background task, recording its progress on the job after every chunk, and
+finally purges the User row and its rollups. No single statement ever holds locks on more than one chunk of rows.
+
+Jobs live in the database, so deletions interrupted by a restart are resumed by whichever worker polls next. A worker
+claims the jobs it works on and renews its claim after every chunk, so workers never purge the same user at once; a
+claim that has not been renewed for `lease` seconds, e.g. because its worker died, is taken over by the next poll.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from typing import Collection, Optional
+
+import project.auth
+import project.getUserDetails_service
+import project.interaction_writer
+import project.storage
+import project.user_repository
+
+logger = logging.getLogger(__name__)
+
+
+class DeletionEngine:
+    """
+    Background task that purges the data of tombstoned users.
+
+    Every `poll_interval` seconds, or as soon as `wake` is called, it claims the open deletion jobs. For each job it
+    deletes up to `chunk_size` Interaction rows per transaction, sleeping `chunk_pause` seconds between chunks so
+    that other queries get the database in between, and then purges the user.
+    """
+
+    def __init__(
+        self, chunk_size: int, chunk_pause: float, poll_interval: float, lease: float
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.worker = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._pending = 0
+        self._chunks = 0
+        self._interactions_deleted = 0
+        self._users_purged = 0
+        self._failures = 0
+
+    @classmethod
+    def from_env(cls) -> "DeletionEngine":
+        return cls(
+            chunk_size=int(os.getenv("DELETION_CHUNK_SIZE", "1000")),
+            chunk_pause=float(os.getenv("DELETION_CHUNK_PAUSE", "0.05")),
+            poll_interval=float(os.getenv("DELETION_POLL_INTERVAL", "60")),
+            lease=float(os.getenv("DELETION_LEASE", "300")),
+        )
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def purge(self, user_id: int) -> int:
+        """
+        Deletes every Interaction row of a tombstoned user chunk by chunk, then the user itself.
+
+        Args:
+            user_id (int): The tombstoned user.
+
+        Returns:
+            int: The number of Interaction rows deleted.
+        """
+        deleted = 0
+        while True:
+            chunk = await project.storage.backend.delete_interactions_chunk(
+                user_id, self.chunk_size
+            )
+            deleted += chunk
+            self._chunks += 1
+            self._interactions_deleted += chunk
+            if chunk < self.chunk_size:
+                break
+            await asyncio.sleep(self.chunk_pause)
+        await project.storage.backend.purge_user(user_id)
+        self._users_purged += 1
+        return deleted
+
+    async def run_once(self) -> int:
+        """
+        Claims the open deletion jobs and works through them once. A job that fails stays claimed and is retried
+        once its lease runs out.
+
+        Returns:
+            int: The number of users purged.
+        """
+        user_ids = await project.storage.backend.claim_deletions(
+            self.worker, self.lease
+        )
+        self._pending = len(user_ids)
+        purged = 0
+        for user_id in user_ids:
+            try:
+                deleted = await self.purge(user_id)
+            except Exception:
+                # Typically rows of the user that were still being flushed; the job is retried on the next run.
+                self._failures += 1
+                logger.exception("Failed to purge deleted user %d", user_id)
+                continue
+            purged += 1
+            self._pending -= 1
+            logger.info("Purged deleted user %d and %d interactions", user_id, deleted)
+        return purged
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                self._failures += 1
+                logger.exception("Failed to list pending account deletions")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            # A fresh event, as the app may be started again on another event loop. The first run needs no wakeup.
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the background task. A purge interrupted here resumes from its last completed chunk on the next start.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": self._pending,
+            "chunks": self._chunks,
+            "interactions_deleted": self._interactions_deleted,
+            "users_purged": self._users_purged,
+            "failures": self._failures,
+        }
+
+
+deletion_engine = DeletionEngine.from_env()
+
+
+async def delete_users(user_ids: Collection[int]) -> list[int]:
+    """
+    Deletes users: drops their buffered interactions, tombstones them, which also revokes their tokens like
+    `project.auth.revoke_user_tokens` but in the same UPDATE, drops their cached tokens and details ETags and wakes
+    the deletion engine to purge their data in the background.
+
+    Args:
+        user_ids (Collection[int]): The users to delete.
+
+    Returns:
+        list[int]: The ids of the users that existed and are now deleted.
+    """
+    project.interaction_writer.interaction_buffer.discard_users(set(user_ids))
+    deleted = await project.user_repository.tombstone_users(list(user_ids))
+    for user_id in deleted:
+        project.auth.invalidate_user(user_id)
+        project.getUserDetails_service.details_etags.invalidate(user_id)
+    if deleted:
+        deletion_engine.wake()
+    return deleted
@@ -0,0 +1,277 @@
+"""
+Admission control: per-route concurrency limits, bounded wait queues and priority scheduling.
+
+Every route belongs to a class. Each class has its own concurrency limit, a bounded queue of requests waiting for a
+slot and the longest time a request may wait. All classes also share a global concurrency limit; when a slot frees
+up, waiting requests are admitted in priority order, so cheap reads get ahead of bcrypt-bound and write-heavy work.
+
+    read   GET /hello-world, /user/details, /interactions, /interactions/stats    priority 0 (first)
+    write  /cli/hello-world, /user/update, /user/delete, /interactions/export     priority 1
+    auth   /login, /register, /register/bulk, /user/delete/bulk                   priority 2 (last)
+
+A request is shed with 503 and a `Retry-After` header when its class queue is full, or when it has not been admitted
+by its deadline (the class's maximum wait). Routes without a class, such as /ready and /metrics, are never queued.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Any, Optional
+
+import project.instrumentation
+import project.responses
+
+ROUTE_CLASSES = {
+    "/hello-world": "read",
+    "/user/details": "read",
+    "/interactions": "read",
+    "/interactions/stats": "read",
+    "/cli/hello-world": "write",
+    "/user/update": "write",
+    "/user/delete": "write",
+    "/interactions/export": "write",
+    "/login": "auth",
+    "/register": "auth",
+    "/register/bulk": "auth",
+    "/user/delete/bulk": "auth",
+}
+
+# name: (priority, concurrency, queue size, maximum wait in seconds). The class limits add up to the default
+# ADMISSION_MAX_CONCURRENCY, so a burst of reads cannot take the slots writes and logins need.
+DEFAULT_CLASSES = {
+    "read": (0, 160, 1024, 1.0),
+    "write": (1, 64, 256, 2.0),
+    "auth": (2, 32, 128, 2.0),
+}
+
+
+class AdmissionShedError(Exception):
+    """
+    Raised when a request is not admitted: its class queue is full or its deadline passed while it was waiting.
+    """
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RouteClass:
+    """
+    Limits and counters of one priority class.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        concurrency: int,
+        queue_size: int,
+        max_wait: float,
+    ) -> None:
+        self.name = name
+        self.priority = priority
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.running = 0
+        self.queued = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.service_seconds_total = 0.0
+        self.completed = 0
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        priority: int,
+        concurrency: int,
+        queue_size: int,
+        max_wait: float,
+    ) -> "RouteClass":
+        prefix = f"ADMISSION_{name.upper()}"
+        return cls(
+            name=name,
+            priority=priority,
+            concurrency=int(os.getenv(f"{prefix}_CONCURRENCY", str(concurrency))),
+            queue_size=int(os.getenv(f"{prefix}_QUEUE_SIZE", str(queue_size))),
+            max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+        )
+
+    def retry_after(self) -> float:
+        """
+        Estimates how long the current backlog of this class takes to drain, from its average service time.
+        """
+        if not self.completed:
+            return self.max_wait
+        average = self.service_seconds_total / self.completed
+        return average * (self.queued + self.running) / max(self.concurrency, 1)
+
+    def stats(self) -> dict[str, float]:
+        waited = self.admitted + self.shed_deadline
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline,
+            "queue_seconds_total": self.queue_seconds_total,
+            "queue_seconds_max": self.queue_seconds_max,
+            "queue_seconds_avg": self.queue_seconds_total / waited if waited else 0.0,
+        }
+
+
+class AdmissionController:
+    """
+    Admits requests of the route classes under their own and the global concurrency limit, queueing the rest in
+    priority order.
+    """
+
+    def __init__(self, classes: list[RouteClass], max_concurrency: int) -> None:
+        self.classes = {route_class.name: route_class for route_class in classes}
+        self.max_concurrency = max_concurrency
+        self.running = 0
+        # (priority, arrival, future, class) of the requests waiting for a slot.
+        self._waiters: list[tuple[int, int, asyncio.Future, RouteClass]] = []
+        self._arrivals = itertools.count()
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            classes=[
+                RouteClass.from_env(name, *defaults)
+                for name, defaults in DEFAULT_CLASSES.items()
+            ],
+            max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "256")),
+        )
+
+    def _has_capacity(self, route_class: RouteClass) -> bool:
+        return (
+            self.running < self.max_concurrency
+            and route_class.running < route_class.concurrency
+        )
+
+    def _start(self, route_class: RouteClass) -> None:
+        self.running += 1
+        route_class.running += 1
+
+    def _dispatch(self) -> None:
+        # Admits waiters in priority order. A class at its own limit does not hold back lower-priority classes.
+        blocked = []
+        while self._waiters and self.running < self.max_concurrency:
+            waiter = heapq.heappop(self._waiters)
+            _, _, future, route_class = waiter
+            if future.done():
+                continue
+            if route_class.running >= route_class.concurrency:
+                blocked.append(waiter)
+                continue
+            self._start(route_class)
+            future.set_result(None)
+        for waiter in blocked:
+            heapq.heappush(self._waiters, waiter)
+
+    async def acquire(self, route_class: RouteClass) -> None:
+        """
+        Waits for a slot of `route_class`.
+
+        Raises:
+            AdmissionShedError: If the class queue is full, or no slot was free within the class's maximum wait.
+        """
+        # Every release dispatches the waiters, so whoever is still waiting is held back by its own class limit.
+        if self._has_capacity(route_class):
+            self._start(route_class)
+            route_class.admitted += 1
+            return
+        if route_class.queued >= route_class.queue_size:
+            route_class.shed_queue_full += 1
+            raise AdmissionShedError("Server is overloaded.", route_class.retry_after())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(
+            self._waiters,
+            (route_class.priority, next(self._arrivals), future, route_class),
+        )
+        route_class.queued += 1
+        self._dispatch()
+        started = time.perf_counter()
+        try:
+            with project.instrumentation.phase("admission_queue"):
+                await asyncio.wait_for(asyncio.shield(future), route_class.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Admitted just as the request was cancelled; hand the slot on.
+                self.release(route_class, 0.0)
+            raise
+        finally:
+            # A slot may have been granted between the timeout and this point.
+            admitted = future.done() and not future.cancelled()
+            future.cancel()
+            route_class.queued -= 1
+            waited = time.perf_counter() - started
+            route_class.queue_seconds_total += waited
+            route_class.queue_seconds_max = max(route_class.queue_seconds_max, waited)
+        if not admitted:
+            route_class.shed_deadline += 1
+            raise AdmissionShedError(
+                "Request could not be admitted before its deadline.",
+                route_class.retry_after(),
+            )
+        route_class.admitted += 1
+
+    def release(self, route_class: RouteClass, service_seconds: float) -> None:
+        self.running -= 1
+        route_class.running -= 1
+        route_class.completed += 1
+        route_class.service_seconds_total += service_seconds
+        self._dispatch()
+
+    def stats(self) -> dict[str, float]:
+        stats: dict[str, float] = {"running": self.running}
+        for name, route_class in self.classes.items():
+            for key, value in route_class.stats().items():
+                stats[f"{name}_{key}"] = value
+        return stats
+
+
+admission_controller = AdmissionController.from_env()
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying `admission_controller` to the routes in ROUTE_CLASSES.
+    """
+
+    def __init__(
+        self, app: Any, controller: Optional[AdmissionController] = None
+    ) -> None:
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        name = ROUTE_CLASSES.get(scope["path"]) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classes[name]
+        try:
+            await self.controller.acquire(route_class)
+        except AdmissionShedError as e:
+            await project.responses.error_response(
+                str(e),
+                503,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(route_class, time.perf_counter() - started)
@@ -0,0 +1,193 @@
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import jwt
+import prisma
+import prisma.enums
+import project.instrumentation
+import project.user_repository
+from fastapi import Header, HTTPException
+from pydantic import BaseModel
+
+SECRET_KEY = os.getenv("JWT_SECRET", "your_jwt_secret_here")
+
+ALGORITHM = "HS256"
+
+TOKEN_LIFETIME = timedelta(days=2)
+
+
+class TokenClaims(BaseModel):
+    """
+    The verified claims of an authentication token issued by loginUser.
+    """
+
+    user_id: int
+    email: str
+    role: prisma.enums.Role
+    exp: int
+
+
+class TokenCache:
+    """
+    LRU cache of verified tokens. Each entry lives until the token's `exp` or `ttl` seconds, whichever comes first.
+    A token revoked by another worker process stops verifying here once its entry expires and the user is re-read,
+    and the user may itself be served from the user cache: revocations propagate across workers within
+    JWT_CACHE_TTL + USER_CACHE_TTL seconds. In the worker that revokes, they apply immediately.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[TokenClaims, float]] = OrderedDict()
+        self._tokens_by_user: dict[int, set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[TokenClaims]:
+        entry = self._entries.get(token)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            self._remove(token)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(token)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: TokenClaims) -> None:
+        self._entries[token] = (claims, min(claims.exp, time.time() + self.ttl))
+        self._entries.move_to_end(token)
+        self._tokens_by_user.setdefault(claims.user_id, set()).add(token)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, token: str) -> None:
+        claims, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(claims.user_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[claims.user_id]
+
+    def forget_user(self, user_id: int) -> None:
+        for token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(token)
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(
+    max_size=int(os.getenv("JWT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("JWT_CACHE_TTL", "60")),
+)
+
+
+def issue_token(user: project.user_repository.UserRecord) -> str:
+    """
+    Issues a signed authentication token for a user. The token carries the user's current token version so that it
+    stops verifying once the user's tokens are revoked.
+
+    Args:
+        user (project.user_repository.UserRecord): The authenticated user.
+
+    Returns:
+        str: The encoded HS256 token.
+    """
+    payload = {
+        "user_id": user.id,
+        "email": user.email,
+        "role": user.role.name,
+        "ver": user.tokenVersion,
+        "exp": datetime.utcnow() + TOKEN_LIFETIME,
+    }
+    with project.instrumentation.phase("jwt"):
+        return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+
+
+async def verify_token(token: str) -> TokenClaims:
+    """
+    Verifies an authentication token and returns its claims.
+
+    Cached tokens are answered without touching the database. On a cache miss the signature is checked and the user
+    is loaded once to make sure it still exists and that the token has not been revoked; the role is taken from the
+    database so that role changes apply to tokens issued before them.
+
+    Args:
+        token (str): The encoded token.
+
+    Returns:
+        TokenClaims: The verified claims.
+
+    Raises:
+        jwt.PyJWTError: If the token is malformed, expired, or has been revoked.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+    with project.instrumentation.phase("jwt"):
+        data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    user = await project.user_repository.get_user_by_id(data["user_id"])
+    if user is None or user.tokenVersion != data.get("ver", 0):
+        raise jwt.InvalidTokenError("Token has been revoked.")
+    claims = TokenClaims(
+        user_id=user.id, email=user.email, role=user.role, exp=data["exp"]
+    )
+    token_cache.put(token, claims)
+    return claims
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Drops every cached token of a user, so the next request re-checks the user against the database. Call this after
+    a user is deleted or their role changes.
+
+    Args:
+        user_id (int): The user whose cached tokens should be dropped.
+    """
+    token_cache.forget_user(user_id)
+
+
+async def revoke_user_tokens(user_id: int) -> None:
+    """
+    Revokes every token issued to a user so far by bumping the user's token version. Tokens stop verifying in this
+    worker immediately and in other workers within JWT_CACHE_TTL + USER_CACHE_TTL seconds (see TokenCache).
+
+    Args:
+        user_id (int): The user whose tokens should be revoked.
+    """
+    await project.user_repository.increment_token_version(user_id)
+    invalidate_user(user_id)
+
+
+async def get_token_claims(
+    authorization: Optional[str] = Header(None),
+) -> Optional[TokenClaims]:
+    """
+    FastAPI dependency returning the verified claims of the `Authorization: Bearer <token>` header, or None if the
+    header is missing or the token does not verify.
+    """
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        return await verify_token(authorization[len("Bearer ") :])
+    except jwt.PyJWTError:
+        return None
+
+
+async def require_token_claims(
+    authorization: Optional[str] = Header(None),
+) -> TokenClaims:
+    """
+    FastAPI dependency like get_token_claims, but rejecting the request with 401 when no valid token is present.
+    """
+    claims = await get_token_claims(authorization)
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or missing token.")
+    return claims
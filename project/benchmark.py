@@ -0,0 +1,503 @@
+"""
+Load-test and micro-benchmark harness for the hello-world service.
+
+Usage:
+    python -m project.benchmark run --concurrency 16 --requests 500 --output before.json
+    python -m project.benchmark compare before.json after.json --threshold 0.10
+    python -m project.benchmark serialization
+
+`run` boots `project.server:app` in-process (lifespan included) against the database configured by DATABASE_URL,
+drives every route at the requested concurrency and then calls the service functions directly. Pass `--url` to
+drive an already running server over HTTP instead; database query counts are only available in-process. Pass
+`--sqlite PATH` to run in-process against an embedded SQLite database, with no database server needed.
+
+`compare` diffs two result files and exits with status 1 when any metric regressed by more than the threshold.
+
+`serialization` needs no database: it compares FastAPI's default response handling (re-validation against the
+response model, conversion to JSON-compatible data, then `json.dumps`) with the FAST_RESPONSES path for every
+response model. Pass `--fast-responses` to `run` to benchmark the routes in fast mode.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+import jwt
+
+ROUTES = [
+    "register",
+    "login",
+    "hello-world",
+    "cli-hello-world",
+    "user-details",
+    "user-update",
+    "user-delete",
+]
+
+PASSWORD = "benchmark-password"
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(
+    latencies: list[float], errors: int, elapsed: float, queries: Optional[int]
+) -> dict[str, Any]:
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "db_queries_per_request": (
+            queries / total if queries is not None and total else None
+        ),
+    }
+
+
+class BenchmarkUser:
+    __slots__ = ("id", "email", "token")
+
+    def __init__(self, id: int, email: str, token: str) -> None:
+        self.id = id
+        self.email = email
+        self.token = token
+
+
+class Harness:
+    def __init__(
+        self, client: httpx.AsyncClient, count_queries: Optional[Callable[[], int]]
+    ) -> None:
+        self.client = client
+        self.count_queries = count_queries
+        self.run_id = uuid.uuid4().hex[:8]
+        self._sequence = 0
+
+    def next_email(self) -> str:
+        self._sequence += 1
+        return f"bench-{self.run_id}-{self._sequence}@example.com"
+
+    def registration_params(self) -> dict[str, str]:
+        email = self.next_email()
+        return {"username": email, "password": PASSWORD, "email": email}
+
+    async def create_user(self) -> BenchmarkUser:
+        params = self.registration_params()
+        response = await self.client.post("/register", params=params)
+        response.raise_for_status()
+        email = params["email"]
+        response = await self.client.post(
+            "/login", params={"username": email, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        token = response.json()["token"]
+        claims = jwt.decode(token, options={"verify_signature": False})
+        return BenchmarkUser(claims["user_id"], email, token)
+
+    async def drive(
+        self,
+        requests: int,
+        concurrency: int,
+        make_request: Callable[[int], Awaitable[httpx.Response]],
+    ) -> dict[str, Any]:
+        latencies: list[float] = []
+        errors = 0
+        next_index = 0
+
+        async def worker() -> None:
+            nonlocal errors, next_index
+            while next_index < requests:
+                index = next_index
+                next_index += 1
+                started = time.perf_counter()
+                try:
+                    response = await make_request(index)
+                    if response.status_code >= 400 or (
+                        response.headers.get("content-type") == "application/json"
+                        and failed(response.json())
+                    ):
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        queries_before = self.count_queries() if self.count_queries else 0
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        queries = self.count_queries() - queries_before if self.count_queries else None
+        return summarize(latencies, errors, elapsed, queries)
+
+    async def run_routes(
+        self, requests: int, concurrency: int, pool_size: int
+    ) -> dict[str, Any]:
+        users = [await self.create_user() for _ in range(pool_size)]
+        doomed = [await self.create_user() for _ in range(requests)]
+        client = self.client
+
+        def user(index: int) -> BenchmarkUser:
+            return users[index % len(users)]
+
+        scenarios: dict[str, Callable[[int], Awaitable[httpx.Response]]] = {
+            "register": lambda i: client.post(
+                "/register", params=self.registration_params()
+            ),
+            "login": lambda i: client.post(
+                "/login", params={"username": user(i).email, "password": PASSWORD}
+            ),
+            "hello-world": lambda i: client.get(
+                "/hello-world",
+                params={"user_id": user(i).id},
+                headers={"Authorization": f"Bearer {user(i).token}"},
+            ),
+            "cli-hello-world": lambda i: client.post(
+                "/cli/hello-world",
+                params={
+                    "user_id": user(i).id,
+                    "token": user(i).token,
+                    "command": "hello-world",
+                },
+            ),
+            "user-details": lambda i: client.get(
+                "/user/details", params={"AuthenticationToken": str(user(i).id)}
+            ),
+            "user-update": lambda i: client.put(
+                "/user/update",
+                params={
+                    "email": user(i).email,
+                    "auth_token": user(i).token,
+                },
+            ),
+            "user-delete": lambda i: client.delete(
+                "/user/delete", params={"user_id": doomed[i].id}
+            ),
+        }
+        results = {}
+        for name in ROUTES:
+            results[name] = await self.drive(requests, concurrency, scenarios[name])
+            print(f"{name:>16}: {format_result(results[name])}", file=sys.stderr)
+        for benchmark_user in users:
+            await client.delete("/user/delete", params={"user_id": benchmark_user.id})
+        return results
+
+    async def run_services(self, iterations: int) -> dict[str, Any]:
+        import project.auth
+        import project.deleteUser_service
+        import project.executeHelloWorld_service
+        import project.getHelloWorld_service
+        import project.getUserDetails_service
+        import project.loginUser_service
+        import project.registerUser_service
+        import project.updateUserDetails_service
+
+        benchmark_user = await self.create_user()
+        claims = await project.auth.verify_token(benchmark_user.token)
+        doomed = [await self.create_user() for _ in range(iterations)]
+        calls: dict[str, Callable[[int], Awaitable[Any]]] = {
+            "registerUser": lambda i: project.registerUser_service.registerUser(
+                **self.registration_params()
+            ),
+            "loginUser": lambda i: project.loginUser_service.loginUser(
+                benchmark_user.email, PASSWORD
+            ),
+            "getHelloWorld": lambda i: project.getHelloWorld_service.getHelloWorld(
+                benchmark_user.id, claims
+            ),
+            "executeHelloWorld": lambda i: project.executeHelloWorld_service.executeHelloWorld(
+                benchmark_user.id, benchmark_user.token, "hello-world"
+            ),
+            "getUserDetails": lambda i: project.getUserDetails_service.getUserDetails(
+                str(benchmark_user.id)
+            ),
+            "updateUserDetails": lambda i: project.updateUserDetails_service.updateUserDetails(
+                benchmark_user.email, None, benchmark_user.token
+            ),
+            "deleteUser": lambda i: project.deleteUser_service.deleteUser(doomed[i].id),
+        }
+        results = {}
+        for name, call in calls.items():
+            latencies = []
+            errors = 0
+            queries_before = self.count_queries() if self.count_queries else 0
+            started = time.perf_counter()
+            for i in range(iterations):
+                call_started = time.perf_counter()
+                if failed(await call(i)):
+                    errors += 1
+                latencies.append(time.perf_counter() - call_started)
+            elapsed = time.perf_counter() - started
+            queries = (
+                self.count_queries() - queries_before if self.count_queries else None
+            )
+            results[name] = summarize(latencies, errors, elapsed, queries)
+            print(f"{name:>18}: {format_result(results[name])}", file=sys.stderr)
+        await project.deleteUser_service.deleteUser(benchmark_user.id)
+        return results
+
+
+def failed(result: Any) -> bool:
+    # Several services report failures as `success: false` in an otherwise successful response.
+    if isinstance(result, dict):
+        return result.get("success") is False
+    return getattr(result, "success", None) is False
+
+
+def format_result(result: dict[str, Any]) -> str:
+    queries = result["db_queries_per_request"]
+    return (
+        f"{result['rps']:9.1f} rps  p50 {result['p50_ms']:7.2f}ms  "
+        f"p95 {result['p95_ms']:7.2f}ms  p99 {result['p99_ms']:7.2f}ms  "
+        f"errors {result['errors']:4d}  "
+        f"queries/req {'n/a' if queries is None else format(queries, '.2f')}"
+    )
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "iterations": args.iterations,
+            "target": args.url or "in-process",
+            "fast_responses": args.fast_responses,
+            "storage": os.getenv("STORAGE_BACKEND", "prisma"),
+        }
+    }
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60) as client:
+            harness = Harness(client, None)
+            results["routes"] = await harness.run_routes(
+                args.requests, args.concurrency, args.users
+            )
+        return results
+
+    import project.instrumentation
+    import project.server
+
+    app = project.server.app
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark", timeout=60
+        ) as client:
+            harness = Harness(client, project.instrumentation.db_query_count)
+            results["routes"] = await harness.run_routes(
+                args.requests, args.concurrency, args.users
+            )
+            if args.iterations:
+                results["services"] = await harness.run_services(args.iterations)
+    return results
+
+
+def run_serialization(iterations: int) -> dict[str, Any]:
+    from datetime import datetime
+
+    import prisma.enums
+    import project.executeHelloWorld_service
+    import project.getHelloWorld_service
+    import project.getUserDetails_service
+    import project.loginUser_service
+    import project.responses
+    import project.updateUserDetails_service
+    from fastapi.responses import JSONResponse
+    from pydantic import TypeAdapter
+
+    samples = {
+        "HelloWorldResponse": project.getHelloWorld_service.HELLO_WORLD,
+        "HelloWorldCommandResponse": project.executeHelloWorld_service.HELLO_WORLD,
+        "LoginResponse": project.loginUser_service.LoginResponse(token="x" * 180),
+        "UserDetailsResponse": project.getUserDetails_service.UserDetailsResponse(
+            username="user@example.com",
+            role=prisma.enums.Role.User,
+            registration_date=datetime(2024, 1, 1),
+        ),
+        "UserProfileUpdateResponse": project.updateUserDetails_service.UserProfileUpdateResponse(
+            success=True,
+            message="User profile updated successfully.",
+            updated_user=project.updateUserDetails_service.User(
+                email="user@example.com", role=prisma.enums.Role.User
+            ),
+        ),
+    }
+    results: dict[str, Any] = {}
+    fast_mode = project.responses.FAST_RESPONSES
+    project.responses.FAST_RESPONSES = True
+    try:
+        for name, model in samples.items():
+            adapter = TypeAdapter(type(model))
+
+            def default() -> bytes:
+                validated = adapter.validate_python(model, from_attributes=True)
+                return JSONResponse(adapter.dump_python(validated, mode="json")).body
+
+            def fast() -> bytes:
+                return project.responses.render(model).body
+
+            timings = {}
+            for label, encode in (("default", default), ("fast", fast)):
+                started = time.perf_counter()
+                for _ in range(iterations):
+                    encode()
+                timings[f"{label}_us"] = (
+                    (time.perf_counter() - started) / iterations * 1_000_000
+                )
+            timings["speedup"] = timings["default_us"] / timings["fast_us"]
+            results[name] = timings
+            print(
+                f"{name:>26}: default {timings['default_us']:6.2f}us  "
+                f"fast {timings['fast_us']:6.2f}us  x{timings['speedup']:.1f}",
+                file=sys.stderr,
+            )
+    finally:
+        project.responses.FAST_RESPONSES = fast_mode
+    return results
+
+
+def compare(
+    baseline: dict[str, Any], candidate: dict[str, Any], threshold: float
+) -> list[str]:
+    """
+    Returns a description of every metric in `candidate` that is worse than `baseline` by more than `threshold`.
+    """
+    regressions = []
+    for section in ("routes", "services"):
+        for name, old in baseline.get(section, {}).items():
+            new = candidate.get(section, {}).get(name)
+            if new is None:
+                continue
+            if new["rps"] < old["rps"] * (1 - threshold):
+                regressions.append(
+                    f"{section}.{name}.rps: {old['rps']:.1f} -> {new['rps']:.1f}"
+                )
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if new[metric] > old[metric] * (1 + threshold):
+                    regressions.append(
+                        f"{section}.{name}.{metric}: {old[metric]:.2f} -> {new[metric]:.2f}"
+                    )
+            old_queries = old.get("db_queries_per_request")
+            new_queries = new.get("db_queries_per_request")
+            if (
+                old_queries is not None
+                and new_queries is not None
+                and new_queries > old_queries + 1e-9
+            ):
+                regressions.append(
+                    f"{section}.{name}.db_queries_per_request: {old_queries:.2f} -> {new_queries:.2f}"
+                )
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m project.benchmark")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="benchmark every route and service")
+    run_parser.add_argument("--concurrency", type=int, default=16)
+    run_parser.add_argument("--requests", type=int, default=200)
+    run_parser.add_argument(
+        "--users", type=int, default=8, help="size of the pool of logged-in users"
+    )
+    run_parser.add_argument(
+        "--iterations",
+        type=int,
+        default=50,
+        help="sequential calls per service micro-benchmark, 0 to skip",
+    )
+    run_parser.add_argument(
+        "--url", help="benchmark a running server instead of booting the app in-process"
+    )
+    run_parser.add_argument(
+        "--bcrypt-rounds", type=int, help="override BCRYPT_ROUNDS for the run"
+    )
+    run_parser.add_argument(
+        "--fast-responses",
+        action="store_true",
+        help="serve responses in FAST_RESPONSES mode",
+    )
+    run_parser.add_argument(
+        "--sqlite",
+        metavar="PATH",
+        help="run in-process against an embedded SQLite database instead of DATABASE_URL",
+    )
+    run_parser.add_argument("--output", help="write results as JSON to this file")
+
+    serialization_parser = commands.add_parser(
+        "serialization", help="compare default and fast response serialization"
+    )
+    serialization_parser.add_argument("--iterations", type=int, default=100_000)
+
+    compare_parser = commands.add_parser(
+        "compare", help="fail if a run regressed against a baseline"
+    )
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="allowed relative regression, e.g. 0.10 for 10%%",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.candidate) as f:
+            candidate = json.load(f)
+        regressions = compare(baseline, candidate, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print("No regressions above threshold.")
+        return 1 if regressions else 0
+
+    if args.command == "serialization":
+        print(json.dumps(run_serialization(args.iterations), indent=2))
+        return 0
+
+    if args.bcrypt_rounds is not None:
+        os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    if args.fast_responses:
+        os.environ["FAST_RESPONSES"] = "1"
+    # The benchmark logs a small pool of users in over and over from one client IP, which login throttling would
+    # reject.
+    for name in (
+        "LOGIN_RATE_IP_BURST",
+        "LOGIN_RATE_IP_PER_MINUTE",
+        "LOGIN_RATE_USERNAME_BURST",
+        "LOGIN_RATE_USERNAME_PER_MINUTE",
+    ):
+        os.environ.setdefault(name, "1000000000")
+    if args.sqlite:
+        os.environ["STORAGE_BACKEND"] = "sqlite"
+        os.environ["SQLITE_PATH"] = args.sqlite
+    results = asyncio.run(run(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
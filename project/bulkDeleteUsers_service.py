@@ -0,0 +1,73 @@
+import os
+from typing import List
+
+import prisma.enums
+import project.account_deletion
+import project.auth
+from pydantic import BaseModel, Field
+
+MAX_USERS = int(os.getenv("BULK_DELETE_MAX_USERS", "100"))
+
+
+class BulkDeleteUsersRequest(BaseModel):
+    """
+    A batch of user ids to delete in one call.
+    """
+
+    user_ids: List[int] = Field(min_length=1, max_length=MAX_USERS)
+
+
+class BulkDeleteUserResult(BaseModel):
+    """
+    The outcome of deleting a single user of the batch.
+    """
+
+    user_id: int
+    success: bool
+    message: str
+
+
+class BulkDeleteUsersResponse(BaseModel):
+    """
+    Response returned after a bulk deletion, with one result per requested user id in request order.
+    """
+
+    deleted: int
+    results: List[BulkDeleteUserResult]
+
+
+async def bulkDeleteUsers(
+    claims: project.auth.TokenClaims, user_ids: List[int]
+) -> BulkDeleteUsersResponse:
+    """
+    Deletes many users at once. Only administrators may do so. Every existing user is tombstoned in a single
+    transaction; their interactions are removed in the background by `project.account_deletion.deletion_engine`.
+
+    Args:
+        claims (project.auth.TokenClaims): The verified claims of the caller.
+        user_ids (List[int]): The ids of the users to delete.
+
+    Returns:
+        BulkDeleteUsersResponse: Response returned after a bulk deletion, with one result per requested user id in request order.
+
+    Raises:
+        PermissionError: If the caller is not an administrator.
+    """
+    if claims.role != prisma.enums.Role.Administrator:
+        raise PermissionError("Only administrators can delete users in bulk.")
+    deleted = set(
+        await project.account_deletion.delete_users(list(dict.fromkeys(user_ids)))
+    )
+    results = [
+        BulkDeleteUserResult(
+            user_id=user_id,
+            success=user_id in deleted,
+            message=(
+                "User successfully deleted."
+                if user_id in deleted
+                else "User not found."
+            ),
+        )
+        for user_id in user_ids
+    ]
+    return BulkDeleteUsersResponse(deleted=len(deleted), results=results)
@@ -0,0 +1,132 @@
+import os
+from typing import List
+
+import prisma
+import prisma.models
+import project.password_hasher
+import project.user_repository
+from pydantic import BaseModel, Field
+
+MAX_USERS = int(os.getenv("BULK_REGISTER_MAX_USERS", "100"))
+
+
+class BulkUserRegistration(BaseModel):
+    """
+    The details of a single user to register as part of a bulk registration.
+    """
+
+    username: str
+    password: str
+    email: str
+
+
+class BulkUserRegistrationRequest(BaseModel):
+    """
+    A batch of users to register in one call.
+    """
+
+    users: List[BulkUserRegistration] = Field(max_length=MAX_USERS)
+
+
+class BulkUserRegistrationResult(BaseModel):
+    """
+    The outcome of registering a single user of the batch.
+    """
+
+    email: str
+    success: bool
+    message: str
+
+
+class BulkUserRegistrationResponse(BaseModel):
+    """
+    Response returned after a bulk registration, with one result per requested user in request order.
+    """
+
+    created: int
+    results: List[BulkUserRegistrationResult]
+
+
+async def bulkRegisterUsers(
+    users: List[BulkUserRegistration],
+) -> BulkUserRegistrationResponse:
+    """
+    Registers many users at once. Passwords are hashed in parallel on the password hashing pool and the new users are
+    inserted with a single `create_many` inside a transaction. Users that cannot be created, e.g. because their email
+    is already registered, are reported individually so that callers only need to retry those.
+
+    Args:
+        users (List[BulkUserRegistration]): The users to register.
+
+    Returns:
+        BulkUserRegistrationResponse: Response returned after a bulk registration, with one result per requested user in request order.
+    """
+    messages: dict[int, str] = {}
+    seen: set[str] = set()
+    for index, user in enumerate(users):
+        if user.email in seen:
+            messages[index] = "Duplicate email in request."
+        seen.add(user.email)
+    existing = await prisma.models.User.prisma().find_many(
+        where={"email": {"in": list(seen)}}
+    )
+    existing_emails = {user.email for user in existing}
+    for index, user in enumerate(users):
+        if index not in messages and user.email in existing_emails:
+            messages[index] = "Email already in use."
+
+    pending = [index for index in range(len(users)) if index not in messages]
+    hashed = await project.password_hasher.hash_passwords(
+        [users[index].password for index in pending]
+    )
+    hash_by_email = {
+        users[index].email: password for index, password in zip(pending, hashed)
+    }
+    created_emails: set[str] = set()
+    if pending:
+        async with prisma.get_client().tx() as transaction:
+            await prisma.models.User.prisma(transaction).create_many(
+                data=[
+                    {
+                        "email": users[index].email,
+                        "password": hash_by_email[users[index].email],
+                        "role": "User",
+                    }
+                    for index in pending
+                ],
+                skip_duplicates=True,
+            )
+            # Rows skipped because a concurrent registration won the race carry somebody else's hash.
+            created = await prisma.models.User.prisma(transaction).find_many(
+                where={"email": {"in": list(hash_by_email)}}
+            )
+        for user in created:
+            if hash_by_email.get(user.email) == user.password:
+                created_emails.add(user.email)
+                project.user_repository.user_cache.put(
+                    project.user_repository.UserRecord.from_model(user)
+                )
+
+    results = []
+    for index, user in enumerate(users):
+        if index in messages:
+            results.append(
+                BulkUserRegistrationResult(
+                    email=user.email, success=False, message=messages[index]
+                )
+            )
+        elif user.email in created_emails:
+            results.append(
+                BulkUserRegistrationResult(
+                    email=user.email,
+                    success=True,
+                    message="User registered successfully.",
+                )
+            )
+        else:
+            results.append(
+                BulkUserRegistrationResult(
+                    email=user.email, success=False, message="Email already in use."
+                )
+            )
+    return BulkUserRegistrationResponse(created=len(created_emails), results=results)
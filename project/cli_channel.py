@@ -0,0 +1,256 @@
+"""
+Persistent WebSocket channel for CLI automation at `/cli/ws`.
+
+`POST /cli/hello-world` costs a full HTTP request per command. Over the channel a client authenticates once and then
+streams commands:
+
+1. The first message is `{"user_id": 1, "token": "<jwt>"}`. The server answers `{"authenticated": true}`, or sends the
+   error and closes the connection with code 1008.
+2. Every following text message holds one or more commands, one per line. Clients may send further messages without
+   waiting for replies. Messages are processed in the order they arrive, and each is answered with one message that
+   holds one JSON reply per command, one per line, in command order: `{"message": "Hello World"}` for `hello-world`.
+   The `stats` command replies with the connection's own throughput and latency.
+
+The protocol is text only: a binary message closes the connection with code 1003.
+
+The token is re-checked against the token cache before every message, so revoking it or deleting the user ends the
+session without a database query per command. Interactions are recorded through the interaction write buffer, which
+inserts them in batches.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import jwt
+import prisma.enums
+import project.auth
+import project.executeHelloWorld_service
+import project.interaction_writer
+import project.responses
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+logger = logging.getLogger(__name__)
+
+POLICY_VIOLATION = 1008
+
+UNSUPPORTED_DATA = 1003
+
+BINARY_NOT_SUPPORTED = project.responses.dumps(
+    {"error": "Binary messages are not supported."}
+).decode()
+
+ALLOWED_ROLES = (prisma.enums.Role.User, prisma.enums.Role.Administrator)
+
+AUTHENTICATED = project.responses.dumps({"authenticated": True}).decode()
+
+HELLO_WORLD = project.executeHelloWorld_service.HELLO_WORLD.model_dump_json()
+
+INVALID_COMMAND = project.executeHelloWorld_service.INVALID_COMMAND.model_dump_json()
+
+AUTHENTICATION_FAILED = (
+    project.executeHelloWorld_service.AUTHENTICATION_FAILED.model_dump_json()
+)
+
+AUTHORIZATION_FAILED = (
+    project.executeHelloWorld_service.AUTHORIZATION_FAILED.model_dump_json()
+)
+
+
+class ConnectionStats:
+    """
+    Throughput and latency of one connection. Latency is the time from receiving a message to sending its reply.
+    """
+
+    __slots__ = ("opened_at", "messages", "commands", "latency_total", "latency_max")
+
+    def __init__(self) -> None:
+        self.opened_at = time.perf_counter()
+        self.messages = 0
+        self.commands = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record(self, commands: int, elapsed: float) -> None:
+        self.messages += 1
+        self.commands += commands
+        self.latency_total += elapsed
+        self.latency_max = max(self.latency_max, elapsed)
+
+    def snapshot(self) -> dict[str, float]:
+        seconds = time.perf_counter() - self.opened_at
+        return {
+            "seconds": seconds,
+            "messages": self.messages,
+            "commands": self.commands,
+            "commands_per_second": self.commands / seconds if seconds else 0.0,
+            "latency_seconds_avg": (
+                self.latency_total / self.messages if self.messages else 0.0
+            ),
+            "latency_seconds_max": self.latency_max,
+        }
+
+
+class CLIChannel:
+    """
+    Serves `/cli/ws` connections and aggregates their stats for `/metrics`.
+    """
+
+    def __init__(self, max_commands: int, auth_timeout: float) -> None:
+        self.max_commands = max_commands
+        self.auth_timeout = auth_timeout
+        self._open = 0
+        self._connections = 0
+        self._auth_failures = 0
+        self._binary_rejected = 0
+        self._messages = 0
+        self._commands = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._too_many_commands = project.responses.dumps(
+            {"error": f"At most {max_commands} commands per message."}
+        ).decode()
+
+    @classmethod
+    def from_env(cls) -> "CLIChannel":
+        return cls(
+            max_commands=int(os.getenv("CLI_WS_MAX_COMMANDS", "1000")),
+            auth_timeout=float(os.getenv("CLI_WS_AUTH_TIMEOUT", "10")),
+        )
+
+    async def _receive_text(self, websocket: WebSocket) -> str:
+        """
+        Receives the next message, closing the connection with 1003 if it is binary.
+
+        Raises:
+            WebSocketDisconnect: If the client disconnected, or sent a binary message.
+        """
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        text = message.get("text")
+        if text is None:
+            self._binary_rejected += 1
+            await websocket.send_text(BINARY_NOT_SUPPORTED)
+            await websocket.close(code=UNSUPPORTED_DATA)
+            raise WebSocketDisconnect(UNSUPPORTED_DATA)
+        return text
+
+    async def _authenticate(
+        self, websocket: WebSocket
+    ) -> Optional[tuple[int, str, project.auth.TokenClaims]]:
+        try:
+            hello = json.loads(
+                await asyncio.wait_for(self._receive_text(websocket), self.auth_timeout)
+            )
+            user_id, token = int(hello["user_id"]), str(hello["token"])
+            claims = await project.auth.verify_token(token)
+        except (
+            asyncio.TimeoutError,
+            jwt.PyJWTError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ):
+            return None
+        if claims.user_id != user_id:
+            return None
+        return user_id, token, claims
+
+    async def _reject(self, websocket: WebSocket, reply: str) -> None:
+        self._auth_failures += 1
+        await websocket.send_text(reply)
+        await websocket.close(code=POLICY_VIOLATION)
+
+    def _execute(
+        self, user_id: int, lines: list[str], stats: ConnectionStats
+    ) -> list[str]:
+        replies = []
+        for line in lines:
+            command = line.strip()
+            if command == "hello-world":
+                project.interaction_writer.interaction_buffer.enqueue(
+                    user_id, prisma.enums.InteractionType.CLI, "Hello World"
+                )
+                replies.append(HELLO_WORLD)
+            elif command == "stats":
+                replies.append(project.responses.dumps(stats.snapshot()).decode())
+            else:
+                replies.append(INVALID_COMMAND)
+        return replies
+
+    async def serve(self, websocket: WebSocket) -> None:
+        """
+        Runs one connection until the client disconnects or its token stops being valid.
+
+        Args:
+            websocket (WebSocket): The connection, not yet accepted.
+        """
+        await websocket.accept()
+        self._open += 1
+        self._connections += 1
+        stats = ConnectionStats()
+        try:
+            authenticated = await self._authenticate(websocket)
+            if authenticated is None:
+                await self._reject(websocket, AUTHENTICATION_FAILED)
+                return
+            user_id, token, claims = authenticated
+            if claims.role not in ALLOWED_ROLES:
+                await self._reject(websocket, AUTHORIZATION_FAILED)
+                return
+            await websocket.send_text(AUTHENTICATED)
+            while True:
+                text = await self._receive_text(websocket)
+                started = time.perf_counter()
+                try:
+                    claims = await project.auth.verify_token(token)
+                except jwt.PyJWTError:
+                    await self._reject(websocket, AUTHENTICATION_FAILED)
+                    return
+                if claims.role not in ALLOWED_ROLES:
+                    await self._reject(websocket, AUTHORIZATION_FAILED)
+                    return
+                lines = text.splitlines()
+                if len(lines) > self.max_commands:
+                    replies = [self._too_many_commands]
+                else:
+                    replies = self._execute(user_id, lines, stats)
+                await websocket.send_text("\n".join(replies))
+                elapsed = time.perf_counter() - started
+                stats.record(len(lines), elapsed)
+                self._messages += 1
+                self._commands += len(lines)
+                self._latency_total += elapsed
+                self._latency_max = max(self._latency_max, elapsed)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._open -= 1
+            if stats.commands:
+                logger.info(
+                    "CLI channel closed after %(commands)d commands in %(seconds).1fs"
+                    " (%(commands_per_second).0f/s, avg latency %(latency_seconds_avg).4fs)",
+                    stats.snapshot(),
+                )
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "connections_open": self._open,
+            "connections": self._connections,
+            "auth_failures": self._auth_failures,
+            "binary_rejected": self._binary_rejected,
+            "messages": self._messages,
+            "commands": self._commands,
+            "latency_seconds_total": self._latency_total,
+            "latency_seconds_max": self._latency_max,
+            "latency_seconds_avg": (
+                self._latency_total / self._messages if self._messages else 0.0
+            ),
+        }
+
+
+cli_channel = CLIChannel.from_env()
@@ -0,0 +1,122 @@
+import os
+from datetime import timedelta
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import prisma
+import project.instrumentation
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0")) or None
+
+MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "90"))
+
+POOL_TIMEOUT = os.getenv("DB_POOL_TIMEOUT")
+
+CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+
+QUERY_TIMEOUT = float(os.getenv("DB_QUERY_TIMEOUT", "30"))
+
+READY_MAX_POOL_SATURATION = float(os.getenv("READY_MAX_POOL_SATURATION", "0"))
+
+_client: Optional[project.instrumentation.InstrumentedPrisma] = None
+
+_draining = False
+
+
+def pool_size() -> int:
+    """
+    Returns the connection limit of this process: DB_POOL_SIZE if set, otherwise Prisma's default of CPUs * 2 + 1,
+    capped at this worker's share of DB_MAX_CONNECTIONS, the budget of all WEB_CONCURRENCY workers together.
+    """
+    if POOL_SIZE:
+        return POOL_SIZE
+    workers = max(1, int(os.getenv("WEB_CONCURRENCY", "0")) or 1)
+    return max(1, min((os.cpu_count() or 1) * 2 + 1, MAX_CONNECTIONS // workers))
+
+
+def datasource_url() -> Optional[str]:
+    """
+    Returns DATABASE_URL with the configured pool size and timeouts applied as connection string parameters.
+    Parameters already present in DATABASE_URL take precedence.
+    """
+    url = os.getenv("DATABASE_URL")
+    if not url:
+        return None
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    params.setdefault("connection_limit", str(pool_size()))
+    params.setdefault("connect_timeout", str(CONNECT_TIMEOUT))
+    if POOL_TIMEOUT is not None:
+        params.setdefault("pool_timeout", POOL_TIMEOUT)
+    return urlunsplit(parts._replace(query=urlencode(params)))
+
+
+def create_client() -> project.instrumentation.InstrumentedPrisma:
+    url = datasource_url()
+    return project.instrumentation.InstrumentedPrisma(
+        datasource={"url": url} if url else None,
+        connect_timeout=timedelta(seconds=CONNECT_TIMEOUT),
+        http={"timeout": QUERY_TIMEOUT},
+    )
+
+
+def get_client() -> project.instrumentation.InstrumentedPrisma:
+    """
+    Returns the client of the current process. Registered with Prisma, so `Model.prisma()` and `prisma.get_client()`
+    resolve to it.
+    """
+    if _client is None:
+        raise RuntimeError("The database client is not connected.")
+    return _client
+
+
+prisma.register(get_client)
+
+
+async def connect() -> None:
+    """
+    Creates and connects this process' database client. Called from the app's lifespan, so that every worker
+    process gets its own client and connection pool.
+    """
+    global _client, _draining
+    _draining = False
+    _client = create_client()
+    await _client.connect()
+
+
+def start_draining() -> None:
+    """
+    Marks this process as not ready, so that load balancers stop routing to it while it shuts down.
+    """
+    global _draining
+    _draining = True
+
+
+async def disconnect() -> None:
+    global _client
+    start_draining()
+    if _client is not None:
+        await _client.disconnect()
+        _client = None
+
+
+def pool_stats() -> dict[str, float]:
+    in_flight = project.instrumentation.db_queries_in_flight.total()
+    return {
+        "pool_size": pool_size(),
+        "queries_in_flight": in_flight,
+        "saturation": in_flight / pool_size(),
+    }
+
+
+def readiness() -> tuple[bool, dict[str, float]]:
+    """
+    Reports whether this process should receive traffic, along with its pool saturation. A process is not ready
+    before it connects, while it shuts down, and, if READY_MAX_POOL_SATURATION is set, while more queries than that
+    fraction of the pool are in flight.
+    """
+    stats = pool_stats()
+    ready = _client is not None and not _draining
+    if READY_MAX_POOL_SATURATION and stats["saturation"] > READY_MAX_POOL_SATURATION:
+        ready = False
+    return ready, stats
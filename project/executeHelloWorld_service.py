@@ -1,6 +1,9 @@
+import jwt
 import prisma
 import prisma.enums
-import prisma.models
+import project.auth
+import project.interaction_writer
+import project.responses
 from pydantic import BaseModel
 
 
@@ -12,6 +15,27 @@ class HelloWorldCommandResponse(BaseModel):
     message: str
 
 
+HELLO_WORLD = project.responses.constant(
+    HelloWorldCommandResponse(message="Hello World")
+)
+
+AUTHENTICATION_FAILED = project.responses.constant(
+    HelloWorldCommandResponse(
+        message="Authentication failed. User does not exist or token is invalid."
+    )
+)
+
+INVALID_COMMAND = project.responses.constant(
+    HelloWorldCommandResponse(message="Invalid command. Expected 'hello-world'.")
+)
+
+AUTHORIZATION_FAILED = project.responses.constant(
+    HelloWorldCommandResponse(
+        message="Authorization failed. User is not permitted to execute this command."
+    )
+)
+
+
 async def executeHelloWorld(
     user_id: int, token: str, command: str
 ) -> HelloWorldCommandResponse:
@@ -27,27 +51,18 @@ async def executeHelloWorld(
     Returns:
     HelloWorldCommandResponse: The response model for the 'Hello World' command, providing either a success message or an error.
     """
-    user = await prisma.models.User.prisma().find_unique(
-        where={"id": user_id, "AND": {"token": token}}
-    )
-    if not user:
-        return HelloWorldCommandResponse(
-            message="Authentication failed. User does not exist or token is invalid."
-        )
+    try:
+        claims = await project.auth.verify_token(token)
+    except jwt.PyJWTError:
+        claims = None
+    if claims is None or claims.user_id != user_id:
+        return AUTHENTICATION_FAILED
     if command != "hello-world":
-        return HelloWorldCommandResponse(
-            message="Invalid command. Expected 'hello-world'."
+        return INVALID_COMMAND
+    if claims.role in [prisma.enums.Role.User, prisma.enums.Role.Administrator]:
+        project.interaction_writer.interaction_buffer.enqueue(
+            user_id, prisma.enums.InteractionType.CLI, "Hello World"
         )
-    if user.role in [prisma.enums.Role.User, prisma.enums.Role.Administrator]:
-        interaction = await prisma.models.Interaction.prisma().create(
-            {
-                "userId": user_id,
-                "type": prisma.enums.InteractionType.CLI,
-                "content": "Hello World",
-            }
-        )
-        return HelloWorldCommandResponse(message="Hello World")
+        return HELLO_WORLD
     else:
-        return HelloWorldCommandResponse(
-            message="Authorization failed. User is not permitted to execute this command."
-        )
+        return AUTHORIZATION_FAILED
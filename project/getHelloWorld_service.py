@@ -1,6 +1,10 @@
+from typing import Optional
+
 import prisma
 import prisma.enums
-import prisma.models
+import project.auth
+import project.interaction_writer
+import project.responses
 from pydantic import BaseModel
 
 
@@ -12,26 +16,31 @@ class HelloWorldResponse(BaseModel):
     message: str
 
 
-async def getHelloWorld(user_id: int) -> HelloWorldResponse:
+HELLO_WORLD = project.responses.constant(HelloWorldResponse(message="Hello World"))
+
+ACCESS_DENIED = project.responses.constant(HelloWorldResponse(message="Access denied"))
+
+
+async def getHelloWorld(
+    user_id: int, claims: Optional[project.auth.TokenClaims]
+) -> HelloWorldResponse:
     """
     This route serves the classic 'Hello World' message. Upon a GET request, it checks the user's authentication status through the User Management Module. If authenticated, it returns a 'Hello World' message. Unauthenticated requests are denied access, ensuring that the endpoint is secure and respecting the application’s role-based access control.
 
     Args:
         user_id (int): The user's ID used for authentication and role verification.
+        claims (Optional[project.auth.TokenClaims]): The verified token claims of the caller, or None if the request carried no valid token.
 
     Returns:
         HelloWorldResponse: Response model for /hello-world endpoint. Delivers a simple 'Hello World' message to authenticated users or a denial message to unauthenticated requests.
     """
-    user = await prisma.models.User.prisma().find_unique(where={"id": user_id})
-    if user is not None and user.role == prisma.enums.Role.User:
-        interaction_response = await prisma.models.Interaction.prisma().create(
-            data={
-                "userId": user_id,
-                "type": prisma.enums.InteractionType.API,
-                "content": "Hello World",
-            }
+    if (
+        claims is not None
+        and claims.user_id == user_id
+        and claims.role == prisma.enums.Role.User
+    ):
+        project.interaction_writer.interaction_buffer.enqueue(
+            user_id, prisma.enums.InteractionType.API, "Hello World"
         )
-        message = interaction_response.content
-    else:
-        message = "Access denied"
-    return HelloWorldResponse(message=message)
+        return HELLO_WORLD
+    return ACCESS_DENIED
@@ -0,0 +1,86 @@
+from datetime import date, datetime, time, timezone
+from typing import List, Optional
+
+import prisma
+import prisma.enums
+import prisma.models
+import project.auth
+from pydantic import BaseModel
+
+
+class InteractionStatsBucket(BaseModel):
+    """
+    The number of interactions of one type recorded by one user on one (UTC) day.
+    """
+
+    user_id: int
+    day: date
+    type: prisma.enums.InteractionType
+    count: int
+
+
+class InteractionStatsResponse(BaseModel):
+    """
+    Per-user, per-day interaction counts split by API and CLI, with overall totals.
+    """
+
+    buckets: List[InteractionStatsBucket]
+    total_api: int
+    total_cli: int
+
+
+async def getInteractionStats(
+    claims: project.auth.TokenClaims,
+    user_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+) -> InteractionStatsResponse:
+    """
+    Returns per-user, per-day counts of API and CLI hello-world calls. The counts are read from the precomputed
+    rollup table, so the cost depends on the number of buckets returned, not on the number of raw interactions.
+    Administrators can read every user's stats; other users can only read their own.
+
+    Args:
+        claims (project.auth.TokenClaims): The verified token claims of the caller.
+        user_id (Optional[int]): Only return stats of this user.
+        since (Optional[date]): The first day to include.
+        until (Optional[date]): The last day to include.
+
+    Returns:
+        InteractionStatsResponse: Per-user, per-day interaction counts split by API and CLI, with overall totals.
+    """
+    if claims.role != prisma.enums.Role.Administrator:
+        if user_id is not None and user_id != claims.user_id:
+            raise PermissionError("Users can only read their own interaction stats.")
+        user_id = claims.user_id
+    where: dict = {}
+    if user_id is not None:
+        where["userId"] = user_id
+    day: dict = {}
+    if since is not None:
+        day["gte"] = datetime.combine(since, time(), tzinfo=timezone.utc)
+    if until is not None:
+        day["lte"] = datetime.combine(until, time(), tzinfo=timezone.utc)
+    if day:
+        where["day"] = day
+    rollups = await prisma.models.InteractionRollup.prisma().find_many(
+        where=where, order=[{"day": "asc"}, {"userId": "asc"}, {"type": "asc"}]
+    )
+    buckets = [
+        InteractionStatsBucket(
+            user_id=rollup.userId,
+            day=rollup.day.date(),
+            type=rollup.type,
+            count=rollup.count,
+        )
+        for rollup in rollups
+    ]
+    return InteractionStatsResponse(
+        buckets=buckets,
+        total_api=sum(
+            b.count for b in buckets if b.type == prisma.enums.InteractionType.API
+        ),
+        total_cli=sum(
+            b.count for b in buckets if b.type == prisma.enums.InteractionType.CLI
+        ),
+    )
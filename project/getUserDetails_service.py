@@ -1,8 +1,13 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime
+from typing import Optional
 
 import prisma
 import prisma.enums
-import prisma.models
+import project.user_repository
 from pydantic import BaseModel
 
 
@@ -16,6 +21,136 @@ class UserDetailsResponse(BaseModel):
     registration_date: datetime
 
 
+class AuthenticationTokenError(ValueError):
+    """
+    Raised when an AuthenticationToken is malformed (400) or does not belong to an existing user (401).
+    """
+
+    def __init__(self, message: str, status_code: int) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_token(AuthenticationToken: str) -> int:
+    """
+    Returns the user ID an AuthenticationToken stands for.
+
+    Raises:
+        AuthenticationTokenError: If the token is not a positive decimal integer.
+    """
+    if not AuthenticationToken.isascii() or not AuthenticationToken.isdecimal():
+        raise AuthenticationTokenError("Malformed authentication token.", 400)
+    user_id = int(AuthenticationToken)
+    if user_id <= 0:
+        raise AuthenticationTokenError("Malformed authentication token.", 400)
+    return user_id
+
+
+class DetailsETagCache:
+    """
+    Size-bounded LRU cache of the current ETag of each user's details, with a per-entry TTL.
+
+    A conditional request whose `If-None-Match` matches the cached ETag is answered with 304 without looking the user
+    up. Entries are dropped by `invalidate` whenever a user's details change or the user is deleted in this worker;
+    the TTL bounds how long a change made by another worker process can go unnoticed.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._etags: OrderedDict[int, tuple[str, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "DetailsETagCache":
+        return cls(
+            max_size=int(os.getenv("USER_DETAILS_ETAG_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("USER_DETAILS_ETAG_TTL", "30")),
+        )
+
+    def get(self, user_id: int) -> Optional[str]:
+        entry = self._etags.get(user_id)
+        if entry is None:
+            return None
+        etag, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._etags[user_id]
+            self.evictions += 1
+            return None
+        self._etags.move_to_end(user_id)
+        return etag
+
+    def put(self, user_id: int, etag: str) -> None:
+        self._etags.pop(user_id, None)
+        self._etags[user_id] = (etag, time.monotonic() + self.ttl)
+        while len(self._etags) > self.max_size:
+            self._etags.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        self._etags.pop(user_id, None)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._etags),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+details_etags = DetailsETagCache.from_env()
+
+
+def details_etag(user: project.user_repository.UserRecord) -> str:
+    """
+    Returns the strong ETag of a user's details, derived from every field the response contains.
+    """
+    digest = hashlib.sha256(
+        f"{user.email}\0{user.role}\0{user.createdAt.isoformat()}".encode()
+    ).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Evaluates an `If-None-Match` header, a list of ETags or "*", against the current ETag.
+    """
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(
+        candidate.removeprefix("W/") == etag for candidate in candidates
+    )
+
+
+def unchanged_etag(AuthenticationToken: str, if_none_match: str) -> Optional[str]:
+    """
+    Checks a conditional request against the cached ETag, without querying the database. The token is validated like
+    on the full path, and an ETag is only cached for a user that was found, so this never answers for a token the
+    full path would reject.
+
+    Args:
+        AuthenticationToken (str): The user's database ID, as accepted by `getUserDetails`.
+        if_none_match (str): The request's `If-None-Match` header.
+
+    Returns:
+        Optional[str]: The current ETag if the client's copy is still current, so the request can be answered with
+            304 Not Modified. None if the details have to be loaded.
+
+    Raises:
+        AuthenticationTokenError: If the token is malformed.
+    """
+    etag = details_etags.get(parse_token(AuthenticationToken))
+    if etag is not None and etag_matches(if_none_match, etag):
+        details_etags.hits += 1
+        return etag
+    details_etags.misses += 1
+    return None
+
+
 async def getUserDetails(AuthenticationToken: str) -> UserDetailsResponse:
     """
     Retrieves detailed information about the currently authenticated user, such as username, role, and registration date.
@@ -31,11 +166,33 @@ async def getUserDetails(AuthenticationToken: str) -> UserDetailsResponse:
         userDetails = getUserDetails('1') # Assuming '1' is a valid user ID
         > UserDetailsResponse(username='user@example.com', role='prisma.models.User', registration_date=datetime(2022, 1, 1))
     """
-    user_id = int(AuthenticationToken)
-    user = await prisma.models.User.prisma().find_unique(where={"id": user_id})
+    response, _ = await getUserDetailsWithETag(AuthenticationToken)
+    return response
+
+
+async def getUserDetailsWithETag(
+    AuthenticationToken: str,
+) -> tuple[UserDetailsResponse, str]:
+    """
+    Loads a user's details like `getUserDetails`, along with their ETag, and caches the ETag for conditional
+    requests.
+
+    Args:
+        AuthenticationToken (str): The user's database ID.
+
+    Returns:
+        tuple[UserDetailsResponse, str]: The user's details and their ETag.
+
+    Raises:
+        AuthenticationTokenError: If the token is malformed or no user is found for it.
+    """
+    user_id = parse_token(AuthenticationToken)
+    user = await project.user_repository.get_user_by_id(user_id)
     if not user:
-        raise ValueError("No user found with the provided token")
+        raise AuthenticationTokenError("No user found with the provided token", 401)
+    etag = details_etag(user)
+    details_etags.put(user_id, etag)
     response = UserDetailsResponse(
-        username=user.email, role=user.role, registration_date=datetime.now()
+        username=user.email, role=user.role, registration_date=user.createdAt
     )
-    return response
+    return response, etag
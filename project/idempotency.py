@@ -0,0 +1,428 @@
+"""
+`Idempotency-Key` support for write endpoints.
+
+A client that retries a request with the same `Idempotency-Key` header gets the response of the first attempt
+replayed from memory, marked with `Idempotent-Replayed: true`, without the route running again. Duplicates that
+arrive while the first attempt is still running wait for it and receive the same response. A key is bound to the
+request it was first used with (method, path, query string and body); reusing it for a different request is
+answered with 422.
+
+Responses with a 5xx or 429 status are not kept, so retrying those runs the request again. Keys are held in a
+store with a TTL: a size-bounded LRU cache per worker process (`memory`, the default, so the guarantee only holds
+with a single worker), or a Redis-compatible server shared by every worker (`redis`). With the shared store a
+duplicate that reaches another worker while the first attempt is still running is answered with 409 and
+`Retry-After`, since it cannot wait on a request of another process. While the store is unreachable, requests run
+without idempotency rather than failing.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+import project.responses
+
+IDEMPOTENT_PATHS = frozenset({"/register", "/cli/hello-world", "/user/update"})
+
+HEADER = b"idempotency-key"
+
+MAX_KEY_LENGTH = 255
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyStoreError(Exception):
+    """
+    Raised by a store that cannot be reached.
+    """
+
+
+class StoredResponse:
+    """
+    A complete response as captured from the app.
+    """
+
+    __slots__ = ("fingerprint", "status", "headers", "body")
+
+    def __init__(
+        self,
+        fingerprint: bytes,
+        status: int,
+        headers: list[tuple[bytes, bytes]],
+        body: bytes,
+    ) -> None:
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def cacheable(self) -> bool:
+        return self.status < 500 and self.status != 429
+
+    def dumps(self) -> bytes:
+        return json.dumps(
+            {
+                "fingerprint": self.fingerprint.hex(),
+                "status": self.status,
+                "headers": [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in self.headers
+                ],
+                "body": self.body.decode("latin-1"),
+            }
+        ).encode()
+
+    @classmethod
+    def loads(cls, data: bytes) -> "StoredResponse":
+        fields = json.loads(data)
+        return cls(
+            bytes.fromhex(fields["fingerprint"]),
+            fields["status"],
+            [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in fields["headers"]
+            ],
+            fields["body"].encode("latin-1"),
+        )
+
+
+class IdempotencyStore:
+    """
+    Storage for completed responses and for the keys of requests still running. Methods raise
+    IdempotencyStoreError when the storage is unavailable.
+    """
+
+    async def get(self, key: tuple[str, str]) -> Optional[StoredResponse]:
+        raise NotImplementedError
+
+    async def put(self, key: tuple[str, str], response: StoredResponse) -> None:
+        raise NotImplementedError
+
+    async def claim(self, key: tuple[str, str], fingerprint: bytes) -> Optional[bytes]:
+        """
+        Marks `key` as running in this process.
+
+        Returns:
+            Optional[bytes]: None if the key was claimed, otherwise the fingerprint of the request running elsewhere.
+        """
+        return None
+
+    async def release(self, key: tuple[str, str]) -> None:
+        pass
+
+    def size(self) -> int:
+        return 0
+
+    def evictions(self) -> int:
+        return 0
+
+
+class MemoryStore(IdempotencyStore):
+    """
+    Size-bounded LRU cache of completed responses with a per-entry TTL, held by one worker process.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._responses: OrderedDict[tuple[str, str], tuple[StoredResponse, float]] = (
+            OrderedDict()
+        )
+        self._evictions = 0
+
+    async def get(self, key: tuple[str, str]) -> Optional[StoredResponse]:
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+        response, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._responses[key]
+            self._evictions += 1
+            return None
+        self._responses.move_to_end(key)
+        return response
+
+    async def put(self, key: tuple[str, str], response: StoredResponse) -> None:
+        self._responses.pop(key, None)
+        self._responses[key] = (response, time.monotonic() + self.ttl)
+        while len(self._responses) > self.max_size:
+            self._responses.popitem(last=False)
+            self._evictions += 1
+
+    def size(self) -> int:
+        return len(self._responses)
+
+    def evictions(self) -> int:
+        return self._evictions
+
+
+class RedisStore(IdempotencyStore):
+    """
+    Responses stored in a Redis-compatible server, so that a retry is replayed whichever worker it reaches. A running
+    request holds a claim key that expires after `lock_ttl` seconds in case its worker dies.
+    """
+
+    def __init__(
+        self, url: str, ttl: float, lock_ttl: float, prefix: str = "idempotency:"
+    ) -> None:
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError(
+                "The redis idempotency backend requires the 'redis' package."
+            )
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.prefix = prefix
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.asyncio.Redis.from_url(url)
+
+    def _key(self, key: tuple[str, str], kind: str) -> str:
+        path, idempotency_key = key
+        return f"{self.prefix}{kind}:{path}:{idempotency_key}"
+
+    async def get(self, key: tuple[str, str]) -> Optional[StoredResponse]:
+        try:
+            data = await self._client.get(self._key(key, "response"))
+        except self._errors as e:
+            raise IdempotencyStoreError(str(e)) from e
+        return StoredResponse.loads(data) if data is not None else None
+
+    async def put(self, key: tuple[str, str], response: StoredResponse) -> None:
+        try:
+            await self._client.set(
+                self._key(key, "response"), response.dumps(), px=int(self.ttl * 1000)
+            )
+        except self._errors as e:
+            raise IdempotencyStoreError(str(e)) from e
+
+    async def claim(self, key: tuple[str, str], fingerprint: bytes) -> Optional[bytes]:
+        lock = self._key(key, "running")
+        try:
+            if await self._client.set(
+                lock, fingerprint, nx=True, px=int(self.lock_ttl * 1000)
+            ):
+                return None
+            # The other request may have finished since; an empty value lets the caller look for its response again.
+            return await self._client.get(lock) or b""
+        except self._errors as e:
+            raise IdempotencyStoreError(str(e)) from e
+
+    async def release(self, key: tuple[str, str]) -> None:
+        try:
+            await self._client.delete(self._key(key, "running"))
+        except self._errors as e:
+            raise IdempotencyStoreError(str(e)) from e
+
+
+class IdempotencyCache:
+    """
+    The response store plus the futures of the requests still running in this process.
+    """
+
+    def __init__(self, store: IdempotencyStore) -> None:
+        self.store = store
+        self.inflight: dict[tuple[str, str], tuple[bytes, asyncio.Future]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.mismatches = 0
+        self.conflicts = 0
+        self.store_errors = 0
+
+    @classmethod
+    def from_env(cls) -> "IdempotencyCache":
+        ttl = float(os.getenv("IDEMPOTENCY_TTL", "3600"))
+        if os.getenv("IDEMPOTENCY_BACKEND", "memory") == "redis":
+            store: IdempotencyStore = RedisStore(
+                os.getenv("IDEMPOTENCY_REDIS_URL", "redis://localhost:6379/0"),
+                ttl=ttl,
+                lock_ttl=float(os.getenv("IDEMPOTENCY_LOCK_TTL", "60")),
+            )
+        else:
+            store = MemoryStore(
+                max_size=int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000")), ttl=ttl
+            )
+        return cls(store)
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.coalesced + self.misses
+        return {
+            "size": self.store.size(),
+            "in_flight": len(self.inflight),
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "mismatches": self.mismatches,
+            "conflicts": self.conflicts,
+            "store_errors": self.store_errors,
+            "evictions": self.store.evictions(),
+            "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+idempotency_cache = IdempotencyCache.from_env()
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware applying `idempotency_cache` to the write endpoints in IDEMPOTENT_PATHS. Requests without an
+    `Idempotency-Key` header pass straight through.
+    """
+
+    def __init__(self, app: Any, cache: Optional[IdempotencyCache] = None) -> None:
+        self.app = app
+        self.cache = cache or idempotency_cache
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or scope["path"] not in IDEMPOTENT_PATHS:
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = next(
+            (value for name, value in scope["headers"] if name == HEADER), None
+        )
+        if idempotency_key is None:
+            await self.app(scope, receive, send)
+            return
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            await project.responses.error_response("Idempotency-Key is too long.", 400)(
+                scope, receive, send
+            )
+            return
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            body.extend(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        fingerprint = hashlib.sha256(
+            b"\0".join(
+                [
+                    scope["method"].encode(),
+                    scope["path"].encode(),
+                    scope["query_string"],
+                    bytes(body),
+                ]
+            )
+        ).digest()
+        key = (scope["path"], idempotency_key.decode("latin-1"))
+        body_sent = False
+
+        async def replay_receive() -> dict[str, Any]:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": bytes(body), "more_body": False}
+
+        try:
+            if await self._replay_stored(key, fingerprint, scope, receive, send):
+                return
+            inflight = self.cache.inflight.get(key)
+            if inflight is not None:
+                if inflight[0] != fingerprint:
+                    await self._mismatch(scope, receive, send)
+                    return
+                self.cache.coalesced += 1
+                await self._replay(await asyncio.shield(inflight[1]), send)
+                return
+            running = await self.cache.store.claim(key, fingerprint)
+        except IdempotencyStoreError:
+            self._store_failed()
+            await self.app(scope, replay_receive, send)
+            return
+        if running is not None:
+            if await self._replay_stored(key, fingerprint, scope, receive, send):
+                return
+            if running and running != fingerprint:
+                await self._mismatch(scope, receive, send)
+                return
+            self.cache.conflicts += 1
+            await project.responses.error_response(
+                "A request with this Idempotency-Key is still in progress.",
+                409,
+                headers={"Retry-After": "1"},
+            )(scope, receive, send)
+            return
+
+        self.cache.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.cache.inflight[key] = (fingerprint, future)
+        status = 500
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+
+        async def capture(message: dict[str, Any]) -> None:
+            nonlocal status, headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture)
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when no duplicate is waiting on it.
+            future.exception()
+            raise
+        else:
+            stored = StoredResponse(fingerprint, status, headers, b"".join(chunks))
+            future.set_result(stored)
+            if stored.cacheable():
+                try:
+                    await self.cache.store.put(key, stored)
+                except IdempotencyStoreError:
+                    self._store_failed()
+        finally:
+            del self.cache.inflight[key]
+            try:
+                await self.cache.store.release(key)
+            except IdempotencyStoreError:
+                self._store_failed()
+
+    def _store_failed(self) -> None:
+        # The response has been or will be sent regardless; only a later retry loses its replay.
+        self.cache.store_errors += 1
+        logger.warning("Idempotency store unavailable", exc_info=True)
+
+    async def _replay_stored(
+        self,
+        key: tuple[str, str],
+        fingerprint: bytes,
+        scope: dict[str, Any],
+        receive: Any,
+        send: Any,
+    ) -> bool:
+        stored = await self.cache.store.get(key)
+        if stored is None:
+            return False
+        if stored.fingerprint != fingerprint:
+            await self._mismatch(scope, receive, send)
+        else:
+            self.cache.hits += 1
+            await self._replay(stored, send)
+        return True
+
+    async def _replay(self, stored: StoredResponse, send: Any) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": stored.status,
+                "headers": [*stored.headers, (b"idempotent-replayed", b"true")],
+            }
+        )
+        await send({"type": "http.response.body", "body": stored.body})
+
+    async def _mismatch(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        self.cache.mismatches += 1
+        await project.responses.error_response(
+            "Idempotency-Key was already used for a different request.", 422
+        )(scope, receive, send)
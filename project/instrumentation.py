@@ -0,0 +1,327 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Collection, Iterator, Optional
+
+from prisma import Prisma
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+SLOW_REQUEST_SECONDS = float(os.getenv("SLOW_REQUEST_MS", "0")) / 1000
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels: str, value: float) -> None:
+        self._values[labels] = value
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        # Layout: one count per bucket, then the +Inf count, then the sum.
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for labels, series in self._series.items():
+            for bound, count in zip(self.buckets, series):
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, labels + (repr(bound),))} {count:g}"
+                )
+            lines.append(
+                f"{self.name}_bucket{_format_labels(names, labels + ('+Inf',))} {series[-2]:g}"
+            )
+            lines.append(
+                f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]}"
+            )
+            lines.append(
+                f"{self.name}_count{_format_labels(self.labels, labels)} {series[-2]:g}"
+            )
+        return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests.",
+    ("method", "route", "status"),
+)
+
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled.", ("route",)
+)
+
+db_queries = Counter("db_queries_total", "Prisma queries issued.", ("model", "method"))
+
+db_queries_in_flight = Gauge(
+    "db_queries_in_flight", "Prisma queries currently running."
+)
+
+db_query_latency = Histogram(
+    "db_query_duration_seconds", "Time spent in Prisma queries.", ("model", "method")
+)
+
+phase_latency = Histogram(
+    "request_phase_duration_seconds",
+    "Time spent in each instrumented phase of a request.",
+    ("phase",),
+)
+
+_collectors: list[Callable[[], dict[str, float]]] = []
+
+_collector_prefixes: list[str] = []
+
+_collector_counters: list[frozenset[str]] = []
+
+_request_phases: ContextVar[Optional[dict[str, float]]] = ContextVar(
+    "request_phases", default=None
+)
+
+
+def register_collector(
+    prefix: str,
+    collect: Callable[[], dict[str, float]],
+    counters: Collection[str] = (),
+) -> None:
+    """
+    Registers a callable whose numeric stats are exported on every scrape. The keys listed in `counters` only ever
+    grow and are exported as `<prefix>_<key>_total` counters; every other key is a point-in-time value exported as a
+    `<prefix>_<key>` gauge.
+
+    Args:
+        prefix (str): Metric name prefix, e.g. "password_hasher".
+        collect (Callable[[], dict[str, float]]): Returns the current stats.
+        counters (Collection[str]): The keys of the monotonically increasing stats, e.g. "hits".
+    """
+    _collector_prefixes.append(prefix)
+    _collectors.append(collect)
+    _collector_counters.append(frozenset(counters))
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """
+    Times a phase of the current request, e.g. `with phase("bcrypt"): ...`. The time is recorded in the phase
+    histogram and added to the current request's breakdown for the slow-request log.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        phase_latency.observe(elapsed, name)
+        phases = _request_phases.get()
+        if phases is not None:
+            phases[name] = phases.get(name, 0.0) + elapsed
+            phases[f"{name}_count"] = phases.get(f"{name}_count", 0) + 1
+
+
+@contextmanager
+def query(model: str, method: str) -> Iterator[None]:
+    """
+    Counts and times one database query, e.g. `with query("User", "find_unique"): ...`.
+    """
+    started = time.perf_counter()
+    db_queries_in_flight.inc()
+    try:
+        with phase("db"):
+            yield
+    finally:
+        db_queries_in_flight.dec()
+        db_queries.inc(model, method)
+        db_query_latency.observe(time.perf_counter() - started, model, method)
+
+
+def db_query_count() -> int:
+    return int(db_queries.total())
+
+
+class InstrumentedPrisma(Prisma):
+    """
+    Prisma client that counts and times every query it issues.
+    """
+
+    async def _execute(
+        self,
+        *,
+        method: Any,
+        arguments: dict[str, Any],
+        model: Any = None,
+        root_selection: Optional[list[str]] = None,
+    ) -> Any:
+        with query(model.__name__ if model is not None else "raw", method):
+            return await super()._execute(
+                method=method,
+                arguments=arguments,
+                model=model,
+                root_selection=root_selection,
+            )
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency histograms and in-flight gauges. Requests slower than
+    SLOW_REQUEST_MS are logged with their phase breakdown.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+        self._routes: Optional[set[str]] = None
+
+    def _route(self, scope: dict[str, Any]) -> str:
+        # Only label known paths so that scanners cannot blow up the label cardinality.
+        if self._routes is None:
+            root = scope.get("app")
+            self._routes = {
+                getattr(route, "path", "") for route in getattr(root, "routes", [])
+            }
+        path = scope["path"]
+        return path if path in self._routes else "unmatched"
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        status = "500"
+
+        async def send_wrapper(message: dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        phases: dict[str, float] = {}
+        token = _request_phases.set(phases)
+        requests_in_flight.inc(route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            requests_in_flight.dec(route)
+            _request_phases.reset(token)
+            request_latency.observe(elapsed, scope["method"], route, status)
+            if SLOW_REQUEST_SECONDS and elapsed >= SLOW_REQUEST_SECONDS:
+                logger.warning(
+                    "Slow request %s %s (%s) took %.1fms: %s",
+                    scope["method"],
+                    route,
+                    status,
+                    elapsed * 1000,
+                    ", ".join(
+                        (
+                            f"{name}={value * 1000:.1f}ms"
+                            if not name.endswith("_count")
+                            else f"{name}={value:g}"
+                        )
+                        for name, value in phases.items()
+                    )
+                    or "no instrumented phases",
+                )
+
+
+def render() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    lines: list[str] = []
+    for metric in (
+        request_latency,
+        requests_in_flight,
+        db_queries,
+        db_queries_in_flight,
+        db_query_latency,
+        phase_latency,
+    ):
+        lines.extend(metric.render())
+    for prefix, collect, counters in zip(
+        _collector_prefixes, _collectors, _collector_counters
+    ):
+        for key, value in collect().items():
+            name = f"{prefix}_{key}"
+            if key not in counters:
+                lines.append(f"# TYPE {name} gauge")
+            else:
+                if not name.endswith("_total"):
+                    name += "_total"
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,247 @@
+"""
+Per-user, per-day, per-type Interaction counts.
+
+The rollup table is maintained incrementally by the interaction write buffer: every flush inserts its rows and bumps
+the matching rollup counters in the same transaction. This module also provides the maintenance jobs:
+
+    python -m project.interaction_rollups backfill [--since YYYY-MM-DD]
+    python -m project.interaction_rollups prune --days N
+
+`backfill` recomputes the rollups of every closed (UTC) day from the raw rows, which both seeds the table for rows
+recorded before rollups existed and compacts away any drift. `prune` deletes raw Interaction rows older than N days,
+but never rows of days that have not been backfilled yet, so no count is ever lost. It deletes in short chunks with
+pauses in between, like account deletion, so it never holds locks on more than one chunk of rows.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from collections import Counter
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, Iterable, Optional
+
+import prisma
+import prisma.enums
+import prisma.models
+import project.database
+
+STATE_ID = 1
+
+# Held while a day is recomputed. It conflicts with the ROW EXCLUSIVE lock taken by the upsert in `apply`, so flushes
+# either commit before the day is counted or add their rows on top of the recomputed rollups afterwards.
+LOCK_ROLLUPS = 'LOCK TABLE "InteractionRollup" IN SHARE ROW EXCLUSIVE MODE'
+
+RECOMPUTE_TIMEOUT = timedelta(minutes=5)
+
+PRUNE_CHUNK = (
+    'WITH "deleted" AS (DELETE FROM "Interaction" WHERE "id" IN'
+    ' (SELECT "id" FROM "Interaction" WHERE "id" > $1 AND "createdAt" < $2 ORDER BY "id" LIMIT $3)'
+    ' RETURNING "id") SELECT count(*)::int AS "rows", max("id") AS "last" FROM "deleted"'
+)
+
+
+def bucket_day(created_at: datetime) -> datetime:
+    """
+    Returns midnight UTC of the day an interaction belongs to.
+    """
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc)
+    return datetime.combine(created_at.date(), time(), tzinfo=timezone.utc)
+
+
+async def apply(client: prisma.Prisma, records: Iterable[dict[str, Any]]) -> None:
+    """
+    Adds freshly inserted Interaction rows to their rollup buckets with a single upsert statement. Call this in the
+    same transaction as the insert.
+
+    Args:
+        client (prisma.Prisma): The (transaction) client that inserted the rows.
+        records (Iterable[dict[str, Any]]): The inserted rows, as passed to `create_many`.
+    """
+    buckets = Counter(
+        (
+            record["userId"],
+            bucket_day(record["createdAt"]),
+            prisma.enums.InteractionType(record["type"]).value,
+        )
+        for record in records
+    )
+    if not buckets:
+        return
+    values = []
+    params: list[Any] = []
+    for (user_id, day, type), count in buckets.items():
+        offset = len(params)
+        values.append(
+            f'(${offset + 1}, ${offset + 2}::date, ${offset + 3}::"InteractionType", ${offset + 4})'
+        )
+        params.extend([user_id, day.date().isoformat(), type, count])
+    await client.execute_raw(
+        'INSERT INTO "InteractionRollup" ("userId", "day", "type", "count") VALUES '
+        + ", ".join(values)
+        + ' ON CONFLICT ("userId", "day", "type") DO UPDATE'
+        ' SET "count" = "InteractionRollup"."count" + EXCLUDED."count"',
+        *params,
+    )
+
+
+async def _state() -> prisma.models.InteractionRollupState:
+    return await prisma.models.InteractionRollupState.prisma().upsert(
+        where={"id": STATE_ID},
+        data={"create": {"id": STATE_ID}, "update": {}},
+    )
+
+
+async def backfill(since: Optional[date] = None) -> int:
+    """
+    Recomputes the rollups of closed days from the raw Interaction rows.
+
+    Args:
+        since (Optional[date]): The first day to recompute. Defaults to the last day recomputed by the previous run,
+            or to the day of the oldest stored interaction on the first run.
+
+    Returns:
+        int: The number of days recomputed.
+    """
+    state = await _state()
+    if since is not None:
+        day = datetime.combine(since, time(), tzinfo=timezone.utc)
+    elif state.backfilledThrough is not None:
+        # Re-check the last closed day in case rows recorded around midnight were flushed late.
+        day = bucket_day(state.backfilledThrough) - timedelta(days=1)
+    else:
+        oldest = await prisma.models.Interaction.prisma().find_first(
+            order={"createdAt": "asc"}
+        )
+        if oldest is None:
+            return 0
+        day = bucket_day(oldest.createdAt)
+    if state.prunedBefore is not None:
+        # Raw rows of these days are gone, so their rollups are already final.
+        day = max(day, bucket_day(state.prunedBefore))
+    today = bucket_day(datetime.now(timezone.utc))
+    days = 0
+    while day < today:
+        next_day = day + timedelta(days=1)
+        # Counting and replacing happen in one transaction under LOCK_ROLLUPS, so a flush that commits in between
+        # is neither counted twice nor lost.
+        async with prisma.get_client().tx(timeout=RECOMPUTE_TIMEOUT) as transaction:
+            await transaction.execute_raw(LOCK_ROLLUPS)
+            groups = await prisma.models.Interaction.prisma(transaction).group_by(
+                by=["userId", "type"],
+                where={"createdAt": {"gte": day, "lt": next_day}},
+                count=True,
+            )
+            await prisma.models.InteractionRollup.prisma(transaction).delete_many(
+                where={"day": day}
+            )
+            if groups:
+                await prisma.models.InteractionRollup.prisma(transaction).create_many(
+                    data=[
+                        {
+                            "userId": group["userId"],
+                            "day": day,
+                            "type": group["type"],
+                            "count": group["_count"]["_all"],
+                        }
+                        for group in groups
+                    ]
+                )
+            if state.backfilledThrough is None or state.backfilledThrough < next_day:
+                await prisma.models.InteractionRollupState.prisma(transaction).update(
+                    where={"id": STATE_ID}, data={"backfilledThrough": next_day}
+                )
+        day = next_day
+        days += 1
+    return days
+
+
+async def prune(
+    retention_days: int, chunk_size: int = 1000, chunk_pause: float = 0.05
+) -> int:
+    """
+    Deletes raw Interaction rows older than the retention period whose days have already been backfilled, walking
+    the table in id order and deleting at most `chunk_size` rows per statement.
+
+    Args:
+        retention_days (int): How many days of raw rows to keep.
+        chunk_size (int): Rows deleted per statement.
+        chunk_pause (float): Seconds to sleep between two chunks, so that other queries get the database.
+
+    Returns:
+        int: The number of rows deleted.
+    """
+    state = await _state()
+    if state.backfilledThrough is None:
+        return 0
+    cutoff = min(
+        bucket_day(datetime.now(timezone.utc) - timedelta(days=retention_days)),
+        state.backfilledThrough,
+    )
+    # Recorded first: once any row of these days is gone, backfill must no longer recompute them.
+    if state.prunedBefore is None or state.prunedBefore < cutoff:
+        await prisma.models.InteractionRollupState.prisma().update(
+            where={"id": STATE_ID}, data={"prunedBefore": cutoff}
+        )
+    client = project.database.get_client()
+    deleted = 0
+    last_id = 0
+    while True:
+        rows = await client.query_raw(PRUNE_CHUNK, last_id, cutoff, chunk_size)
+        chunk = rows[0]["rows"]
+        deleted += chunk
+        if chunk < chunk_size:
+            return deleted
+        last_id = rows[0]["last"]
+        await asyncio.sleep(chunk_pause)
+
+
+async def _run(args: argparse.Namespace) -> None:
+    await project.database.connect()
+    try:
+        if args.command == "backfill":
+            days = await backfill(args.since)
+            print(f"Recomputed rollups for {days} day(s).")
+        else:
+            rows = await prune(args.days, args.chunk_size, args.chunk_pause)
+            print(f"Pruned {rows} raw interaction(s).")
+    finally:
+        await project.database.disconnect()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m project.interaction_rollups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = commands.add_parser(
+        "backfill", help="recompute rollups of closed days from raw rows"
+    )
+    backfill_parser.add_argument("--since", type=date.fromisoformat)
+    prune_parser = commands.add_parser(
+        "prune", help="delete raw rows that are already rolled up"
+    )
+    prune_parser.add_argument(
+        "--days",
+        type=int,
+        default=int(os.getenv("INTERACTION_RETENTION_DAYS", "0")) or None,
+        required=not os.getenv("INTERACTION_RETENTION_DAYS"),
+        help="days of raw rows to keep (default: INTERACTION_RETENTION_DAYS)",
+    )
+    prune_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=int(os.getenv("INTERACTION_PRUNE_CHUNK_SIZE", "1000")),
+        help="rows deleted per statement",
+    )
+    prune_parser.add_argument(
+        "--chunk-pause",
+        type=float,
+        default=float(os.getenv("INTERACTION_PRUNE_CHUNK_PAUSE", "0.05")),
+        help="seconds to pause between chunks",
+    )
+    asyncio.run(_run(parser.parse_args(argv)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
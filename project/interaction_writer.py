@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Collection, Optional
+
+import prisma.enums
+import project.storage
+
+logger = logging.getLogger(__name__)
+
+DROP_NEWEST = "drop_newest"
+
+DROP_OLDEST = "drop_oldest"
+
+
+class InteractionWriteBuffer:
+    """
+    Write-behind buffer for Interaction rows.
+
+    Records are queued in memory and written with a single batched insert once `max_batch` rows are pending or
+    `flush_interval` seconds have passed, whichever comes first. At most `max_pending` rows are held in memory.
+    When the buffer is full the overflow policy decides what is lost:
+
+    - `drop_newest` (default): the incoming record is rejected, so rows already accepted are never lost.
+    - `drop_oldest`: the oldest pending record is discarded to make room for the incoming one.
+
+    Either way the lost row is counted in `dropped`. Rows from a failed flush are put back at the front of the
+    buffer, subject to the same cap. When the database cannot be reached or times out, the whole batch is kept and
+    the flusher backs off exponentially, from `flush_interval` up to `max_backoff` seconds, before trying again.
+    Only a batch the database rejects for its content (`project.storage.InvalidRecordError`) `max_failures` times
+    in a row is halved, so that a row that can never be written (e.g. of a user purged by another worker) is
+    isolated; once it fails `max_failures` times on its own it is logged and dropped instead of blocking every row
+    behind it.
+    """
+
+    def __init__(
+        self,
+        max_batch: int,
+        flush_interval: float,
+        max_pending: int,
+        overflow_policy: str = DROP_NEWEST,
+        max_failures: int = 5,
+        max_backoff: float = 30.0,
+    ) -> None:
+        if overflow_policy not in (DROP_NEWEST, DROP_OLDEST):
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.overflow_policy = overflow_policy
+        self.max_failures = max_failures
+        self.max_backoff = max_backoff
+        self._pending: deque[dict] = deque()
+        self._batch_limit = max_batch
+        self._consecutive_failures = 0
+        self._unavailable_failures = 0
+        self._retry_at = 0.0
+        self._closing = False
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self._flushed = 0
+        self._dropped = 0
+        self._failed_flushes = 0
+        self._dead_lettered = 0
+
+    @classmethod
+    def from_env(cls) -> "InteractionWriteBuffer":
+        return cls(
+            max_batch=int(os.getenv("INTERACTION_FLUSH_BATCH", "500")),
+            flush_interval=float(os.getenv("INTERACTION_FLUSH_INTERVAL", "0.5")),
+            max_pending=int(os.getenv("INTERACTION_MAX_PENDING", "50000")),
+            overflow_policy=os.getenv("INTERACTION_OVERFLOW_POLICY", DROP_NEWEST),
+            max_failures=int(os.getenv("INTERACTION_FLUSH_MAX_FAILURES", "5")),
+            max_backoff=float(os.getenv("INTERACTION_FLUSH_MAX_BACKOFF", "30")),
+        )
+
+    def enqueue(
+        self, user_id: int, type: prisma.enums.InteractionType, content: str
+    ) -> bool:
+        """
+        Queues an Interaction row for the next flush.
+
+        Args:
+            user_id (int): The user the interaction belongs to.
+            type (prisma.enums.InteractionType): Whether the interaction came through the API or the CLI.
+            content (str): The content returned to the user.
+
+        Returns:
+            bool: False if the record was dropped because the buffer is full.
+        """
+        record = {
+            "userId": user_id,
+            "type": type,
+            "content": content,
+            "createdAt": datetime.now(timezone.utc),
+        }
+        if len(self._pending) >= self.max_pending:
+            self._dropped += 1
+            if self.overflow_policy == DROP_NEWEST:
+                return False
+            self._pending.popleft()
+        self._pending.append(record)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        return True
+
+    def discard_users(self, user_ids: Collection[int]) -> int:
+        """
+        Drops every pending row of users that are about to be deleted, so that the next flush does not fail on
+        the foreign key.
+
+        Args:
+            user_ids (Collection[int]): The users being deleted.
+
+        Returns:
+            int: The number of rows dropped.
+        """
+        kept = deque(
+            record for record in self._pending if record["userId"] not in user_ids
+        )
+        discarded = len(self._pending) - len(kept)
+        self._pending = kept
+        return discarded
+
+    async def flush(self) -> int:
+        """
+        Writes up to `max_batch` pending rows with one batched insert. The Postgres backend updates their rollup
+        counters in the same transaction.
+
+        Returns:
+            int: The number of rows written.
+        """
+        async with self._flush_lock:
+            batch = []
+            while self._pending and len(batch) < self._batch_limit:
+                batch.append(self._pending.popleft())
+            if not batch:
+                return 0
+            try:
+                await project.storage.backend.insert_interactions(batch)
+            except asyncio.CancelledError:
+                self._requeue(batch)
+                raise
+            except project.storage.InvalidRecordError:
+                self._failed_flushes += 1
+                self._consecutive_failures += 1
+                self._unavailable_failures = 0
+                self._retry_at = 0.0
+                logger.exception("Database rejected %d interactions", len(batch))
+                if self._consecutive_failures < self.max_failures:
+                    self._requeue(batch)
+                elif len(batch) > 1:
+                    # Halve the batch until the row that keeps failing is on its own.
+                    self._consecutive_failures = 0
+                    self._batch_limit = max(1, len(batch) // 2)
+                    self._requeue(batch)
+                else:
+                    self._consecutive_failures = 0
+                    self._dead_lettered += 1
+                    self._dropped += 1
+                    logger.error(
+                        "Dropping interaction of user %d at %s after %d failed flushes",
+                        batch[0]["userId"],
+                        batch[0]["createdAt"].isoformat(),
+                        self.max_failures,
+                    )
+                return 0
+            except Exception:
+                # The database could not take the write at all; no row is at fault, so keep the batch whole.
+                self._failed_flushes += 1
+                self._unavailable_failures += 1
+                delay = min(
+                    self.max_backoff,
+                    self.flush_interval * 2 ** (self._unavailable_failures - 1),
+                )
+                self._retry_at = asyncio.get_running_loop().time() + delay
+                logger.exception(
+                    "Failed to flush %d interactions, retrying in %.1fs",
+                    len(batch),
+                    delay,
+                )
+                self._requeue(batch)
+                return 0
+            self._consecutive_failures = 0
+            self._unavailable_failures = 0
+            self._retry_at = 0.0
+            self._batch_limit = min(self.max_batch, self._batch_limit * 2)
+            self._flushed += len(batch)
+            return len(batch)
+
+    def _requeue(self, batch: list[dict]) -> None:
+        # Puts the rows of an unsuccessful flush back at the front, subject to the max_pending cap.
+        room = self.max_pending - len(self._pending)
+        self._dropped += max(0, len(batch) - room)
+        self._pending.extendleft(reversed(batch[: max(0, room)]))
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if asyncio.get_running_loop().time() < self._retry_at:
+                continue
+            while not self._closing and await self.flush() >= self.max_batch:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            # A fresh event, as the app may be started again on another event loop; rows already pending are
+            # flushed within flush_interval either way.
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stops the background flusher and drains every pending row before returning. A flush that is in progress is
+        allowed to finish rather than cancelled, so its rows are neither lost nor written twice.
+        """
+        if self._task is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._pending:
+            if not await self.flush():
+                break
+        if self._pending:
+            logger.error(
+                "Dropping %d interactions that could not be flushed on shutdown",
+                len(self._pending),
+            )
+            self._dropped += len(self._pending)
+            self._pending.clear()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "flushed": self._flushed,
+            "dropped": self._dropped,
+            "failed_flushes": self._failed_flushes,
+            "dead_lettered": self._dead_lettered,
+            "batch_limit": self._batch_limit,
+        }
+
+
+interaction_buffer = InteractionWriteBuffer.from_env()
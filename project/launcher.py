@@ -0,0 +1,217 @@
+"""
+Production launcher running the app in several worker processes that share one listening socket.
+
+Usage:
+    python -m project.launcher --host 0.0.0.0 --port 8000 [--workers N]
+    python -m project.launcher --profile-startup [--max-seconds S]
+
+Each worker imports `project.server:app` on its own and connects its own database client in the app's lifespan, so
+the connection pool settings (DB_POOL_SIZE etc.) apply per worker; by default the workers split DB_MAX_CONNECTIONS.
+Forwarded client addresses (X-Forwarded-For) are only trusted from FORWARDED_ALLOW_IPS. The supervisor restarts workers that die and
+handles these signals:
+
+    SIGTERM / SIGINT  graceful shutdown: workers stop accepting, finish in-flight requests and flush buffers
+    SIGHUP            rolling restart: workers are replaced one at a time, each only after its replacement is serving
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.context import SpawnProcess
+from multiprocessing.synchronize import Event
+from typing import Any, Optional
+
+import uvicorn
+
+logger = logging.getLogger("project.launcher")
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def _serve(
+    app: str, options: dict[str, Any], sock: socket.socket, started: Event
+) -> None:
+    config = uvicorn.Config(app, **options)
+    server = uvicorn.Server(config)
+
+    def announce() -> None:
+        while not server.started and not server.should_exit:
+            time.sleep(0.05)
+        if server.started:
+            started.set()
+
+    threading.Thread(target=announce, daemon=True).start()
+    server.run(sockets=[sock])
+
+
+class Worker:
+    def __init__(self, app: str, options: dict[str, Any], sock: socket.socket) -> None:
+        self.started = spawn.Event()
+        self.process: SpawnProcess = spawn.Process(
+            target=_serve, args=(app, options, sock, self.started), daemon=False
+        )
+        self.process.start()
+
+    def terminate(self) -> None:
+        # uvicorn treats a second SIGTERM as a request to exit immediately, so only send one.
+        if self.process.is_alive():
+            os.kill(self.process.pid, signal.SIGTERM)
+
+    def stop(self, grace: float) -> None:
+        self.terminate()
+        self.wait(grace)
+
+    def wait(self, grace: float) -> None:
+        self.process.join(grace)
+        if self.process.is_alive():
+            logger.warning(
+                "Worker %s did not stop within %ss, killing it", self.process.pid, grace
+            )
+            self.process.kill()
+            self.process.join()
+
+
+class Supervisor:
+    def __init__(
+        self,
+        app: str,
+        workers: int,
+        options: dict[str, Any],
+        graceful_timeout: float,
+        startup_timeout: float,
+    ) -> None:
+        self.app = app
+        self.size = workers
+        self.options = options
+        self.graceful_timeout = graceful_timeout
+        self.startup_timeout = startup_timeout
+        self.workers: list[Worker] = []
+        self._should_exit = False
+        self._should_reload = False
+
+    def _spawn(self, sock: socket.socket) -> Worker:
+        worker = Worker(self.app, self.options, sock)
+        logger.info("Started worker %s", worker.process.pid)
+        return worker
+
+    def _rolling_restart(self, sock: socket.socket) -> None:
+        logger.info("Rolling restart of %d workers", len(self.workers))
+        for index, old in enumerate(list(self.workers)):
+            if self._should_exit:
+                return
+            new = self._spawn(sock)
+            if not new.started.wait(self.startup_timeout):
+                logger.error(
+                    "Replacement worker %s did not start, keeping worker %s",
+                    new.process.pid,
+                    old.process.pid,
+                )
+                new.stop(self.graceful_timeout)
+                continue
+            self.workers[index] = new
+            old.stop(self.graceful_timeout)
+            logger.info("Replaced worker %s", old.process.pid)
+
+    def run(self, sock: socket.socket) -> None:
+        signal.signal(signal.SIGTERM, self._handle_exit)
+        signal.signal(signal.SIGINT, self._handle_exit)
+        signal.signal(signal.SIGHUP, self._handle_reload)
+        self.workers = [self._spawn(sock) for _ in range(self.size)]
+        while not self._should_exit:
+            if self._should_reload:
+                self._should_reload = False
+                self._rolling_restart(sock)
+            for index, worker in enumerate(self.workers):
+                if not worker.process.is_alive() and not self._should_exit:
+                    logger.warning(
+                        "Worker %s exited with %s, restarting it",
+                        worker.process.pid,
+                        worker.process.exitcode,
+                    )
+                    self.workers[index] = self._spawn(sock)
+            time.sleep(0.5)
+        logger.info("Shutting down %d workers", len(self.workers))
+        for worker in self.workers:
+            worker.terminate()
+        deadline = time.monotonic() + self.graceful_timeout
+        for worker in self.workers:
+            worker.wait(max(0.0, deadline - time.monotonic()))
+
+    def _handle_exit(self, signum: int, frame: Any) -> None:
+        self._should_exit = True
+
+    def _handle_reload(self, signum: int, frame: Any) -> None:
+        self._should_reload = True
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m project.launcher")
+    parser.add_argument("--app", default="project.server:app")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(os.getenv("WEB_CONCURRENCY", "0")) or os.cpu_count() or 1,
+        help="worker processes (default: WEB_CONCURRENCY or the CPU count)",
+    )
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=float(os.getenv("GRACEFUL_TIMEOUT", "30")),
+        help="seconds a worker may take to finish in-flight requests on shutdown",
+    )
+    parser.add_argument(
+        "--startup-timeout",
+        type=float,
+        default=float(os.getenv("STARTUP_TIMEOUT", "60")),
+        help="seconds a replacement worker may take to start during a rolling restart",
+    )
+    parser.add_argument(
+        "--forwarded-allow-ips",
+        default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+        help="comma-separated proxy addresses whose X-Forwarded-* headers are trusted, or * for any",
+    )
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="print per-module import times and startup phase timings instead of serving",
+    )
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        help="with --profile-startup, exit with status 1 if the cold start takes longer",
+    )
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper())
+    if args.profile_startup:
+        import project.startup
+
+        return project.startup.profile(args.app, max_seconds=args.max_seconds)
+    options = {
+        "log_level": args.log_level,
+        "timeout_graceful_shutdown": args.graceful_timeout,
+        "proxy_headers": True,
+        "forwarded_allow_ips": args.forwarded_allow_ips,
+    }
+    # Spawned workers inherit the environment, so each sizes its pool for the actual number of workers.
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    sock = uvicorn.Config(args.app, host=args.host, port=args.port).bind_socket()
+    logger.info("Serving on %s:%d with %d workers", args.host, args.port, args.workers)
+    Supervisor(
+        args.app, args.workers, options, args.graceful_timeout, args.startup_timeout
+    ).run(sock)
+    sock.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+import base64
+import csv
+import io
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+
+import prisma
+import prisma.enums
+import prisma.models
+import project.auth
+from pydantic import BaseModel
+
+EXPORT_BATCH_SIZE = 1000
+
+
+class InteractionItem(BaseModel):
+    """
+    A single recorded hello-world interaction.
+    """
+
+    id: int
+    user_id: int
+    type: prisma.enums.InteractionType
+    content: str
+    created_at: datetime
+
+
+class InteractionPage(BaseModel):
+    """
+    One page of interactions in id order, which is the order they were written in. Pass `next_cursor` back to fetch
+    the following page; it is None on the last page.
+    """
+
+    items: List[InteractionItem]
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(interaction_id: int) -> str:
+    return base64.urlsafe_b64encode(str(interaction_id).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    except ValueError:
+        raise ValueError("Invalid cursor.")
+    # Only cursors exactly as encode_cursor issues them are accepted.
+    if not (raw.isascii() and raw.isdigit()) or encode_cursor(int(raw)) != cursor:
+        raise ValueError("Invalid cursor.")
+    return int(raw)
+
+
+def _where(
+    claims: project.auth.TokenClaims,
+    user_id: Optional[int],
+    type: Optional[prisma.enums.InteractionType],
+    since: Optional[datetime],
+    until: Optional[datetime],
+) -> dict[str, Any]:
+    if claims.role != prisma.enums.Role.Administrator:
+        if user_id is not None and user_id != claims.user_id:
+            raise PermissionError("Users can only read their own interactions.")
+        user_id = claims.user_id
+    where: dict[str, Any] = {}
+    if user_id is not None:
+        where["userId"] = user_id
+    if type is not None:
+        where["type"] = type
+    created_at: dict[str, datetime] = {}
+    if since is not None:
+        created_at["gte"] = since
+    if until is not None:
+        created_at["lt"] = until
+    if created_at:
+        where["createdAt"] = created_at
+    return where
+
+
+async def _fetch_page(
+    where: dict[str, Any], after: Optional[int], limit: int
+) -> list[prisma.models.Interaction]:
+    # Pages are keyed on id rather than createdAt. createdAt is set when an interaction is recorded, but the row is
+    # only inserted by a later flush of the write buffer, so a createdAt cursor could pass rows that are still
+    # buffered and skip them once they land. Ids are assigned when the row is inserted.
+    if after is not None:
+        where = {"AND": [where, {"id": {"gt": after}}]}
+    return await prisma.models.Interaction.prisma().find_many(
+        where=where, order={"id": "asc"}, take=limit
+    )
+
+
+def _item(interaction: prisma.models.Interaction) -> InteractionItem:
+    return InteractionItem(
+        id=interaction.id,
+        user_id=interaction.userId,
+        type=interaction.type,
+        content=interaction.content,
+        created_at=interaction.createdAt,
+    )
+
+
+async def listInteractions(
+    claims: project.auth.TokenClaims,
+    user_id: Optional[int] = None,
+    type: Optional[prisma.enums.InteractionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 100,
+) -> InteractionPage:
+    """
+    Returns one keyset-paginated page of recorded interactions. Administrators can read every user's interactions;
+    other users can only read their own.
+
+    Args:
+        claims (project.auth.TokenClaims): The verified token claims of the caller.
+        user_id (Optional[int]): Only return interactions of this user.
+        type (Optional[prisma.enums.InteractionType]): Only return API or CLI interactions.
+        since (Optional[datetime]): Only return interactions created at or after this time.
+        until (Optional[datetime]): Only return interactions created before this time.
+        cursor (Optional[str]): The `next_cursor` of the previous page.
+        limit (int): The maximum number of interactions to return.
+
+    Returns:
+        InteractionPage: One page of interactions in id order.
+    """
+    where = _where(claims, user_id, type, since, until)
+    after = decode_cursor(cursor) if cursor else None
+    rows = await _fetch_page(where, after, limit + 1)
+    items = [_item(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(items[-1].id)
+    return InteractionPage(items=items, next_cursor=next_cursor)
+
+
+async def _iter_interactions(where: dict[str, Any]) -> AsyncIterator[InteractionItem]:
+    after = None
+    while True:
+        rows = await _fetch_page(where, after, EXPORT_BATCH_SIZE)
+        for row in rows:
+            yield _item(row)
+        if len(rows) < EXPORT_BATCH_SIZE:
+            return
+        after = rows[-1].id
+
+
+async def exportInteractions(
+    claims: project.auth.TokenClaims,
+    format: str = "ndjson",
+    user_id: Optional[int] = None,
+    type: Optional[prisma.enums.InteractionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> AsyncIterator[str]:
+    """
+    Streams every matching interaction as NDJSON or CSV. Rows are read in fixed-size keyset pages and encoded one
+    page at a time, so memory use does not depend on the size of the table.
+
+    Args:
+        claims (project.auth.TokenClaims): The verified token claims of the caller.
+        format (str): Either "ndjson" or "csv".
+        user_id (Optional[int]): Only export interactions of this user.
+        type (Optional[prisma.enums.InteractionType]): Only export API or CLI interactions.
+        since (Optional[datetime]): Only export interactions created at or after this time.
+        until (Optional[datetime]): Only export interactions created before this time.
+
+    Returns:
+        AsyncIterator[str]: The encoded export, in chunks.
+    """
+    if format not in ("ndjson", "csv"):
+        raise ValueError("Unsupported export format. Expected 'ndjson' or 'csv'.")
+    # Validate the filters before the response starts streaming.
+    where = _where(claims, user_id, type, since, until)
+    fields = list(InteractionItem.model_fields)
+
+    async def generate() -> AsyncIterator[str]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(fields)
+        count = 0
+        async for item in _iter_interactions(where):
+            if format == "csv":
+                writer.writerow(
+                    [
+                        item.id,
+                        item.user_id,
+                        item.type.value,
+                        item.content,
+                        item.created_at.isoformat(),
+                    ]
+                )
+            else:
+                buffer.write(item.model_dump_json())
+                buffer.write("\n")
+            count += 1
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    return generate()
@@ -1,10 +1,10 @@
-from datetime import datetime, timedelta
 from typing import Optional
 
-import bcrypt
-import jwt
 import prisma
-import prisma.models
+import project.auth
+import project.password_hasher
+import project.password_rehash
+import project.user_repository
 from pydantic import BaseModel
 
 
@@ -19,7 +19,7 @@ class LoginResponse(BaseModel):
 
 async def loginUser(username: str, password: str) -> LoginResponse:
     """
-    This endpoint authenticates a user by checking username and password against stored records. If credentials are valid, it generates and returns an authentication token (JWT) used for subsequent requests. On failure, it returns an error message.
+    This endpoint authenticates a user by checking username and password against stored records. If credentials are valid, it generates and returns an authentication token (JWT) used for subsequent requests, and upgrades a password hash below the configured bcrypt cost in the background. On failure, it returns an error message.
 
     Args:
         username (str): The username of the user trying to log in.
@@ -28,15 +28,10 @@ async def loginUser(username: str, password: str) -> LoginResponse:
     Returns:
         LoginResponse: This model encapsulates the response from the login attempt, which could either be a JWT token on successful authentication or an error message on failure.
     """
-    user = await prisma.models.User.prisma().find_unique(where={"email": username})
-    if user and bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
-        expiration_time = datetime.utcnow() + timedelta(days=2)
-        payload = {
-            "user_id": user.id,
-            "email": user.email,
-            "role": user.role.name,
-            "exp": expiration_time,
-        }
-        token = jwt.encode(payload, "your_jwt_secret_here", algorithm="HS256")
+    # Never check a password against a cached row: it may be outdated or belong to a deleted user.
+    user = await project.user_repository.get_fresh_user_by_email(username)
+    if user and await project.password_hasher.check_password(password, user.password):
+        project.password_rehash.password_rehasher.schedule(user, password)
+        token = project.auth.issue_token(user)
         return LoginResponse(token=token)
     return LoginResponse(token="", error="Invalid login credentials.")
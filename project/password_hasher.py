@@ -0,0 +1,315 @@
+"""
+bcrypt hashing on a bounded worker pool, plus cost factor maintenance:
+
+    python -m project.password_hasher calibrate [--target-ms 250]
+    python -m project.password_hasher report
+
+`calibrate` measures how long one verification takes on this host at every cost factor and recommends the highest
+cost that stays within the target, to be set as BCRYPT_ROUNDS. `report` shows how many stored password hashes use
+each cost factor. Hashes below BCRYPT_ROUNDS are upgraded transparently the next time their user logs in.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+import bcrypt
+import project.instrumentation
+
+# Passwords of a batch hashed per worker call; small so that a batch never holds a worker for long.
+BATCH_CHUNK_SIZE = 2
+
+
+class PasswordHasherSaturatedError(Exception):
+    """
+    Raised when the password hashing queue is full. Callers should shed the request (503) instead of waiting.
+    """
+
+
+def _hash(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _hash_batch(passwords: list[bytes], rounds: int) -> list[bytes]:
+    return [_hash(password, rounds) for password in passwords]
+
+
+def _check(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """
+    Returns the cost factor of a bcrypt hash such as "$2b$12$...", or None if the value is not a bcrypt hash.
+    """
+    parts = hashed.split("$", 4)
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing and verification on a bounded worker pool so that the event loop is never blocked.
+
+    At most `workers` calls run at once and at most `max_queue` more may wait for a free worker. Any call beyond
+    that raises PasswordHasherSaturatedError immediately, which gives fast backpressure under login bursts.
+    """
+
+    def __init__(
+        self, workers: int, max_queue: int, rounds: int, executor_kind: str = "thread"
+    ) -> None:
+        if executor_kind not in ("thread", "process"):
+            raise ValueError(f"Unknown password hash executor: {executor_kind}")
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.executor_kind = executor_kind
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self._completed = 0
+        self._rejected = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    @classmethod
+    def from_env(cls) -> "PasswordHasher":
+        return cls(
+            workers=int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1)),
+            max_queue=int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "64")),
+            rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+            executor_kind=os.getenv("PASSWORD_HASH_EXECUTOR", "thread"),
+        )
+
+    def _get_executor(self) -> Executor:
+        # Created lazily so that process pools are only started inside the serving process.
+        if self._executor is None:
+            if self.executor_kind == "process":
+                # Imported here so that thread-mode workers never load multiprocessing.
+                from concurrent.futures import ProcessPoolExecutor
+
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hasher"
+                )
+        return self._executor
+
+    async def warm(self) -> None:
+        """
+        Starts the worker pool ahead of the first request. Every worker runs one minimum-cost hash, so process workers
+        are spawned and have bcrypt loaded before a login has to wait for them.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, _hash, b"warm-up", 4)
+                for _ in range(self.workers)
+            )
+        )
+
+    async def _submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self._pending >= self.workers + self.max_queue:
+            self._rejected += 1
+            raise PasswordHasherSaturatedError("Password hashing capacity exhausted.")
+        self._pending += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            with project.instrumentation.phase("bcrypt"):
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pending -= 1
+            elapsed = time.perf_counter() - started
+            self._completed += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+
+    async def hash(self, password: str) -> str:
+        """
+        Hashes a password with the configured bcrypt cost factor.
+
+        Args:
+            password (str): The plain-text password.
+
+        Returns:
+            str: The bcrypt hash, decoded as UTF-8 for storage.
+        """
+        hashed = await self._submit(_hash, password.encode("utf-8"), self.rounds)
+        return hashed.decode("utf-8")
+
+    async def hash_many(self, passwords: list[str]) -> list[str]:
+        """
+        Hashes many passwords in parallel. The passwords are hashed in chunks of BATCH_CHUNK_SIZE, each submitted
+        like a single hash and so counted against the queue bound. At most half of the workers hash chunks of one
+        batch at a time, so logins keep getting workers and wait behind at most one small chunk.
+
+        Args:
+            passwords (list[str]): The plain-text passwords.
+
+        Returns:
+            list[str]: The bcrypt hashes, in the same order as `passwords`.
+
+        Raises:
+            PasswordHasherSaturatedError: If the queue is full when a chunk is submitted.
+        """
+        encoded = [password.encode("utf-8") for password in passwords]
+        chunks = [
+            encoded[i : i + BATCH_CHUNK_SIZE]
+            for i in range(0, len(encoded), BATCH_CHUNK_SIZE)
+        ]
+        slots = asyncio.Semaphore(max(1, self.workers // 2))
+
+        async def hash_chunk(chunk: list[bytes]) -> list[bytes]:
+            async with slots:
+                return await self._submit(_hash_batch, chunk, self.rounds)
+
+        results = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+        return [hashed.decode("utf-8") for chunk in results for hashed in chunk]
+
+    async def check(self, password: str, hashed: str) -> bool:
+        """
+        Verifies a plain-text password against a stored bcrypt hash.
+
+        Args:
+            password (str): The plain-text password.
+            hashed (str): The stored bcrypt hash.
+
+        Returns:
+            bool: True if the password matches the hash.
+        """
+        return await self._submit(
+            _check, password.encode("utf-8"), hashed.encode("utf-8")
+        )
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """
+        Returns True if a stored hash uses a lower cost factor than the configured one. Hashes are never rehashed to
+        a lower cost.
+        """
+        cost = hash_cost(hashed)
+        return cost is not None and cost < self.rounds
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "in_flight": min(self._pending, self.workers),
+            "queue_depth": max(0, self._pending - self.workers),
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "latency_seconds_total": self._latency_total,
+            "latency_seconds_max": self._latency_max,
+            "latency_seconds_avg": (
+                self._latency_total / self._completed if self._completed else 0.0
+            ),
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+hasher = PasswordHasher.from_env()
+
+
+async def hash_password(password: str) -> str:
+    return await hasher.hash(password)
+
+
+async def hash_passwords(passwords: list[str]) -> list[str]:
+    return await hasher.hash_many(passwords)
+
+
+async def check_password(password: str, hashed: str) -> bool:
+    return await hasher.check(password, hashed)
+
+
+def calibrate(
+    target: float, min_rounds: int = 4, max_rounds: int = 16, samples: int = 3
+) -> tuple[int, list[tuple[int, float]]]:
+    """
+    Measures the median time of one bcrypt verification at increasing cost factors, stopping at the first cost that
+    exceeds the target.
+
+    Args:
+        target (float): The longest acceptable verification time, in seconds.
+        min_rounds (int): The lowest cost factor to measure, and the result if even that exceeds the target.
+        max_rounds (int): The highest cost factor to measure.
+        samples (int): Verifications timed per cost factor.
+
+    Returns:
+        tuple[int, list[tuple[int, float]]]: The highest cost factor within the target, and the measured
+            (cost, median seconds) pairs.
+    """
+    password = b"calibration-password"
+    chosen = min_rounds
+    timings = []
+    for rounds in range(min_rounds, max_rounds + 1):
+        hashed = _hash(password, rounds)
+        elapsed = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            _check(password, hashed)
+            elapsed.append(time.perf_counter() - started)
+        median = statistics.median(elapsed)
+        timings.append((rounds, median))
+        if median > target:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+async def _report() -> dict[int, int]:
+    import project.storage
+
+    await project.storage.backend.connect()
+    try:
+        return await project.storage.backend.password_costs()
+    finally:
+        await project.storage.backend.disconnect()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m project.password_hasher")
+    commands = parser.add_subparsers(dest="command", required=True)
+    calibrate_parser = commands.add_parser(
+        "calibrate", help="recommend BCRYPT_ROUNDS for this host"
+    )
+    calibrate_parser.add_argument(
+        "--target-ms",
+        type=float,
+        default=250,
+        help="longest acceptable time to verify one password",
+    )
+    calibrate_parser.add_argument("--samples", type=int, default=3)
+    commands.add_parser("report", help="count stored password hashes per cost factor")
+    args = parser.parse_args(argv)
+
+    if args.command == "calibrate":
+        chosen, timings = calibrate(args.target_ms / 1000, samples=args.samples)
+        for rounds, seconds in timings:
+            print(f"  cost {rounds:2d}: {seconds * 1000:9.1f}ms")
+        print(
+            f"Recommended BCRYPT_ROUNDS={chosen} for a {args.target_ms:g}ms target "
+            f"(currently {hasher.rounds}). Each worker verifies about "
+            f"{1 / dict(timings)[chosen]:.1f} passwords per second at that cost."
+        )
+        return 0
+
+    costs = asyncio.run(_report())
+    total = sum(costs.values())
+    print(f"{total} password hash(es), BCRYPT_ROUNDS={hasher.rounds}:")
+    for cost, users in sorted(costs.items()):
+        marker = "  (rehashed on next login)" if cost < hasher.rounds else ""
+        print(f"  cost {cost:2d}: {users:8d}  {users / total:6.1%}{marker}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Transparent upgrade of password hashes to the configured bcrypt cost.
+
+Raising BCRYPT_ROUNDS only affects new hashes. Existing hashes are upgraded when their user next logs in, the only
+time the plain-text password is available: after a successful login with a hash below the configured cost, the
+password is hashed again in the background and stored with a compare-and-set on the old hash, so the login response
+is not delayed and a password changed in the meantime is never overwritten. Hashes are never downgraded.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import project.password_hasher
+import project.user_repository
+
+logger = logging.getLogger(__name__)
+
+
+class PasswordRehasher:
+    """
+    Runs background rehashes, at most one per user and at most `max_pending` at a time, so that a wave of logins
+    after a cost increase cannot crowd logins out of the hashing workers. Logins beyond that are upgraded on a
+    later login.
+    """
+
+    def __init__(self, enabled: bool, max_pending: int) -> None:
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._rehashed = 0
+        self._skipped = 0
+        self._failures = 0
+
+    @classmethod
+    def from_env(cls) -> "PasswordRehasher":
+        return cls(
+            enabled=os.getenv("PASSWORD_REHASH_ON_LOGIN", "1") != "0",
+            max_pending=int(os.getenv("PASSWORD_REHASH_MAX_PENDING", "4")),
+        )
+
+    def schedule(
+        self, user: project.user_repository.UserRecord, password: str
+    ) -> Optional[asyncio.Task]:
+        """
+        Starts rehashing a user's password if its stored hash is below the configured cost.
+
+        Args:
+            user (UserRecord): The user that just logged in.
+            password (str): The plain-text password that was verified against `user.password`.
+
+        Returns:
+            Optional[asyncio.Task]: The rehash task, or None if no rehash was started.
+        """
+        hasher = project.password_hasher.hasher
+        if not self.enabled or not hasher.needs_rehash(user.password):
+            return None
+        if user.id in self._tasks:
+            return None
+        if len(self._tasks) >= self.max_pending:
+            self._skipped += 1
+            return None
+        task = asyncio.create_task(self._rehash(user.id, user.password, password))
+        self._tasks[user.id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(user.id, None))
+        return task
+
+    async def _rehash(self, user_id: int, old: str, password: str) -> None:
+        try:
+            new = await project.password_hasher.hash_password(password)
+            if await project.user_repository.replace_password(user_id, old, new):
+                self._rehashed += 1
+        except project.password_hasher.PasswordHasherSaturatedError:
+            # Logins have priority over upgrades; this one is retried on the user's next login.
+            self._skipped += 1
+        except Exception:
+            self._failures += 1
+            logger.exception("Failed to rehash the password of user %d", user_id)
+
+    async def stop(self) -> None:
+        """
+        Cancels the rehashes still running. Their users keep the old hash until their next login.
+        """
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._tasks),
+            "rehashed": self._rehashed,
+            "skipped": self._skipped,
+            "failures": self._failures,
+        }
+
+
+password_rehasher = PasswordRehasher.from_env()
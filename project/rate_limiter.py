@@ -0,0 +1,200 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    retry_after = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000))
+return tostring(retry_after)
+"""
+
+
+class RateLimitBackend:
+    """
+    Storage for token buckets. `take` must be atomic per key.
+    """
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        """
+        Takes one token from the bucket `key`, which holds up to `capacity` tokens and refills at `rate` tokens
+        per second.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one becomes available.
+        """
+        raise NotImplementedError
+
+    def size(self) -> int:
+        return 0
+
+
+class MemoryBackend(RateLimitBackend):
+    """
+    In-process token buckets, O(1) per check. At most `max_keys` buckets are kept; the least recently used bucket is
+    evicted first, which only ever forgets throttling state (the evicted key starts again with a full bucket).
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * rate)
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class RedisBackend(RateLimitBackend):
+    """
+    Token buckets stored in a Redis-compatible server, so that every worker process shares the same limits. Each
+    check is a single script call; idle buckets expire once they would be full again. While the server is
+    unreachable, attempts are let through rather than failing every login.
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:") -> None:
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError(
+                "The redis rate limit backend requires the 'redis' package."
+            )
+        self.prefix = prefix
+        self._errors = (redis.RedisError, OSError)
+        self._client = redis.asyncio.Redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, capacity: float, rate: float) -> float:
+        try:
+            retry_after = await self._script(
+                keys=[self.prefix + key], args=[capacity, rate, time.time()]
+            )
+        except self._errors:
+            logger.warning(
+                "Login rate limit check failed, allowing the attempt", exc_info=True
+            )
+            return 0.0
+        return float(retry_after)
+
+
+class LoginRateLimiter:
+    """
+    Throttles login attempts with token buckets per client IP, per username and per (username, client IP). The
+    tight limit is on the (username, IP) pair, so guessing one user's password from a few addresses does not lock
+    that user out elsewhere; the looser per-username limit still throttles guessing spread over many addresses.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        username_burst: float,
+        username_per_minute: float,
+        username_ip_burst: float,
+        username_ip_per_minute: float,
+        ip_burst: float,
+        ip_per_minute: float,
+    ) -> None:
+        self.backend = backend
+        self.username_burst = username_burst
+        self.username_rate = username_per_minute / 60
+        self.username_ip_burst = username_ip_burst
+        self.username_ip_rate = username_ip_per_minute / 60
+        self.ip_burst = ip_burst
+        self.ip_rate = ip_per_minute / 60
+        self.allowed = 0
+        self.blocked = 0
+
+    @classmethod
+    def from_env(cls) -> "LoginRateLimiter":
+        if os.getenv("LOGIN_RATE_LIMIT_BACKEND", "memory") == "redis":
+            backend: RateLimitBackend = RedisBackend(
+                os.getenv("LOGIN_RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+            )
+        else:
+            backend = MemoryBackend(
+                int(os.getenv("LOGIN_RATE_LIMIT_MAX_KEYS", "100000"))
+            )
+        return cls(
+            backend,
+            username_burst=float(os.getenv("LOGIN_RATE_USERNAME_BURST", "20")),
+            username_per_minute=float(
+                os.getenv("LOGIN_RATE_USERNAME_PER_MINUTE", "20")
+            ),
+            username_ip_burst=float(os.getenv("LOGIN_RATE_USERNAME_IP_BURST", "5")),
+            username_ip_per_minute=float(
+                os.getenv("LOGIN_RATE_USERNAME_IP_PER_MINUTE", "5")
+            ),
+            ip_burst=float(os.getenv("LOGIN_RATE_IP_BURST", "20")),
+            ip_per_minute=float(os.getenv("LOGIN_RATE_IP_PER_MINUTE", "60")),
+        )
+
+    async def check(self, username: str, ip: Optional[str]) -> float:
+        """
+        Records a login attempt. Call this before doing any database or bcrypt work.
+
+        Args:
+            username (str): The username the client is trying to log in as.
+            ip (Optional[str]): The client's IP address, if known.
+
+        Returns:
+            float: 0 if the attempt may proceed, otherwise the seconds the client should wait before retrying.
+        """
+        username = username.lower()
+        buckets = [
+            (
+                f"user:{username}:{ip or '-'}",
+                self.username_ip_burst,
+                self.username_ip_rate,
+            ),
+            (f"user:{username}", self.username_burst, self.username_rate),
+        ]
+        if ip is not None:
+            buckets.insert(0, (f"ip:{ip}", self.ip_burst, self.ip_rate))
+        retry_after = 0.0
+        for key, capacity, rate in buckets:
+            retry_after = await self.backend.take(key, capacity, rate)
+            if retry_after:
+                break
+        if retry_after:
+            self.blocked += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "allowed": self.allowed,
+            "blocked": self.blocked,
+            "tracked_keys": self.backend.size(),
+        }
+
+
+login_limiter = LoginRateLimiter.from_env()
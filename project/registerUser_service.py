@@ -1,6 +1,7 @@
-import bcrypt
 import prisma
-import prisma.models
+import prisma.enums
+import project.password_hasher
+import project.user_repository
 from pydantic import BaseModel
 
 
@@ -22,20 +23,15 @@ async def registerUser(
     confirmation message.
 
     Args:
-        username (str): Unique identifier for the user account. Must be unique across the system.
+        username (str): Unique identifier for the user account. The User model has no username column, so users log in with their email.
         password (str): Password for the user account. Will be hashed before storage for security.
         email (str): Email address associated with the user account. Must be a valid email format and unique.
 
     Returns:
         UserRegistrationResponse: Response returned upon successful user registration, including confirmation message.
     """
-    hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
-    user = await prisma.models.User.prisma().create(
-        data={
-            "username": username,
-            "email": email,
-            "password": hashed_password.decode("utf-8"),
-            "role": "User",
-        }
+    hashed_password = await project.password_hasher.hash_password(password)
+    await project.user_repository.create_user(
+        email, hashed_password, prisma.enums.Role.User
     )
     return UserRegistrationResponse(message="User registered successfully.")
@@ -0,0 +1,74 @@
+import json
+import os
+from typing import Any, Optional
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "0") == "1"
+
+_constant_bodies: dict[int, bytes] = {}
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Encodes plain JSON data (dicts, lists, strings, numbers) compactly, using orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def constant(model: BaseModel) -> BaseModel:
+    """
+    Registers a response model instance that services return over and over again. Its JSON body is encoded once and
+    reused by `render` for every response that returns this exact instance.
+
+    Args:
+        model (BaseModel): The shared response instance. It must never be mutated.
+
+    Returns:
+        BaseModel: The same instance, for use as a module-level constant.
+    """
+    _constant_bodies[id(model)] = model.__pydantic_serializer__.to_json(model)
+    return model
+
+
+def render(model: BaseModel) -> BaseModel | Response:
+    """
+    Renders a trusted service result. In the opt-in fast mode (FAST_RESPONSES=1) the model is serialized directly
+    to JSON bytes, or served from the pre-encoded constant bodies, and returned as a ready Response, so FastAPI skips
+    re-validating it against the route's `response_model`. Otherwise the model is returned unchanged and FastAPI
+    handles it as usual.
+
+    Args:
+        model (BaseModel): The response model returned by a service.
+
+    Returns:
+        BaseModel | Response: The model, or a pre-encoded JSON Response in fast mode.
+    """
+    if not FAST_RESPONSES:
+        return model
+    body = _constant_bodies.get(id(model))
+    if body is None:
+        body = model.__pydantic_serializer__.to_json(model)
+    return Response(content=body, media_type="application/json")
+
+
+def error_response(
+    message: str, status_code: int, headers: Optional[dict[str, str]] = None
+) -> Response:
+    """
+    Builds a JSON `{"error": message}` response.
+    """
+    return Response(
+        content=dumps({"error": message}),
+        status_code=status_code,
+        media_type="application/json",
+        headers=headers,
+    )
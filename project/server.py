@@ -1,28 +1,138 @@
 import logging
+import math
 from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import Optional
 
+import project.account_deletion
+import project.admission
+import project.auth
+import project.bulkDeleteUsers_service
+import project.bulkRegisterUsers_service
+import project.cli_channel
+import project.database
 import project.deleteUser_service
 import project.executeHelloWorld_service
 import project.getHelloWorld_service
+import project.getInteractionStats_service
 import project.getUserDetails_service
+import project.idempotency
+import project.instrumentation
+import project.interaction_writer
+import project.listInteractions_service
 import project.loginUser_service
+import project.password_hasher
+import project.password_rehash
+import project.rate_limiter
 import project.registerUser_service
+import project.responses
+import project.startup
+import project.storage
 import project.updateUserDetails_service
-from fastapi import FastAPI
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import Response
-from prisma import Prisma
+import project.user_repository
+import prisma.enums
+from fastapi import Depends, FastAPI, Query, Request, WebSocket
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
 logger = logging.getLogger(__name__)
 
-db_client = Prisma(auto_register=True)
+project.instrumentation.register_collector(
+    "password_hasher",
+    project.password_hasher.hasher.stats,
+    counters=("completed", "rejected", "latency_seconds_total"),
+)
+project.instrumentation.register_collector(
+    "interaction_buffer",
+    project.interaction_writer.interaction_buffer.stats,
+    counters=("flushed", "dropped", "failed_flushes", "dead_lettered"),
+)
+project.instrumentation.register_collector(
+    "user_cache",
+    project.user_repository.user_cache.stats,
+    counters=("hits", "misses", "evictions", "coalesced"),
+)
+project.instrumentation.register_collector(
+    "token_cache", project.auth.token_cache.stats, counters=("hits", "misses")
+)
+project.instrumentation.register_collector("db_pool", project.database.pool_stats)
+project.instrumentation.register_collector(
+    "login_rate_limit",
+    project.rate_limiter.login_limiter.stats,
+    counters=("allowed", "blocked"),
+)
+project.instrumentation.register_collector("startup", project.startup.stats)
+project.instrumentation.register_collector(
+    "account_deletion",
+    project.account_deletion.deletion_engine.stats,
+    counters=("chunks", "interactions_deleted", "users_purged", "failures"),
+)
+project.instrumentation.register_collector(
+    "idempotency",
+    project.idempotency.idempotency_cache.stats,
+    counters=(
+        "hits",
+        "coalesced",
+        "misses",
+        "mismatches",
+        "conflicts",
+        "store_errors",
+        "evictions",
+    ),
+)
+project.instrumentation.register_collector(
+    "user_details_etag",
+    project.getUserDetails_service.details_etags.stats,
+    counters=("hits", "misses", "evictions"),
+)
+project.instrumentation.register_collector(
+    "admission",
+    project.admission.admission_controller.stats,
+    counters=[
+        f"{name}_{key}"
+        for name in project.admission.admission_controller.classes
+        for key in (
+            "admitted",
+            "shed_queue_full",
+            "shed_deadline",
+            "queue_seconds_total",
+        )
+    ],
+)
+project.instrumentation.register_collector(
+    "cli_channel",
+    project.cli_channel.cli_channel.stats,
+    counters=(
+        "connections",
+        "auth_failures",
+        "binary_rejected",
+        "messages",
+        "commands",
+        "latency_seconds_total",
+    ),
+)
+project.instrumentation.register_collector(
+    "password_rehash",
+    project.password_rehash.password_rehasher.stats,
+    counters=("rehashed", "skipped", "failures"),
+)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await db_client.connect()
+    with project.startup.timed("db_connect"):
+        await project.storage.backend.connect()
+    with project.startup.timed("interaction_buffer_start"):
+        project.interaction_writer.interaction_buffer.start()
+    project.account_deletion.deletion_engine.start()
+    project.startup.start_warm_up()
     yield
-    await db_client.disconnect()
+    project.storage.backend.start_draining()
+    await project.startup.stop_warm_up()
+    await project.account_deletion.deletion_engine.stop()
+    await project.password_rehash.password_rehasher.stop()
+    await project.interaction_writer.interaction_buffer.stop()
+    await project.storage.backend.disconnect()
+    project.password_hasher.hasher.shutdown()
 
 
 app = FastAPI(
@@ -31,6 +141,34 @@ app = FastAPI(
     description="create a single hello world app",
 )
 
+app.add_middleware(project.admission.AdmissionMiddleware)
+app.add_middleware(project.idempotency.IdempotencyMiddleware)
+app.add_middleware(project.instrumentation.MetricsMiddleware)
+
+
+@app.get("/ready", include_in_schema=False)
+async def api_get_ready() -> Response:
+    """
+    Readiness probe. Answers 200 while this worker can take traffic and 503 before it is connected, while it shuts down, or while its connection pool is saturated. The body reports the pool saturation either way.
+    """
+    ready, stats = project.storage.backend.readiness()
+    return Response(
+        content=project.responses.dumps({"ready": ready, **stats}),
+        status_code=200 if ready else 503,
+        media_type="application/json",
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def api_get_metrics() -> PlainTextResponse:
+    """
+    Exposes request, database and subsystem metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(
+        project.instrumentation.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
 
 @app.delete(
     "/user/delete", response_model=project.deleteUser_service.DeleteUserResponse
@@ -43,16 +181,10 @@ async def api_delete_deleteUser(
     """
     try:
         res = await project.deleteUser_service.deleteUser(user_id)
-        return res
+        return project.responses.render(res)
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
 
 
 @app.post(
@@ -66,37 +198,44 @@ async def api_post_registerUser(
     """
     try:
         res = await project.registerUser_service.registerUser(username, password, email)
-        return res
+        return project.responses.render(res)
+    except project.password_hasher.PasswordHasherSaturatedError as e:
+        return project.responses.error_response(
+            str(e), 503, headers={"Retry-After": "1"}
+        )
+    except project.storage.UniqueConstraintError:
+        return project.responses.error_response("Email already registered.", 409)
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
 
 
 @app.post("/login", response_model=project.loginUser_service.LoginResponse)
 async def api_post_loginUser(
-    username: str, password: str
+    username: str, password: str, request: Request
 ) -> project.loginUser_service.LoginResponse | Response:
     """
     This endpoint authenticates a user by checking username and password against stored records. If credentials are valid, it generates and returns an authentication token (JWT) used for subsequent requests. On failure, it returns an error message.
     """
     try:
+        retry_after = await project.rate_limiter.login_limiter.check(
+            username, request.client.host if request.client else None
+        )
+        if retry_after:
+            return project.responses.error_response(
+                "Too many login attempts.",
+                429,
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
         res = await project.loginUser_service.loginUser(username, password)
-        return res
+        return project.responses.render(res)
+    except project.password_hasher.PasswordHasherSaturatedError as e:
+        return project.responses.error_response(
+            str(e), 503, headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
 
 
 @app.get(
@@ -104,22 +243,17 @@ async def api_post_loginUser(
 )
 async def api_get_getHelloWorld(
     user_id: int,
+    claims: project.auth.TokenClaims | None = Depends(project.auth.get_token_claims),
 ) -> project.getHelloWorld_service.HelloWorldResponse | Response:
     """
     This route serves the classic 'Hello World' message. Upon a GET request, it checks the user's authentication status through the User Management Module. If authenticated, it returns a 'Hello World' message. Unauthenticated requests are denied access, ensuring that the endpoint is secure and respecting the application’s role-based access control.
     """
     try:
-        res = await project.getHelloWorld_service.getHelloWorld(user_id)
-        return res
+        res = await project.getHelloWorld_service.getHelloWorld(user_id, claims)
+        return project.responses.render(res)
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
 
 
 @app.post(
@@ -136,16 +270,18 @@ async def api_post_executeHelloWorld(
         res = await project.executeHelloWorld_service.executeHelloWorld(
             user_id, token, command
         )
-        return res
+        return project.responses.render(res)
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
+
+
+@app.websocket("/cli/ws")
+async def api_ws_cli(websocket: WebSocket) -> None:
+    """
+    Persistent channel for CLI automation: authenticate once with the first message, then stream `hello-world` commands, one per line, and receive the replies in order. See `project.cli_channel` for the protocol.
+    """
+    await project.cli_channel.cli_channel.serve(websocket)
 
 
 @app.put(
@@ -153,45 +289,188 @@ async def api_post_executeHelloWorld(
     response_model=project.updateUserDetails_service.UserProfileUpdateResponse,
 )
 async def api_put_updateUserDetails(
-    email: str, password: str, auth_token: str
+    auth_token: str, email: Optional[str] = None, password: Optional[str] = None
 ) -> project.updateUserDetails_service.UserProfileUpdateResponse | Response:
     """
-    Allows authenticated users to update their profile information like email and password. Users need to be authenticated and can only update their own information. It requires passing the new details and the authentication token.
+    Allows authenticated users to update their profile information like email and password. Users need to be authenticated and can only update their own information. It requires passing the new details and the authentication token. Fields that are left out keep their current value.
     """
     try:
         res = await project.updateUserDetails_service.updateUserDetails(
             email, password, auth_token
         )
-        return res
+        return project.responses.render(res)
+    except project.password_hasher.PasswordHasherSaturatedError as e:
+        return project.responses.error_response(
+            str(e), 503, headers={"Retry-After": "1"}
+        )
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
-        )
+        return project.responses.error_response(str(e), 500)
 
 
 @app.get(
     "/user/details", response_model=project.getUserDetails_service.UserDetailsResponse
 )
 async def api_get_getUserDetails(
-    AuthenticationToken: str,
+    AuthenticationToken: str, request: Request, response: Response
 ) -> project.getUserDetails_service.UserDetailsResponse | Response:
     """
     Retrieves detailed information about the currently authenticated user, such as username, role, and registration date. This endpoint requires a valid authentication token provided in the request header.
+
+    Responses carry an ETag. A request whose `If-None-Match` still matches is answered with 304 Not Modified, without a database query while the ETag is cached.
     """
     try:
-        res = await project.getUserDetails_service.getUserDetails(AuthenticationToken)
-        return res
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            etag = project.getUserDetails_service.unchanged_etag(
+                AuthenticationToken, if_none_match
+            )
+            if etag is not None:
+                return Response(status_code=304, headers={"ETag": etag})
+        res, etag = await project.getUserDetails_service.getUserDetailsWithETag(
+            AuthenticationToken
+        )
+        if if_none_match is not None and project.getUserDetails_service.etag_matches(
+            if_none_match, etag
+        ):
+            return Response(status_code=304, headers={"ETag": etag})
+        rendered = project.responses.render(res)
+        if isinstance(rendered, Response):
+            rendered.headers["ETag"] = etag
+        else:
+            response.headers["ETag"] = etag
+        return rendered
+    except project.getUserDetails_service.AuthenticationTokenError as e:
+        return project.responses.error_response(str(e), e.status_code)
     except Exception as e:
         logger.exception("Error processing request")
-        res = dict()
-        res["error"] = str(e)
-        return Response(
-            content=jsonable_encoder(res),
-            status_code=500,
-            media_type="application/json",
+        return project.responses.error_response(str(e), 500)
+
+
+@app.post(
+    "/register/bulk",
+    response_model=project.bulkRegisterUsers_service.BulkUserRegistrationResponse,
+)
+async def api_post_bulkRegisterUsers(
+    request: project.bulkRegisterUsers_service.BulkUserRegistrationRequest,
+) -> project.bulkRegisterUsers_service.BulkUserRegistrationResponse | Response:
+    """
+    Registers many users at once. Passwords are hashed in parallel and the users are inserted in a single transaction. Each user gets its own result so that partial failures can be retried individually.
+    """
+    try:
+        res = await project.bulkRegisterUsers_service.bulkRegisterUsers(request.users)
+        return project.responses.render(res)
+    except project.password_hasher.PasswordHasherSaturatedError as e:
+        return project.responses.error_response(
+            str(e), 503, headers={"Retry-After": "1"}
+        )
+    except Exception as e:
+        logger.exception("Error processing request")
+        return project.responses.error_response(str(e), 500)
+
+
+@app.post(
+    "/user/delete/bulk",
+    response_model=project.bulkDeleteUsers_service.BulkDeleteUsersResponse,
+)
+async def api_post_bulkDeleteUsers(
+    request: project.bulkDeleteUsers_service.BulkDeleteUsersRequest,
+    claims: project.auth.TokenClaims = Depends(project.auth.require_token_claims),
+) -> project.bulkDeleteUsers_service.BulkDeleteUsersResponse | Response:
+    """
+    Deletes many users at once; their interactions are removed in the background. Each requested user id gets its own result. Requires an administrator's token in the `Authorization: Bearer` header.
+    """
+    try:
+        res = await project.bulkDeleteUsers_service.bulkDeleteUsers(
+            claims, request.user_ids
+        )
+        return project.responses.render(res)
+    except PermissionError as e:
+        return project.responses.error_response(str(e), 403)
+    except Exception as e:
+        logger.exception("Error processing request")
+        return project.responses.error_response(str(e), 500)
+
+
+@app.get(
+    "/interactions",
+    response_model=project.listInteractions_service.InteractionPage,
+)
+async def api_get_listInteractions(
+    user_id: Optional[int] = None,
+    type: Optional[prisma.enums.InteractionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    claims: project.auth.TokenClaims = Depends(project.auth.require_token_claims),
+) -> project.listInteractions_service.InteractionPage | Response:
+    """
+    Returns one page of recorded hello-world interactions, filterable by user, type and time range. Pages are keyset-paginated: pass the returned `next_cursor` to fetch the next page.
+    """
+    try:
+        res = await project.listInteractions_service.listInteractions(
+            claims, user_id, type, since, until, cursor, limit
         )
+        return project.responses.render(res)
+    except PermissionError as e:
+        return project.responses.error_response(str(e), 403)
+    except ValueError as e:
+        return project.responses.error_response(str(e), 400)
+    except Exception as e:
+        logger.exception("Error processing request")
+        return project.responses.error_response(str(e), 500)
+
+
+@app.get("/interactions/export")
+async def api_get_exportInteractions(
+    format: str = "ndjson",
+    user_id: Optional[int] = None,
+    type: Optional[prisma.enums.InteractionType] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    claims: project.auth.TokenClaims = Depends(project.auth.require_token_claims),
+) -> Response:
+    """
+    Streams every matching interaction as NDJSON (`format=ndjson`) or CSV (`format=csv`) with constant memory use, regardless of how many interactions are stored.
+    """
+    try:
+        chunks = await project.listInteractions_service.exportInteractions(
+            claims, format, user_id, type, since, until
+        )
+        return StreamingResponse(
+            chunks,
+            media_type="text/csv" if format == "csv" else "application/x-ndjson",
+        )
+    except PermissionError as e:
+        return project.responses.error_response(str(e), 403)
+    except ValueError as e:
+        return project.responses.error_response(str(e), 400)
+    except Exception as e:
+        logger.exception("Error processing request")
+        return project.responses.error_response(str(e), 500)
+
+
+@app.get(
+    "/interactions/stats",
+    response_model=project.getInteractionStats_service.InteractionStatsResponse,
+)
+async def api_get_getInteractionStats(
+    user_id: Optional[int] = None,
+    since: Optional[date] = None,
+    until: Optional[date] = None,
+    claims: project.auth.TokenClaims = Depends(project.auth.require_token_claims),
+) -> project.getInteractionStats_service.InteractionStatsResponse | Response:
+    """
+    Returns per-user, per-day counts of API and CLI hello-world calls from the precomputed rollups.
+    """
+    try:
+        res = await project.getInteractionStats_service.getInteractionStats(
+            claims, user_id, since, until
+        )
+        return project.responses.render(res)
+    except PermissionError as e:
+        return project.responses.error_response(str(e), 403)
+    except Exception as e:
+        logger.exception("Error processing request")
+        return project.responses.error_response(str(e), 500)
@@ -0,0 +1,176 @@
+"""
+Startup phases, background warm-up and the cold-start profile.
+
+The app's lifespan records how long each startup phase takes (`timed`), then serves immediately while `warm_up`
+prepares what the first requests would otherwise pay for: the password hashing workers and a database connection.
+The recorded phases are logged once startup completes and exported on `/metrics` under `startup_`.
+
+`python -m project.launcher --profile-startup` reports, for a fresh process, the import time of every module
+(from `python -X importtime`), the time of each lifespan phase and the time to the first response. With
+`--max-seconds` it exits with status 1 when the cold start took longer, for use as a CI gate.
+"""
+
+import asyncio
+import logging
+import re
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+logger = logging.getLogger("project.startup")
+
+_phases: dict[str, float] = {}
+
+_warm_up_task: Optional[asyncio.Task] = None
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Records the duration of a startup phase, e.g. `with timed("db_connect"): ...`.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases[name] = time.perf_counter() - started
+
+
+def phases() -> dict[str, float]:
+    return dict(_phases)
+
+
+def stats() -> dict[str, float]:
+    return {f"{name}_seconds": seconds for name, seconds in _phases.items()}
+
+
+async def warm_up() -> None:
+    """
+    Prepares the resources the first requests would otherwise initialize on demand. Failures are only logged: every
+    resource warmed here is also created lazily when first used.
+    """
+    import project.password_hasher
+    import project.storage
+
+    with timed("warm_up"):
+        try:
+            with timed("warm_up_password_hasher"):
+                await project.password_hasher.hasher.warm()
+            with timed("warm_up_database"):
+                await project.storage.backend.ping()
+        except Exception:
+            logger.warning("Startup warm-up failed", exc_info=True)
+    logger.info(
+        "Startup phases: %s",
+        ", ".join(
+            f"{name}={seconds * 1000:.1f}ms" for name, seconds in _phases.items()
+        ),
+    )
+
+
+def start_warm_up() -> None:
+    global _warm_up_task
+    _warm_up_task = asyncio.create_task(warm_up())
+
+
+async def stop_warm_up() -> None:
+    global _warm_up_task
+    if _warm_up_task is not None:
+        _warm_up_task.cancel()
+        await asyncio.gather(_warm_up_task, return_exceptions=True)
+        _warm_up_task = None
+
+
+async def wait_warm_up() -> None:
+    if _warm_up_task is not None:
+        await asyncio.shield(_warm_up_task)
+
+
+def import_times(module: str) -> list[tuple[str, int, float, float]]:
+    """
+    Imports `module` in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        list[tuple[str, int, float, float]]: (module, nesting depth, self seconds, cumulative seconds) per imported
+            module, in import order.
+    """
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+    times = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            times.append(
+                (name, len(indent) // 2, int(own) / 1e6, int(cumulative) / 1e6)
+            )
+    return times
+
+
+async def _cold_start(app_path: str) -> dict[str, float]:
+    import httpx
+    import uvicorn.importer
+
+    timings: dict[str, float] = {}
+    started = time.perf_counter()
+    app = uvicorn.importer.import_from_string(app_path)
+    timings["import"] = time.perf_counter() - started
+    lifespan_started = time.perf_counter()
+    async with app.router.lifespan_context(app):
+        timings["lifespan"] = time.perf_counter() - lifespan_started
+        request_started = time.perf_counter()
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://startup"
+        ) as client:
+            await client.get("/ready")
+        timings["first_request"] = time.perf_counter() - request_started
+        timings["cold_start"] = time.perf_counter() - started
+        await wait_warm_up()
+    for name, seconds in _phases.items():
+        timings[f"lifespan.{name}"] = seconds
+    return timings
+
+
+def profile(app_path: str, top: int = 25, max_seconds: Optional[float] = None) -> int:
+    """
+    Prints the startup profile of `app_path` ("module:attribute").
+
+    Args:
+        app_path (str): The ASGI app to profile, e.g. "project.server:app".
+        top (int): How many of the slowest imports to list.
+        max_seconds (Optional[float]): Fail when the cold start (import, lifespan startup and first response) took
+            longer than this.
+
+    Returns:
+        int: The process exit status, 1 if `max_seconds` was exceeded.
+    """
+    module = app_path.split(":", 1)[0]
+    imports = import_times(module)
+    print(f"Slowest imports of {module} (self / cumulative ms):")
+    for name, depth, own, cumulative in sorted(imports, key=lambda t: -t[3])[:top]:
+        print(f"  {own * 1000:9.1f} {cumulative * 1000:9.1f}  {'  ' * depth}{name}")
+    own_modules = [entry for entry in imports if entry[0].split(".")[0] == "project"]
+    if own_modules:
+        print("Project modules (self / cumulative ms):")
+        for name, depth, own, cumulative in own_modules:
+            print(f"  {own * 1000:9.1f} {cumulative * 1000:9.1f}  {name}")
+
+    timings = asyncio.run(_cold_start(app_path))
+    print("Startup phases (ms):")
+    for name, seconds in timings.items():
+        print(f"  {seconds * 1000:9.1f}  {name}")
+    if max_seconds is not None and timings["cold_start"] > max_seconds:
+        print(
+            f"Cold start took {timings['cold_start']:.3f}s, more than the allowed {max_seconds:.3f}s."
+        )
+        return 1
+    return 0
@@ -0,0 +1,793 @@
+"""
+Storage backends for the operations the request path depends on: looking up, creating, updating and deleting users
+and recording interactions.
+
+STORAGE_BACKEND selects the implementation:
+
+    prisma (default)  Postgres through the Prisma client, configured by DATABASE_URL
+    sqlite            an embedded SQLite database at SQLITE_PATH, for local runs, benchmarks and edge nodes
+
+The bulk endpoints, interaction history, rollup stats and rollup maintenance jobs query Postgres directly and are only
+available with the prisma backend.
+"""
+
+import asyncio
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Iterable, Optional, TypeVar
+
+import prisma
+import prisma.enums
+import prisma.errors
+import prisma.models
+import project.database
+import project.instrumentation
+import project.interaction_rollups
+
+T = TypeVar("T")
+
+USER_COLUMNS = ("email", "password", "role", "tokenVersion")
+
+
+class UniqueConstraintError(Exception):
+    """
+    Raised when a write would violate a unique constraint, e.g. a second user with the same email.
+    """
+
+
+class InvalidRecordError(Exception):
+    """
+    Raised when the database rejects rows for their content, e.g. an interaction of a user that no longer exists,
+    as opposed to failing to run the write at all.
+    """
+
+
+class UserRecord:
+    """
+    Compact, read-only snapshot of a User row as held in the user cache.
+    """
+
+    __slots__ = ("id", "email", "password", "role", "tokenVersion", "createdAt")
+
+    def __init__(
+        self,
+        id: int,
+        email: str,
+        password: str,
+        role: prisma.enums.Role,
+        tokenVersion: int,
+        createdAt: datetime,
+    ) -> None:
+        self.id = id
+        self.email = email
+        self.password = password
+        self.role = role
+        self.tokenVersion = tokenVersion
+        self.createdAt = createdAt
+
+    @classmethod
+    def from_model(cls, user: prisma.models.User) -> "UserRecord":
+        return cls(
+            id=user.id,
+            email=user.email,
+            password=user.password,
+            role=user.role,
+            tokenVersion=user.tokenVersion,
+            createdAt=user.createdAt,
+        )
+
+
+def _password_costs(rows: Iterable[tuple[str, int]]) -> dict[int, int]:
+    # The cost is the two digits after the "$2b$" prefix; anything else is not a bcrypt hash and is counted as 0.
+    costs: dict[int, int] = {}
+    for cost, users in rows:
+        key = int(cost) if cost and cost.isdigit() else 0
+        costs[key] = costs.get(key, 0) + users
+    return costs
+
+
+class StorageBackend(ABC):
+    """
+    Interface of a storage backend. Every method is a coroutine that issues the minimum number of queries, so that
+    the caching in `project.user_repository` and the batching in `project.interaction_writer` work the same on top
+    of any backend.
+    """
+
+    name = ""
+
+    @abstractmethod
+    async def connect(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def start_draining(self) -> None:
+        """
+        Marks this process as not ready, so that load balancers stop routing to it while it shuts down.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def readiness(self) -> tuple[bool, dict[str, float]]:
+        """
+        Reports whether this process should receive traffic, along with backend stats for the readiness probe.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def ping(self) -> None:
+        """
+        Issues a trivial query, e.g. to open a connection ahead of the first request.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_user_by_id(self, user_id: int) -> Optional[UserRecord]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def find_user_by_email(self, email: str) -> Optional[UserRecord]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_user(
+        self, email: str, password: str, role: prisma.enums.Role
+    ) -> UserRecord:
+        """
+        Creates a user.
+
+        Raises:
+            UniqueConstraintError: If a user with this email already exists.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_user(
+        self, user_id: int, fields: dict[str, Any]
+    ) -> Optional[UserRecord]:
+        """
+        Sets the given columns (any of email, password and role) of a user with a single UPDATE. `tokenVersion` may
+        be given as `{"increment": n}`, e.g. to revoke the user's tokens in the same statement as a password change.
+
+        Returns:
+            Optional[UserRecord]: The updated user, or None if it does not exist.
+
+        Raises:
+            UniqueConstraintError: If the new email is already taken.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def increment_token_version(self, user_id: int) -> Optional[UserRecord]:
+        """
+        Bumps a user's token version, which revokes every token issued to the user so far.
+
+        Returns:
+            Optional[UserRecord]: The updated user, or None if it does not exist.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def replace_password(self, user_id: int, old: str, new: str) -> bool:
+        """
+        Replaces a user's password hash, but only if it is still `old`, so that a rehash never overwrites a password
+        changed in the meantime.
+
+        Returns:
+            bool: Whether the hash was replaced.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def password_costs(self) -> dict[int, int]:
+        """
+        Returns:
+            dict[int, int]: The number of users, not counting deleted ones, per bcrypt cost factor of their password
+                hash.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def tombstone_users(self, user_ids: list[int]) -> list[int]:
+        """
+        Marks users as deleted, revokes their tokens by bumping their token version, replaces their email with
+        `deleted:<id>` so that the address can be registered again right away, and opens a deletion job for each of
+        them, in one transaction. Tombstoned users are no longer found by the lookups above; their rows are purged
+        later by `project.account_deletion`.
+
+        Returns:
+            list[int]: The ids that belonged to existing, not yet deleted users.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_deletions(self, worker: str, lease_seconds: float) -> list[int]:
+        """
+        Claims, for `worker`, the open deletion jobs that are not claimed, or whose claim has not been renewed
+        within `lease_seconds`. Concurrent callers never claim the same job.
+
+        Returns:
+            list[int]: The ids of the tombstoned users claimed, oldest deletion first.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_interactions_chunk(self, user_id: int, limit: int) -> int:
+        """
+        Deletes up to `limit` Interaction rows of a tombstoned user and records the progress on its deletion job,
+        renewing its claim, in one short transaction.
+
+        Returns:
+            int: The number of rows deleted.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def purge_user(self, user_id: int) -> None:
+        """
+        Deletes a tombstoned user whose interactions are gone, along with its rollups, and completes its deletion
+        job.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def insert_interactions(self, records: list[dict[str, Any]]) -> None:
+        """
+        Inserts Interaction rows atomically.
+
+        Args:
+            records (list[dict[str, Any]]): Rows with userId, type, content and createdAt, as queued by the
+                interaction write buffer.
+
+        Raises:
+            InvalidRecordError: If a row violates a constraint or is not valid for its columns.
+        """
+        raise NotImplementedError
+
+
+class PrismaBackend(StorageBackend):
+    """
+    Postgres through the Prisma client managed by `project.database`.
+    """
+
+    name = "prisma"
+
+    async def connect(self) -> None:
+        await project.database.connect()
+
+    def start_draining(self) -> None:
+        project.database.start_draining()
+
+    async def disconnect(self) -> None:
+        await project.database.disconnect()
+
+    def readiness(self) -> tuple[bool, dict[str, float]]:
+        return project.database.readiness()
+
+    async def ping(self) -> None:
+        await project.database.get_client().query_raw("SELECT 1")
+
+    async def find_user_by_id(self, user_id: int) -> Optional[UserRecord]:
+        user = await prisma.models.User.prisma().find_first(
+            where={"id": user_id, "deletedAt": None}
+        )
+        return UserRecord.from_model(user) if user is not None else None
+
+    async def find_user_by_email(self, email: str) -> Optional[UserRecord]:
+        user = await prisma.models.User.prisma().find_first(
+            where={"email": email, "deletedAt": None}
+        )
+        return UserRecord.from_model(user) if user is not None else None
+
+    async def create_user(
+        self, email: str, password: str, role: prisma.enums.Role
+    ) -> UserRecord:
+        try:
+            user = await prisma.models.User.prisma().create(
+                data={"email": email, "password": password, "role": role}
+            )
+        except prisma.errors.UniqueViolationError as e:
+            raise UniqueConstraintError(str(e)) from e
+        return UserRecord.from_model(user)
+
+    async def update_user(
+        self, user_id: int, fields: dict[str, Any]
+    ) -> Optional[UserRecord]:
+        # Prisma 5 accepts non-unique fields next to the primary key in `update`, so tombstoned users are excluded
+        # without a second query.
+        try:
+            user = await prisma.models.User.prisma().update(
+                where={"id": user_id, "deletedAt": None}, data=fields
+            )
+        except prisma.errors.RecordNotFoundError:
+            return None
+        except prisma.errors.UniqueViolationError as e:
+            raise UniqueConstraintError(str(e)) from e
+        return UserRecord.from_model(user) if user is not None else None
+
+    async def increment_token_version(self, user_id: int) -> Optional[UserRecord]:
+        user = await prisma.models.User.prisma().update(
+            where={"id": user_id}, data={"tokenVersion": {"increment": 1}}
+        )
+        return UserRecord.from_model(user) if user is not None else None
+
+    async def replace_password(self, user_id: int, old: str, new: str) -> bool:
+        replaced = await prisma.models.User.prisma().update_many(
+            where={"id": user_id, "password": old, "deletedAt": None},
+            data={"password": new},
+        )
+        return replaced > 0
+
+    async def password_costs(self) -> dict[int, int]:
+        rows = await project.database.get_client().query_raw(
+            'SELECT substring("password" from 5 for 2) AS "cost", count(*)::int AS "users"'
+            ' FROM "User" WHERE "deletedAt" IS NULL GROUP BY 1'
+        )
+        return _password_costs((row["cost"], row["users"]) for row in rows)
+
+    async def tombstone_users(self, user_ids: list[int]) -> list[int]:
+        if not user_ids:
+            return []
+        placeholders = ", ".join(f"${index}" for index in range(1, len(user_ids) + 1))
+        async with prisma.get_client().tx() as transaction:
+            rows = await transaction.query_raw(
+                'UPDATE "User" SET "deletedAt" = (now() AT TIME ZONE \'UTC\'),'
+                ' "tokenVersion" = "tokenVersion" + 1, "email" = \'deleted:\' || "id"'
+                f' WHERE "id" IN ({placeholders}) AND "deletedAt" IS NULL RETURNING "id"',
+                *user_ids,
+            )
+            found = [row["id"] for row in rows]
+            if found:
+                await prisma.models.DeletionJob.prisma(transaction).create_many(
+                    data=[{"userId": user_id} for user_id in found],
+                    skip_duplicates=True,
+                )
+        return found
+
+    async def claim_deletions(self, worker: str, lease_seconds: float) -> list[int]:
+        rows = await project.database.get_client().query_raw(
+            'UPDATE "DeletionJob" SET "claimedBy" = $1, "claimedAt" = (now() AT TIME ZONE \'UTC\')'
+            ' WHERE "userId" IN (SELECT "userId" FROM "DeletionJob" WHERE "completedAt" IS NULL'
+            ' AND ("claimedAt" IS NULL OR "claimedAt" < (now() AT TIME ZONE \'UTC\') - make_interval(secs => $2::double precision))'
+            ' FOR UPDATE SKIP LOCKED) RETURNING "userId", "requestedAt"',
+            worker,
+            lease_seconds,
+        )
+        return [
+            row["userId"] for row in sorted(rows, key=lambda row: row["requestedAt"])
+        ]
+
+    async def delete_interactions_chunk(self, user_id: int, limit: int) -> int:
+        async with prisma.get_client().tx() as transaction:
+            deleted = await transaction.execute_raw(
+                'DELETE FROM "Interaction" WHERE "id" IN'
+                ' (SELECT "id" FROM "Interaction" WHERE "userId" = $1 LIMIT $2)',
+                user_id,
+                limit,
+            )
+            if deleted:
+                await prisma.models.DeletionJob.prisma(transaction).update(
+                    where={"userId": user_id},
+                    data={
+                        "interactionsDeleted": {"increment": deleted},
+                        "claimedAt": datetime.now(timezone.utc),
+                    },
+                )
+        return deleted
+
+    async def purge_user(self, user_id: int) -> None:
+        async with prisma.get_client().tx() as transaction:
+            await prisma.models.InteractionRollup.prisma(transaction).delete_many(
+                where={"userId": user_id}
+            )
+            await prisma.models.User.prisma(transaction).delete_many(
+                where={"id": user_id, "deletedAt": {"not": None}}
+            )
+            await prisma.models.DeletionJob.prisma(transaction).update(
+                where={"userId": user_id},
+                data={"completedAt": datetime.now(timezone.utc)},
+            )
+
+    async def insert_interactions(self, records: list[dict[str, Any]]) -> None:
+        try:
+            async with prisma.get_client().tx() as transaction:
+                await prisma.models.Interaction.prisma(transaction).create_many(
+                    data=records
+                )
+                await project.interaction_rollups.apply(transaction, records)
+        except (
+            prisma.errors.UniqueViolationError,
+            prisma.errors.ForeignKeyViolationError,
+            prisma.errors.MissingRequiredValueError,
+            prisma.errors.FieldNotFoundError,
+            prisma.errors.InputError,
+        ) as e:
+            # Other errors, including the bare DataError Prisma raises for pool timeouts and lost connections, leave
+            # the rows intact for a retry.
+            raise InvalidRecordError(str(e)) from e
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "User" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "email" TEXT NOT NULL UNIQUE,
+    "password" TEXT NOT NULL,
+    "role" TEXT NOT NULL,
+    "tokenVersion" INTEGER NOT NULL DEFAULT 0,
+    "deletedAt" TEXT,
+    "createdAt" TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS "Interaction" (
+    "id" INTEGER PRIMARY KEY AUTOINCREMENT,
+    "userId" INTEGER NOT NULL REFERENCES "User" ("id"),
+    "type" TEXT NOT NULL,
+    "content" TEXT NOT NULL,
+    "createdAt" TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS "Interaction_userId_createdAt_idx" ON "Interaction" ("userId", "createdAt");
+CREATE TABLE IF NOT EXISTS "DeletionJob" (
+    "userId" INTEGER PRIMARY KEY,
+    "requestedAt" TEXT NOT NULL,
+    "interactionsDeleted" INTEGER NOT NULL DEFAULT 0,
+    "completedAt" TEXT,
+    "claimedBy" TEXT,
+    "claimedAt" TEXT
+);
+CREATE INDEX IF NOT EXISTS "DeletionJob_completedAt_idx" ON "DeletionJob" ("completedAt");
+"""
+
+# Columns added after the first release, as (table, column, definition, backfill). Added to existing databases on
+# connect, then existing rows are set to `backfill()` if it is given. SQLite cannot add a column with a non-constant
+# default, so columns that default to the current time are filled in this way.
+SQLITE_ADDED_COLUMNS: list[tuple[str, str, str, Optional[Callable[[], Any]]]] = [
+    ("User", "deletedAt", "TEXT", None),
+    ("User", "createdAt", "TEXT", lambda: datetime.now(timezone.utc).isoformat()),
+    ("DeletionJob", "claimedBy", "TEXT", None),
+    ("DeletionJob", "claimedAt", "TEXT", None),
+]
+
+SQLITE_USER_FIELDS = '"id", "email", "password", "role", "tokenVersion", "createdAt"'
+
+SQLITE_FIND_USER_BY_ID = (
+    f'SELECT {SQLITE_USER_FIELDS} FROM "User" WHERE "id" = ? AND "deletedAt" IS NULL'
+)
+
+SQLITE_FIND_USER_BY_EMAIL = (
+    f'SELECT {SQLITE_USER_FIELDS} FROM "User" WHERE "email" = ? AND "deletedAt" IS NULL'
+)
+
+SQLITE_CREATE_USER = f'INSERT INTO "User" ("email", "password", "role", "createdAt") VALUES (?, ?, ?, ?) RETURNING {SQLITE_USER_FIELDS}'
+
+SQLITE_INCREMENT_TOKEN_VERSION = (
+    'UPDATE "User" SET "tokenVersion" = "tokenVersion" + 1 WHERE "id" = ?'
+    f" RETURNING {SQLITE_USER_FIELDS}"
+)
+
+SQLITE_REPLACE_PASSWORD = (
+    'UPDATE "User" SET "password" = ?'
+    ' WHERE "id" = ? AND "password" = ? AND "deletedAt" IS NULL'
+)
+
+SQLITE_PASSWORD_COSTS = 'SELECT substr("password", 5, 2), count(*) FROM "User" WHERE "deletedAt" IS NULL GROUP BY 1'
+
+SQLITE_TOMBSTONE_USER = (
+    'UPDATE "User" SET "deletedAt" = ?, "tokenVersion" = "tokenVersion" + 1,'
+    ' "email" = \'deleted:\' || "id" WHERE "id" = ? AND "deletedAt" IS NULL'
+)
+
+SQLITE_CREATE_DELETION_JOB = (
+    'INSERT OR IGNORE INTO "DeletionJob" ("userId", "requestedAt") VALUES (?, ?)'
+)
+
+SQLITE_CLAIM_DELETIONS = (
+    'UPDATE "DeletionJob" SET "claimedBy" = ?, "claimedAt" = ? WHERE "completedAt" IS NULL'
+    ' AND ("claimedAt" IS NULL OR "claimedAt" < ?) RETURNING "userId", "requestedAt"'
+)
+
+SQLITE_DELETE_INTERACTIONS_CHUNK = (
+    'DELETE FROM "Interaction" WHERE "id" IN'
+    ' (SELECT "id" FROM "Interaction" WHERE "userId" = ? LIMIT ?)'
+)
+
+SQLITE_RECORD_DELETION_PROGRESS = (
+    'UPDATE "DeletionJob" SET "interactionsDeleted" = "interactionsDeleted" + ?,'
+    ' "claimedAt" = ? WHERE "userId" = ?'
+)
+
+SQLITE_PURGE_USER = 'DELETE FROM "User" WHERE "id" = ? AND "deletedAt" IS NOT NULL'
+
+SQLITE_COMPLETE_DELETION_JOB = (
+    'UPDATE "DeletionJob" SET "completedAt" = ? WHERE "userId" = ?'
+)
+
+SQLITE_INSERT_INTERACTION = 'INSERT INTO "Interaction" ("userId", "type", "content", "createdAt") VALUES (?, ?, ?, ?)'
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Embedded SQLite database, in WAL mode so that readers of other processes never block on the writer.
+
+    The connection lives on one dedicated thread and every query runs there, so the event loop never blocks on disk
+    I/O and the connection is never shared between threads. All statements are constant SQL strings with `?`
+    parameters, which sqlite3 prepares once and then reuses from the connection's statement cache.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._draining = False
+
+    def _open(self) -> None:
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA busy_timeout = 5000")
+        connection.executescript(SQLITE_SCHEMA)
+        for table, column, definition, backfill in SQLITE_ADDED_COLUMNS:
+            columns = {
+                row[1] for row in connection.execute(f'PRAGMA table_info("{table}")')
+            }
+            if column not in columns:
+                connection.execute(
+                    f'ALTER TABLE "{table}" ADD COLUMN "{column}" {definition}'
+                )
+                if backfill is not None:
+                    connection.execute(
+                        f'UPDATE "{table}" SET "{column}" = ?', (backfill(),)
+                    )
+        self._connection = connection
+
+    def _close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _run(
+        self, model: str, method: str, fn: Callable[[sqlite3.Connection], T]
+    ) -> T:
+        if self._executor is None or self._connection is None:
+            raise RuntimeError("The SQLite database is not connected.")
+        connection = self._connection
+        with project.instrumentation.query(model, method):
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, fn, connection
+            )
+
+    async def connect(self) -> None:
+        self._draining = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+
+    def start_draining(self) -> None:
+        self._draining = True
+
+    async def disconnect(self) -> None:
+        self.start_draining()
+        if self._executor is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._close
+            )
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def readiness(self) -> tuple[bool, dict[str, float]]:
+        in_flight = project.instrumentation.db_queries_in_flight.total()
+        return self._connection is not None and not self._draining, {
+            "queries_in_flight": in_flight
+        }
+
+    async def ping(self) -> None:
+        await self._run("raw", "query_raw", lambda c: c.execute("SELECT 1").fetchone())
+
+    @staticmethod
+    def _record(row: Optional[tuple]) -> Optional[UserRecord]:
+        if row is None:
+            return None
+        id, email, password, role, token_version, created_at = row
+        return UserRecord(
+            id,
+            email,
+            password,
+            prisma.enums.Role(role),
+            token_version,
+            datetime.fromisoformat(created_at),
+        )
+
+    async def find_user_by_id(self, user_id: int) -> Optional[UserRecord]:
+        row = await self._run(
+            "User",
+            "find_unique",
+            lambda c: c.execute(SQLITE_FIND_USER_BY_ID, (user_id,)).fetchone(),
+        )
+        return self._record(row)
+
+    async def find_user_by_email(self, email: str) -> Optional[UserRecord]:
+        row = await self._run(
+            "User",
+            "find_unique",
+            lambda c: c.execute(SQLITE_FIND_USER_BY_EMAIL, (email,)).fetchone(),
+        )
+        return self._record(row)
+
+    async def create_user(
+        self, email: str, password: str, role: prisma.enums.Role
+    ) -> UserRecord:
+        params = (
+            email,
+            password,
+            prisma.enums.Role(role).value,
+            datetime.now(timezone.utc).isoformat(),
+        )
+        try:
+            row = await self._run(
+                "User",
+                "create",
+                lambda c: c.execute(SQLITE_CREATE_USER, params).fetchone(),
+            )
+        except sqlite3.IntegrityError as e:
+            raise UniqueConstraintError(str(e)) from e
+        return self._record(row)
+
+    async def update_user(
+        self, user_id: int, fields: dict[str, Any]
+    ) -> Optional[UserRecord]:
+        unknown = set(fields) - set(USER_COLUMNS)
+        if unknown:
+            raise ValueError(
+                f"Cannot update user columns: {', '.join(sorted(unknown))}"
+            )
+        if "role" in fields:
+            fields = {**fields, "role": prisma.enums.Role(fields["role"]).value}
+        if "tokenVersion" in fields:
+            fields = {**fields, "tokenVersion": fields["tokenVersion"]["increment"]}
+        # Columns are always listed in USER_COLUMNS order, so each combination maps to one cached statement.
+        columns = [column for column in USER_COLUMNS if column in fields]
+        sql = (
+            'UPDATE "User" SET '
+            + ", ".join(
+                (
+                    f'"{column}" = "{column}" + ?'
+                    if column == "tokenVersion"
+                    else f'"{column}" = ?'
+                )
+                for column in columns
+            )
+            + ' WHERE "id" = ? AND "deletedAt" IS NULL'
+            + f" RETURNING {SQLITE_USER_FIELDS}"
+        )
+        params = (*(fields[column] for column in columns), user_id)
+        try:
+            row = await self._run(
+                "User", "update", lambda c: c.execute(sql, params).fetchone()
+            )
+        except sqlite3.IntegrityError as e:
+            raise UniqueConstraintError(str(e)) from e
+        return self._record(row)
+
+    async def increment_token_version(self, user_id: int) -> Optional[UserRecord]:
+        row = await self._run(
+            "User",
+            "update",
+            lambda c: c.execute(SQLITE_INCREMENT_TOKEN_VERSION, (user_id,)).fetchone(),
+        )
+        return self._record(row)
+
+    async def replace_password(self, user_id: int, old: str, new: str) -> bool:
+        replaced = await self._run(
+            "User",
+            "update_many",
+            lambda c: c.execute(SQLITE_REPLACE_PASSWORD, (new, user_id, old)).rowcount,
+        )
+        return replaced > 0
+
+    async def password_costs(self) -> dict[int, int]:
+        rows = await self._run(
+            "User",
+            "group_by",
+            lambda c: c.execute(SQLITE_PASSWORD_COSTS).fetchall(),
+        )
+        return _password_costs(rows)
+
+    async def tombstone_users(self, user_ids: list[int]) -> list[int]:
+        now = datetime.now(timezone.utc).isoformat()
+
+        def tombstone(connection: sqlite3.Connection) -> list[int]:
+            found = []
+            with connection:
+                connection.execute("BEGIN")
+                for user_id in user_ids:
+                    if connection.execute(
+                        SQLITE_TOMBSTONE_USER, (now, user_id)
+                    ).rowcount:
+                        connection.execute(SQLITE_CREATE_DELETION_JOB, (user_id, now))
+                        found.append(user_id)
+            return found
+
+        return await self._run("User", "update_many", tombstone)
+
+    async def claim_deletions(self, worker: str, lease_seconds: float) -> list[int]:
+        now = datetime.now(timezone.utc)
+        params = (
+            worker,
+            now.isoformat(),
+            (now - timedelta(seconds=lease_seconds)).isoformat(),
+        )
+        rows = await self._run(
+            "DeletionJob",
+            "update_many",
+            lambda c: c.execute(SQLITE_CLAIM_DELETIONS, params).fetchall(),
+        )
+        return [row[0] for row in sorted(rows, key=lambda row: row[1])]
+
+    async def delete_interactions_chunk(self, user_id: int, limit: int) -> int:
+        def delete(connection: sqlite3.Connection) -> int:
+            with connection:
+                connection.execute("BEGIN")
+                deleted = connection.execute(
+                    SQLITE_DELETE_INTERACTIONS_CHUNK, (user_id, limit)
+                ).rowcount
+                if deleted:
+                    connection.execute(
+                        SQLITE_RECORD_DELETION_PROGRESS,
+                        (deleted, datetime.now(timezone.utc).isoformat(), user_id),
+                    )
+            return deleted
+
+        return await self._run("Interaction", "delete_many", delete)
+
+    async def purge_user(self, user_id: int) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+
+        def purge(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute("BEGIN")
+                connection.execute(SQLITE_PURGE_USER, (user_id,))
+                connection.execute(SQLITE_COMPLETE_DELETION_JOB, (now, user_id))
+
+        await self._run("User", "delete", purge)
+
+    async def insert_interactions(self, records: list[dict[str, Any]]) -> None:
+        try:
+            rows = [
+                (
+                    record["userId"],
+                    prisma.enums.InteractionType(record["type"]).value,
+                    record["content"],
+                    record["createdAt"].isoformat(),
+                )
+                for record in records
+            ]
+        except (KeyError, ValueError, AttributeError) as e:
+            raise InvalidRecordError(str(e)) from e
+
+        def insert(connection: sqlite3.Connection) -> None:
+            with connection:
+                connection.execute("BEGIN")
+                connection.executemany(SQLITE_INSERT_INTERACTION, rows)
+
+        try:
+            await self._run("Interaction", "create_many", insert)
+        except (sqlite3.IntegrityError, sqlite3.DataError) as e:
+            raise InvalidRecordError(str(e)) from e
+
+
+def from_env() -> StorageBackend:
+    kind = os.getenv("STORAGE_BACKEND", "prisma")
+    if kind == "prisma":
+        return PrismaBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("SQLITE_PATH", "hello_world.db"))
+    raise ValueError(f"Unknown storage backend: {kind}")
+
+
+backend = from_env()
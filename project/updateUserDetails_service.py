@@ -1,10 +1,12 @@
 from typing import Optional
 
-import bcrypt
-import jwt
 import prisma
 import prisma.enums
-import prisma.models
+import project.auth
+import project.getUserDetails_service
+import project.password_hasher
+import project.storage
+import project.user_repository
 from jwt import ExpiredSignatureError, PyJWTError
 from pydantic import BaseModel
 
@@ -28,52 +30,51 @@ class UserProfileUpdateResponse(BaseModel):
     updated_user: Optional[User] = None
 
 
-SECRET_KEY = "YourSecretKeyHere"
-
-ALGORITHM = "HS256"
-
-
 async def updateUserDetails(
-    email: str, password: str, auth_token: str
+    email: Optional[str], password: Optional[str], auth_token: str
 ) -> UserProfileUpdateResponse:
     """
     Allows authenticated users to update their profile information like email and password. Users need to be authenticated and can only update their own information. It requires passing the new details and the authentication token.
 
+    Only the given fields are written, with a single UPDATE. The new password is hashed on the hashing pool before the
+    statement is issued, and a taken email is detected by the unique constraint rather than a separate lookup, so
+    concurrent updates cannot both claim the same email. A password change also bumps the token version in that
+    UPDATE, which revokes every token issued so far.
+
     Args:
-    email (str): The new email address to update the user's profile.
-    password (str): The new password for the user. It should be securely hashed and validated before use.
+    email (Optional[str]): The new email address to update the user's profile, or None to keep the current one.
+    password (Optional[str]): The new password for the user, or None to keep the current one. It is securely hashed before use.
     auth_token (str): The JWT token used for authenticating the user's request, ensuring they are updating their own profile only.
 
     Returns:
     UserProfileUpdateResponse: The response after a user profile update operation, indicating success or failure and any relevant user data.
     """
     try:
-        data = jwt.decode(auth_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = data["user_id"]
-        user = await prisma.models.User.prisma().find_unique(where={"id": user_id})
+        claims = await project.auth.verify_token(auth_token)
+        fields = {}
+        if email is not None:
+            fields["email"] = email
+        if password is not None:
+            fields["password"] = await project.password_hasher.hash_password(password)
+            # A password change signs out every session, including ones opened with the old password elsewhere.
+            fields["tokenVersion"] = {"increment": 1}
+        if not fields:
+            return UserProfileUpdateResponse(
+                success=False, message="Nothing to update."
+            )
+        user = await project.user_repository.update_user(claims.user_id, fields)
         if user is None:
             return UserProfileUpdateResponse(success=False, message="User not found.")
-        if user.email != email:
-            existing_user = await prisma.models.User.prisma().find_unique(
-                where={"email": email}
-            )
-            if existing_user:
-                return UserProfileUpdateResponse(
-                    success=False, message="Email already in use."
-                )
-            user = await prisma.models.User.prisma().update(
-                where={"id": user_id}, data={"email": email}
-            )
-        hashed_password = bcrypt.hashpw(password.encode(), bcrypt.gensalt())
-        user = await prisma.models.User.prisma().update(
-            where={"id": user_id}, data={"password": hashed_password.decode()}
-        )
+        project.getUserDetails_service.details_etags.invalidate(claims.user_id)
+        project.auth.invalidate_user(claims.user_id)
         updated_user = User(email=user.email, role=user.role.name)
         return UserProfileUpdateResponse(
             success=True,
             message="User profile updated successfully.",
             updated_user=updated_user,
         )
+    except project.storage.UniqueConstraintError:
+        return UserProfileUpdateResponse(success=False, message="Email already in use.")
     except ExpiredSignatureError:
         return UserProfileUpdateResponse(
             success=False, message="Authentication failed due to expired token."
@@ -82,6 +83,8 @@ async def updateUserDetails(
         return UserProfileUpdateResponse(
             success=False, message=f"Authentication failed: {str(e)}"
         )
+    except project.password_hasher.PasswordHasherSaturatedError:
+        raise
     except Exception as e:
         return UserProfileUpdateResponse(
             success=False, message=f"Update failed: {str(e)}"
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+import prisma.enums
+import project.storage
+
+UserRecord = project.storage.UserRecord
+
+
+class UserCache:
+    """
+    Size-bounded LRU cache of UserRecords with a per-entry TTL, indexed by both id and email.
+
+    Concurrent misses for the same key share a single database query. Every write bumps an epoch counter, and a
+    query that started before a write does not populate the cache, so a slow read can never overwrite a newer
+    record with stale data.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._by_id: OrderedDict[int, tuple[UserRecord, float]] = OrderedDict()
+        self._id_by_email: dict[str, int] = {}
+        self._inflight: dict[tuple[str, Any], asyncio.Future] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def _lookup(self, user_id: Optional[int]) -> Optional[UserRecord]:
+        entry = self._by_id.get(user_id) if user_id is not None else None
+        if entry is None:
+            return None
+        record, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(record.id)
+            self.evictions += 1
+            return None
+        self._by_id.move_to_end(record.id)
+        return record
+
+    def _remove(self, user_id: int) -> None:
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None and self._id_by_email.get(entry[0].email) == user_id:
+            del self._id_by_email[entry[0].email]
+
+    def put(self, record: UserRecord) -> None:
+        self._remove(record.id)
+        self._by_id[record.id] = (record, time.monotonic() + self.ttl)
+        self._id_by_email[record.email] = record.id
+        while len(self._by_id) > self.max_size:
+            self._remove(next(iter(self._by_id)))
+            self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        self._epoch += 1
+        self._remove(user_id)
+
+    def invalidate_email(self, email: str) -> None:
+        user_id = self._id_by_email.get(email)
+        if user_id is not None:
+            self.invalidate(user_id)
+
+    def clear(self) -> None:
+        self._epoch += 1
+        self._by_id.clear()
+        self._id_by_email.clear()
+
+    async def get(
+        self,
+        index: str,
+        key: Any,
+        load: Callable[[], Awaitable[Optional[UserRecord]]],
+    ) -> Optional[UserRecord]:
+        if index == "id":
+            record = self._lookup(key)
+        else:
+            record = self._lookup(self._id_by_email.get(key))
+        if record is not None:
+            self.hits += 1
+            return record
+        self.misses += 1
+        inflight = self._inflight.get((index, key))
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(index, key)] = future
+        epoch = self._epoch
+        try:
+            record = await load()
+            if record is not None and epoch == self._epoch:
+                self.put(record)
+            future.set_result(record)
+            return record
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else is waiting on it.
+            future.exception()
+            raise
+        finally:
+            del self._inflight[(index, key)]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._by_id),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "coalesced": self.coalesced,
+        }
+
+
+user_cache = UserCache(
+    max_size=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "30")),
+)
+
+
+async def get_user_by_id(user_id: int) -> Optional[UserRecord]:
+    """
+    Returns the user with the given id, from the cache when possible.
+
+    Args:
+        user_id (int): The user's id.
+
+    Returns:
+        Optional[UserRecord]: The user, or None if no such user exists.
+    """
+    return await user_cache.get(
+        "id",
+        user_id,
+        lambda: project.storage.backend.find_user_by_id(user_id),
+    )
+
+
+async def get_user_by_email(email: str) -> Optional[UserRecord]:
+    """
+    Returns the user with the given email, from the cache when possible.
+
+    Args:
+        email (str): The user's email.
+
+    Returns:
+        Optional[UserRecord]: The user, or None if no such user exists.
+    """
+    return await user_cache.get(
+        "email",
+        email,
+        lambda: project.storage.backend.find_user_by_email(email),
+    )
+
+
+async def get_fresh_user_by_email(email: str) -> Optional[UserRecord]:
+    """
+    Reads the user with the given email from the database, bypassing the cache, and refreshes its cache entry. Use
+    this where acting on a stale record is not acceptable, such as checking a password: another worker may have
+    changed the password or deleted the user within the last USER_CACHE_TTL seconds.
+
+    Args:
+        email (str): The user's email.
+
+    Returns:
+        Optional[UserRecord]: The user, or None if no such user exists or it has been deleted.
+    """
+    record = await project.storage.backend.find_user_by_email(email)
+    user_cache.invalidate_email(email)
+    if record is not None:
+        user_cache.invalidate(record.id)
+        user_cache.put(record)
+    return record
+
+
+async def create_user(email: str, password: str, role: prisma.enums.Role) -> UserRecord:
+    """
+    Creates a user and caches the new record.
+
+    Raises:
+        project.storage.UniqueConstraintError: If the email is already taken.
+    """
+    record = await project.storage.backend.create_user(email, password, role)
+    user_cache.invalidate(record.id)
+    user_cache.put(record)
+    return record
+
+
+async def update_user(user_id: int, fields: dict[str, Any]) -> Optional[UserRecord]:
+    """
+    Updates columns of a user and refreshes its cache entry. Returns None if the user does not exist or has been deleted.
+
+    Raises:
+        project.storage.UniqueConstraintError: If the new email is already taken.
+    """
+    user_cache.invalidate(user_id)
+    record = await project.storage.backend.update_user(user_id, fields)
+    if record is None:
+        return None
+    user_cache.invalidate(user_id)
+    user_cache.put(record)
+    return record
+
+
+async def increment_token_version(user_id: int) -> Optional[UserRecord]:
+    """
+    Bumps a user's token version and refreshes its cache entry. Returns None if the user does not exist or has been deleted.
+    """
+    user_cache.invalidate(user_id)
+    record = await project.storage.backend.increment_token_version(user_id)
+    if record is None:
+        return None
+    user_cache.invalidate(user_id)
+    user_cache.put(record)
+    return record
+
+
+async def tombstone_users(user_ids: list[int]) -> list[int]:
+    """
+    Marks users as deleted and drops their cache entries. Returns the ids of the users that existed.
+    """
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    deleted = await project.storage.backend.tombstone_users(user_ids)
+    for user_id in user_ids:
+        user_cache.invalidate(user_id)
+    return deleted
+
+
+async def replace_password(user_id: int, old: str, new: str) -> bool:
+    """
+    Replaces a user's password hash if it is still `old`, and drops its cache entry. Returns whether it was replaced.
+    """
+    user_cache.invalidate(user_id)
+    replaced = await project.storage.backend.replace_password(user_id, old, new)
+    user_cache.invalidate(user_id)
+    return replaced
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# The storage backend and caches are module singletons configured from the environment on import, so the test
+# database has to be chosen before any `project` module is imported.
+os.environ["STORAGE_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "tests.db")
+os.environ.setdefault("JWT_SECRET", "test-secret-that-is-at-least-32-bytes-long")
@@ -0,0 +1,123 @@
+"""
+Deletion job leasing and the chunked purge, against the SQLite storage backend.
+"""
+
+import asyncio
+import itertools
+from datetime import datetime, timezone
+
+import prisma.enums
+import project.account_deletion
+import project.password_hasher
+import project.storage
+from project.account_deletion import DeletionEngine
+
+_emails = itertools.count()
+
+
+async def _tombstoned_users(count: int, interactions: int = 0) -> list[int]:
+    password = await project.password_hasher.hash_password("password")
+    user_ids = []
+    for _ in range(count):
+        user = await project.storage.backend.create_user(
+            f"deleted{next(_emails)}@example.com", password, prisma.enums.Role.User
+        )
+        user_ids.append(user.id)
+    await project.storage.backend.insert_interactions(
+        [
+            {
+                "userId": user_id,
+                "type": prisma.enums.InteractionType.API,
+                "content": "Hello World",
+                "createdAt": datetime.now(timezone.utc),
+            }
+            for user_id in user_ids
+            for _ in range(interactions)
+        ]
+    )
+    assert await project.account_deletion.delete_users(user_ids) == user_ids
+    return user_ids
+
+
+def _engine() -> DeletionEngine:
+    return DeletionEngine(chunk_size=2, chunk_pause=0, poll_interval=60, lease=300)
+
+
+async def _open_jobs() -> set[int]:
+    # Claims every open job, whoever holds it; only safe to call at the end of a test.
+    return set(await project.storage.backend.claim_deletions("probe", -1))
+
+
+def _run(test) -> None:
+    async def run() -> None:
+        await project.storage.backend.connect()
+        try:
+            await test()
+        finally:
+            await project.storage.backend.disconnect()
+
+    asyncio.run(run())
+
+
+def test_claimed_jobs_are_not_claimed_again_until_the_lease_expires() -> None:
+    async def test() -> None:
+        user_ids = set(await _tombstoned_users(2))
+        backend = project.storage.backend
+
+        assert user_ids <= set(await backend.claim_deletions("first", 300))
+        assert not user_ids & set(await backend.claim_deletions("second", 300))
+
+        await asyncio.sleep(0.05)
+        assert user_ids <= set(await backend.claim_deletions("second", 0.01))
+
+    _run(test)
+
+
+def test_engine_purges_in_chunks_and_completes_the_job() -> None:
+    async def test() -> None:
+        [user_id] = await _tombstoned_users(1, interactions=5)
+        engine = _engine()
+
+        assert await engine.run_once() >= 1
+        stats = engine.stats()
+        assert stats["users_purged"] >= 1
+        assert stats["interactions_deleted"] >= 5
+        assert stats["chunks"] >= 3
+        assert stats["failures"] == 0
+        assert user_id not in await project.storage.backend.claim_deletions("other", -1)
+
+    _run(test)
+
+
+def test_engine_takes_over_jobs_whose_lease_ran_out() -> None:
+    async def test() -> None:
+        user_ids = set(await _tombstoned_users(2, interactions=1))
+        first, second = _engine(), _engine()
+        second.worker = "other-host:1"
+        assert user_ids <= set(
+            await project.storage.backend.claim_deletions(first.worker, first.lease)
+        )
+
+        # A lease that ran out, e.g. because the first worker died, is taken over.
+        second.lease = -1
+        await second.run_once()
+
+        assert not user_ids & await _open_jobs()
+
+    _run(test)
+
+
+def test_engine_skips_jobs_leased_by_another_worker() -> None:
+    async def test() -> None:
+        user_ids = set(await _tombstoned_users(2, interactions=1))
+        first, second = _engine(), _engine()
+        second.worker = "other-host:1"
+        assert user_ids <= set(
+            await project.storage.backend.claim_deletions(first.worker, first.lease)
+        )
+
+        await second.run_once()
+
+        assert user_ids <= await _open_jobs()
+
+    _run(test)
@@ -0,0 +1,136 @@
+"""
+Admission control: class limits, priority order and load shedding.
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from project.admission import (
+    DEFAULT_CLASSES,
+    AdmissionController,
+    AdmissionMiddleware,
+    AdmissionShedError,
+    RouteClass,
+)
+
+
+def _controller(max_concurrency: int = 2, **classes) -> AdmissionController:
+    # classes: name=(priority, concurrency, queue size, maximum wait)
+    return AdmissionController(
+        [RouteClass(name, *limits) for name, limits in classes.items()],
+        max_concurrency,
+    )
+
+
+def test_default_class_limits_fit_in_the_global_limit() -> None:
+    controller = AdmissionController.from_env()
+
+    assert sum(limits[1] for limits in DEFAULT_CLASSES.values()) <= (
+        controller.max_concurrency
+    )
+
+
+def test_reads_at_their_limit_leave_slots_for_writes_and_logins() -> None:
+    async def test() -> None:
+        controller = AdmissionController.from_env()
+        read = controller.classes["read"]
+        for _ in range(read.concurrency):
+            await controller.acquire(read)
+        with pytest.raises(AdmissionShedError):
+            await asyncio.wait_for(controller.acquire(read), 5)
+
+        await controller.acquire(controller.classes["write"])
+        await controller.acquire(controller.classes["auth"])
+
+    asyncio.run(test())
+
+
+def test_full_queue_is_shed_right_away() -> None:
+    async def test() -> None:
+        controller = _controller(read=(0, 1, 1, 10.0))
+        read = controller.classes["read"]
+        await controller.acquire(read)
+        waiter = asyncio.ensure_future(controller.acquire(read))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionShedError, match="overloaded"):
+            await controller.acquire(read)
+        assert read.stats()["shed_queue_full"] == 1
+
+        controller.release(read, 0.01)
+        await waiter
+        assert read.stats()["admitted"] == 2
+
+    asyncio.run(test())
+
+
+def test_request_is_shed_at_its_deadline() -> None:
+    async def test() -> None:
+        controller = _controller(read=(0, 1, 8, 0.05))
+        read = controller.classes["read"]
+        await controller.acquire(read)
+
+        with pytest.raises(AdmissionShedError, match="deadline"):
+            await controller.acquire(read)
+        assert read.stats()["shed_deadline"] == 1
+        assert read.stats()["queued"] == 0
+        assert read.stats()["queue_seconds_max"] >= 0.05
+
+    asyncio.run(test())
+
+
+def test_waiters_are_admitted_in_priority_order() -> None:
+    async def test() -> None:
+        controller = _controller(
+            max_concurrency=1, read=(0, 1, 8, 10.0), auth=(2, 1, 8, 10.0)
+        )
+        read, auth = controller.classes["read"], controller.classes["auth"]
+        await controller.acquire(auth)
+        admitted = []
+
+        async def request(route_class: RouteClass) -> None:
+            await controller.acquire(route_class)
+            admitted.append(route_class.name)
+
+        waiters = [
+            asyncio.ensure_future(request(route_class)) for route_class in (auth, read)
+        ]
+        await asyncio.sleep(0)
+        controller.release(auth, 0.01)
+        while not admitted:
+            await asyncio.sleep(0)
+        controller.release(controller.classes[admitted[0]], 0.01)
+        await asyncio.gather(*waiters)
+
+        assert admitted == ["read", "auth"]
+
+    asyncio.run(test())
+
+
+def test_shed_requests_get_503_with_retry_after() -> None:
+    async def test() -> None:
+        release = asyncio.Event()
+
+        async def app(scope, receive, send) -> None:
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"{}"})
+
+        controller = _controller(read=(0, 1, 0, 10.0))
+        transport = httpx.ASGITransport(app=AdmissionMiddleware(app, controller))
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            first = asyncio.ensure_future(client.get("/hello-world"))
+            await asyncio.sleep(0.01)
+            shed = await client.get("/user/details")
+            unclassified = asyncio.ensure_future(client.get("/ready"))
+            release.set()
+
+            assert shed.status_code == 503
+            assert int(shed.headers["Retry-After"]) >= 1
+            assert (await first).status_code == 200
+            assert (await unclassified).status_code == 200
+
+    asyncio.run(test())
@@ -0,0 +1,25 @@
+"""
+The benchmark harness against the in-process app on the SQLite storage backend.
+"""
+
+import argparse
+import asyncio
+
+import project.benchmark
+
+
+def test_failed_responses_are_counted_as_errors() -> None:
+    assert project.benchmark.failed({"success": False, "message": "User not found."})
+    assert not project.benchmark.failed({"success": True})
+    assert not project.benchmark.failed({"message": "Hello World"})
+
+
+def test_user_update_scenarios_succeed_on_every_iteration() -> None:
+    args = argparse.Namespace(
+        url=None, requests=4, concurrency=2, users=2, iterations=3, fast_responses=False
+    )
+    results = asyncio.run(project.benchmark.run(args))
+
+    assert results["routes"]["user-update"]["errors"] == 0
+    assert results["services"]["updateUserDetails"]["errors"] == 0
+    assert results["services"]["deleteUser"]["errors"] == 0
@@ -0,0 +1,57 @@
+"""
+Request bounds of `POST /user/delete/bulk` against the SQLite storage backend.
+"""
+
+import asyncio
+
+import httpx
+import prisma.enums
+import project.auth
+import project.bulkDeleteUsers_service
+import project.password_hasher
+import project.server
+import project.storage
+
+
+def _run(test) -> None:
+    async def run() -> None:
+        await project.storage.backend.connect()
+        try:
+            admin = await project.storage.backend.create_user(
+                "bulk-delete-admin@example.com",
+                await project.password_hasher.hash_password("password"),
+                prisma.enums.Role.Administrator,
+            )
+            transport = httpx.ASGITransport(app=project.server.app)
+            async with httpx.AsyncClient(
+                transport=transport,
+                base_url="http://test",
+                headers={"Authorization": f"Bearer {project.auth.issue_token(admin)}"},
+            ) as client:
+                await test(client)
+        finally:
+            await project.storage.backend.disconnect()
+
+    asyncio.run(run())
+
+
+def test_bulk_delete_rejects_empty_and_oversized_batches() -> None:
+    async def test(client: httpx.AsyncClient) -> None:
+        oversized = list(range(1, project.bulkDeleteUsers_service.MAX_USERS + 2))
+        for user_ids in ([], oversized):
+            response = await client.post(
+                "/user/delete/bulk", json={"user_ids": user_ids}
+            )
+            assert response.status_code == 422
+
+        response = await client.post(
+            "/user/delete/bulk", json={"user_ids": [10**9, 10**9]}
+        )
+        assert response.status_code == 200
+        assert response.json()["deleted"] == 0
+        assert [result["success"] for result in response.json()["results"]] == [
+            False,
+            False,
+        ]
+
+    _run(test)
@@ -0,0 +1,104 @@
+"""
+The `/cli/ws` protocol, end to end against the app on the SQLite storage backend.
+"""
+
+import itertools
+import json
+
+import prisma.enums
+import project.auth
+import project.cli_channel
+import project.password_hasher
+import project.server
+import project.storage
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+_emails = itertools.count()
+
+
+@pytest.fixture
+def client():
+    with TestClient(project.server.app) as client:
+        yield client
+
+
+def _user(client: TestClient) -> tuple[project.storage.UserRecord, str]:
+    async def create() -> project.storage.UserRecord:
+        return await project.storage.backend.create_user(
+            f"cli{next(_emails)}@example.com",
+            await project.password_hasher.hash_password("password"),
+            prisma.enums.Role.User,
+        )
+
+    user = client.portal.call(create)
+    return user, project.auth.issue_token(user)
+
+
+def _closed_with(websocket, code: int) -> None:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        websocket.receive_text()
+    assert closed.value.code == code
+
+
+def test_commands_are_answered_in_order(client) -> None:
+    user, token = _user(client)
+    with client.websocket_connect("/cli/ws") as websocket:
+        websocket.send_text(json.dumps({"user_id": user.id, "token": token}))
+        assert json.loads(websocket.receive_text()) == {"authenticated": True}
+
+        websocket.send_text("hello-world\nbogus\nhello-world")
+        websocket.send_text("stats")
+        first = websocket.receive_text().split("\n")
+        assert first == [
+            project.cli_channel.HELLO_WORLD,
+            project.cli_channel.INVALID_COMMAND,
+            project.cli_channel.HELLO_WORLD,
+        ]
+        stats = json.loads(websocket.receive_text())
+        assert stats["messages"] == 1
+        assert stats["commands"] == 3
+
+
+def test_invalid_credentials_close_with_policy_violation(client) -> None:
+    user, token = _user(client)
+    for hello in (
+        "not json",
+        json.dumps({"user_id": user.id}),
+        json.dumps({"user_id": user.id + 1, "token": token}),
+        json.dumps({"user_id": user.id, "token": "not-a-jwt"}),
+    ):
+        with client.websocket_connect("/cli/ws") as websocket:
+            websocket.send_text(hello)
+            assert websocket.receive_text() == project.cli_channel.AUTHENTICATION_FAILED
+            _closed_with(websocket, project.cli_channel.POLICY_VIOLATION)
+
+
+def test_binary_frames_close_with_unsupported_data(client) -> None:
+    user, token = _user(client)
+    rejected = project.cli_channel.cli_channel.stats()["binary_rejected"]
+    with client.websocket_connect("/cli/ws") as websocket:
+        websocket.send_bytes(json.dumps({"user_id": user.id, "token": token}).encode())
+        assert websocket.receive_text() == project.cli_channel.BINARY_NOT_SUPPORTED
+        _closed_with(websocket, project.cli_channel.UNSUPPORTED_DATA)
+
+    with client.websocket_connect("/cli/ws") as websocket:
+        websocket.send_text(json.dumps({"user_id": user.id, "token": token}))
+        websocket.receive_text()
+        websocket.send_bytes(b"hello-world")
+        assert websocket.receive_text() == project.cli_channel.BINARY_NOT_SUPPORTED
+        _closed_with(websocket, project.cli_channel.UNSUPPORTED_DATA)
+    assert project.cli_channel.cli_channel.stats()["binary_rejected"] == rejected + 2
+
+
+def test_revoked_token_ends_the_session(client) -> None:
+    user, token = _user(client)
+    with client.websocket_connect("/cli/ws") as websocket:
+        websocket.send_text(json.dumps({"user_id": user.id, "token": token}))
+        websocket.receive_text()
+
+        client.portal.call(project.auth.revoke_user_tokens, user.id)
+        websocket.send_text("hello-world")
+        assert websocket.receive_text() == project.cli_channel.AUTHENTICATION_FAILED
+        _closed_with(websocket, project.cli_channel.POLICY_VIOLATION)
@@ -0,0 +1,145 @@
+"""
+`Idempotency-Key` replays, mismatches, coalescing of concurrent duplicates and store failures.
+"""
+
+import asyncio
+from typing import Any, Optional
+
+import httpx
+import project.idempotency
+
+
+class CountingApp:
+    """
+    Answers every request with the number of times it has run, optionally waiting for `release` first.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.release: Optional[asyncio.Event] = None
+
+    async def __call__(self, scope: dict[str, Any], receive: Any, send: Any) -> None:
+        self.calls += 1
+        calls = self.calls
+        await receive()
+        if self.release is not None:
+            await self.release.wait()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [(b"content-type", b"text/plain")],
+            }
+        )
+        await send({"type": "http.response.body", "body": str(calls).encode()})
+
+
+class UnavailableStore(project.idempotency.IdempotencyStore):
+    async def get(self, key: tuple[str, str]) -> None:
+        raise project.idempotency.IdempotencyStoreError("unreachable")
+
+    async def put(self, key: tuple[str, str], response: Any) -> None:
+        raise project.idempotency.IdempotencyStoreError("unreachable")
+
+
+def _client(
+    app: CountingApp, store: Optional[project.idempotency.IdempotencyStore] = None
+) -> tuple[httpx.AsyncClient, project.idempotency.IdempotencyCache]:
+    cache = project.idempotency.IdempotencyCache(
+        store or project.idempotency.MemoryStore(max_size=100, ttl=60)
+    )
+    middleware = project.idempotency.IdempotencyMiddleware(app, cache)
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://test"
+    )
+    return client, cache
+
+
+def test_retry_is_replayed_without_running_again() -> None:
+    app = CountingApp()
+
+    async def run() -> None:
+        client, cache = _client(app)
+        async with client:
+            headers = {"Idempotency-Key": "k1"}
+            first = await client.post("/register", content=b"a", headers=headers)
+            retry = await client.post("/register", content=b"a", headers=headers)
+        assert first.text == retry.text == "1"
+        assert "idempotent-replayed" not in first.headers
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert app.calls == 1
+        assert cache.hits == 1
+
+    asyncio.run(run())
+
+
+def test_reusing_a_key_for_a_different_request_is_rejected() -> None:
+    app = CountingApp()
+
+    async def run() -> None:
+        client, cache = _client(app)
+        async with client:
+            headers = {"Idempotency-Key": "k1"}
+            await client.post("/register", content=b"a", headers=headers)
+            other = await client.post("/register", content=b"b", headers=headers)
+        assert other.status_code == 422
+        assert app.calls == 1
+        assert cache.mismatches == 1
+
+    asyncio.run(run())
+
+
+def test_concurrent_duplicates_wait_for_the_first_attempt() -> None:
+    app = CountingApp()
+
+    async def run() -> None:
+        app.release = asyncio.Event()
+        client, cache = _client(app)
+        async with client:
+            headers = {"Idempotency-Key": "k1"}
+            requests = [
+                asyncio.create_task(
+                    client.post("/cli/hello-world", content=b"a", headers=headers)
+                )
+                for _ in range(3)
+            ]
+            while not cache.inflight or cache.coalesced < 2:
+                await asyncio.sleep(0.01)
+            app.release.set()
+            responses = await asyncio.gather(*requests)
+        assert [response.text for response in responses] == ["1", "1", "1"]
+        assert app.calls == 1
+        assert cache.coalesced == 2
+
+    asyncio.run(run())
+
+
+def test_requests_without_a_key_or_outside_the_write_paths_always_run() -> None:
+    app = CountingApp()
+
+    async def run() -> None:
+        client, _ = _client(app)
+        async with client:
+            await client.post("/register", content=b"a")
+            await client.post("/register", content=b"a")
+            await client.post("/login", content=b"a", headers={"Idempotency-Key": "k"})
+            await client.post("/login", content=b"a", headers={"Idempotency-Key": "k"})
+        assert app.calls == 4
+
+    asyncio.run(run())
+
+
+def test_unavailable_store_runs_the_request_without_idempotency() -> None:
+    app = CountingApp()
+
+    async def run() -> None:
+        client, cache = _client(app, UnavailableStore())
+        async with client:
+            headers = {"Idempotency-Key": "k1"}
+            first = await client.post("/register", content=b"a", headers=headers)
+            retry = await client.post("/register", content=b"a", headers=headers)
+        assert (first.status_code, retry.status_code) == (200, 200)
+        assert app.calls == 2
+        assert cache.store_errors == 2
+
+    asyncio.run(run())
@@ -0,0 +1,65 @@
+"""
+Encoding and validation of the keyset cursors returned by `GET /interactions`.
+"""
+
+import asyncio
+import base64
+
+import httpx
+import prisma.enums
+import pytest
+import project.auth
+import project.password_hasher
+import project.server
+import project.storage
+from project.listInteractions_service import decode_cursor, encode_cursor
+
+
+@pytest.mark.parametrize("interaction_id", [0, 1, 42, 2**63 - 1])
+def test_cursor_round_trip(interaction_id: int) -> None:
+    assert decode_cursor(encode_cursor(interaction_id)) == interaction_id
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"2024-01-01T00:00:00|42").decode(),
+        base64.urlsafe_b64encode(b"-1").decode(),
+        base64.urlsafe_b64encode(b"007").decode(),
+        base64.urlsafe_b64encode(b" 7").decode(),
+        base64.urlsafe_b64encode("٣".encode()).decode(),
+        base64.urlsafe_b64encode(b"\xff").decode(),
+        encode_cursor(42).rstrip("="),
+    ],
+)
+def test_malformed_cursors_are_rejected(cursor: str) -> None:
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        decode_cursor(cursor)
+
+
+def test_malformed_cursor_is_a_bad_request() -> None:
+    async def run() -> None:
+        await project.storage.backend.connect()
+        try:
+            user = await project.storage.backend.create_user(
+                "cursor@example.com",
+                await project.password_hasher.hash_password("password"),
+                prisma.enums.Role.User,
+            )
+            transport = httpx.ASGITransport(app=project.server.app)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://test"
+            ) as client:
+                response = await client.get(
+                    "/interactions",
+                    params={"cursor": "not base64!"},
+                    headers={
+                        "Authorization": f"Bearer {project.auth.issue_token(user)}"
+                    },
+                )
+            assert response.status_code == 400
+        finally:
+            await project.storage.backend.disconnect()
+
+    asyncio.run(run())
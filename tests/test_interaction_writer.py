@@ -0,0 +1,128 @@
+"""
+Failure handling of the interaction write buffer, against a fake storage backend.
+"""
+
+import asyncio
+
+import prisma.enums
+import project.storage
+import pytest
+from project.interaction_writer import InteractionWriteBuffer
+
+
+class FlakyBackend:
+    """
+    Accepts batches unless the database is marked down or a batch holds a row of a `rejected` user.
+    """
+
+    def __init__(self, rejected: frozenset[int] = frozenset()) -> None:
+        self.rejected = rejected
+        self.down = False
+        self.written: list[int] = []
+        self.batches: list[int] = []
+
+    async def insert_interactions(self, records: list[dict]) -> None:
+        self.batches.append(len(records))
+        await asyncio.sleep(0)
+        if self.down:
+            raise ConnectionError("connection refused")
+        if any(record["userId"] in self.rejected for record in records):
+            raise project.storage.InvalidRecordError("foreign key violation")
+        self.written.extend(record["userId"] for record in records)
+
+
+def _buffer(**options) -> InteractionWriteBuffer:
+    options = {"max_batch": 8, "flush_interval": 0.5, "max_pending": 100, **options}
+    return InteractionWriteBuffer(**options)
+
+
+def _enqueue(buffer: InteractionWriteBuffer, user_ids) -> None:
+    for user_id in user_ids:
+        assert buffer.enqueue(user_id, prisma.enums.InteractionType.API, "Hello World")
+
+
+@pytest.fixture
+def backend(monkeypatch) -> FlakyBackend:
+    backend = FlakyBackend()
+    monkeypatch.setattr(project.storage, "backend", backend)
+    return backend
+
+
+def test_unavailable_database_keeps_the_batch_whole_and_backs_off(backend) -> None:
+    async def test() -> None:
+        buffer = _buffer(max_failures=2, max_backoff=2.0)
+        _enqueue(buffer, range(8))
+        backend.down = True
+        delays = []
+        for _ in range(5):
+            assert await buffer.flush() == 0
+            delays.append(buffer._retry_at - asyncio.get_running_loop().time())
+
+        assert backend.batches == [8] * 5
+        assert [round(delay, 1) for delay in delays] == [0.5, 1.0, 2.0, 2.0, 2.0]
+        assert buffer.stats()["batch_limit"] == 8
+        assert buffer.stats()["pending"] == 8
+        assert buffer.stats()["dropped"] == 0
+
+        backend.down = False
+        assert await buffer.flush() == 8
+        assert backend.written == list(range(8))
+        assert buffer._retry_at == 0.0
+        assert buffer.stats()["failed_flushes"] == 5
+
+    asyncio.run(test())
+
+
+def test_unavailable_database_requeues_within_the_pending_bound(backend) -> None:
+    async def test() -> None:
+        buffer = _buffer(max_batch=4, max_pending=6)
+        _enqueue(buffer, range(6))
+        backend.down = True
+        flush = asyncio.ensure_future(buffer.flush())
+        await asyncio.sleep(0)
+        # Two new rows take the room of the in-flight batch, so only the oldest two of its four rows fit back in.
+        _enqueue(buffer, [6, 7])
+        assert await flush == 0
+
+        assert buffer.stats()["pending"] == 6
+        assert buffer.stats()["dropped"] == 2
+        backend.down = False
+        while await buffer.flush():
+            pass
+        assert backend.written == [0, 1, 4, 5, 6, 7]
+
+    asyncio.run(test())
+
+
+def test_rejected_row_is_isolated_and_dead_lettered(backend) -> None:
+    async def test() -> None:
+        backend.rejected = frozenset({3})
+        buffer = _buffer(max_failures=2)
+        _enqueue(buffer, range(8))
+        for _ in range(20):
+            if not buffer.stats()["pending"]:
+                break
+            await buffer.flush()
+
+        assert sorted(backend.written) == [0, 1, 2, 4, 5, 6, 7]
+        assert buffer.stats()["dead_lettered"] == 1
+        assert buffer.stats()["dropped"] == 1
+        assert buffer._retry_at == 0.0
+
+    asyncio.run(test())
+
+
+def test_flusher_waits_out_the_backoff(backend) -> None:
+    async def test() -> None:
+        buffer = _buffer(flush_interval=0.01, max_backoff=0.2)
+        backend.down = True
+        _enqueue(buffer, range(3))
+        buffer.start()
+        await asyncio.sleep(0.15)
+        # Retries after 0.01, 0.02, 0.04 and 0.08 seconds rather than on every flush interval.
+        assert 3 <= len(backend.batches) <= 8
+        backend.down = False
+        await buffer.stop()
+        assert backend.written == [0, 1, 2]
+
+    asyncio.run(test())
@@ -0,0 +1,58 @@
+"""
+The Prometheus text exposition rendered on `GET /metrics`.
+"""
+
+import project.instrumentation
+import project.server
+
+
+def _types(text: str) -> dict[str, str]:
+    types = {}
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, type = line.split(" ")
+            assert name not in types, f"{name} is declared twice"
+            types[name] = type
+    return types
+
+
+def test_collector_counters_get_a_total_suffix(monkeypatch) -> None:
+    for name in ("_collectors", "_collector_prefixes", "_collector_counters"):
+        monkeypatch.setattr(project.instrumentation, name, [])
+    project.instrumentation.register_collector(
+        "cache",
+        lambda: {"size": 3, "hits": 7, "latency_seconds_total": 0.5},
+        counters=("hits", "latency_seconds_total"),
+    )
+
+    text = project.instrumentation.render()
+
+    assert "# TYPE cache_size gauge\ncache_size 3\n" in text
+    assert "# TYPE cache_hits_total counter\ncache_hits_total 7\n" in text
+    assert (
+        "# TYPE cache_latency_seconds_total counter\ncache_latency_seconds_total 0.5\n"
+        in text
+    )
+
+
+def test_every_series_is_declared_and_counters_end_in_total() -> None:
+    text = project.instrumentation.render()
+    types = _types(text)
+
+    for name, type in types.items():
+        if type == "counter":
+            assert name.endswith("_total"), name
+    assert types["user_cache_hits_total"] == "counter"
+    assert types["user_cache_size"] == "gauge"
+    assert types["interaction_buffer_pending"] == "gauge"
+    assert types["interaction_buffer_flushed_total"] == "counter"
+    assert types["admission_read_admitted_total"] == "counter"
+    assert types["admission_read_running"] == "gauge"
+    assert types["cli_channel_connections_open"] == "gauge"
+    assert types["cli_channel_messages_total"] == "counter"
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name = line.split("{")[0].split(" ")[0]
+            declared = name.removesuffix("_bucket").removesuffix("_sum")
+            declared = declared.removesuffix("_count")
+            assert name in types or declared in types, line
@@ -0,0 +1,63 @@
+"""
+Login token buckets on the in-memory backend.
+"""
+
+import asyncio
+
+import project.rate_limiter
+
+
+def _limiter(**limits: float) -> project.rate_limiter.LoginRateLimiter:
+    settings = dict(
+        username_burst=10,
+        username_per_minute=1,
+        username_ip_burst=3,
+        username_ip_per_minute=1,
+        ip_burst=100,
+        ip_per_minute=1,
+    )
+    settings.update(limits)
+    return project.rate_limiter.LoginRateLimiter(
+        project.rate_limiter.MemoryBackend(1000), **settings
+    )
+
+
+def _attempts(
+    limiter: project.rate_limiter.LoginRateLimiter, logins: list[tuple[str, str]]
+) -> list[bool]:
+    async def run() -> list[bool]:
+        return [not await limiter.check(username, ip) for username, ip in logins]
+
+    return asyncio.run(run())
+
+
+def test_username_and_ip_pair_is_throttled_without_locking_out_other_addresses() -> (
+    None
+):
+    limiter = _limiter()
+    allowed = _attempts(limiter, [("Alice", "10.0.0.1")] * 4 + [("alice", "10.0.0.2")])
+    assert allowed == [True, True, True, False, True]
+
+
+def test_username_is_throttled_across_addresses() -> None:
+    limiter = _limiter()
+    allowed = _attempts(limiter, [("alice", f"10.0.0.{n}") for n in range(12)])
+    assert allowed == [True] * 10 + [False] * 2
+
+
+def test_ip_is_throttled_across_usernames() -> None:
+    limiter = _limiter(ip_burst=2)
+    allowed = _attempts(limiter, [(f"user{n}", "10.0.0.1") for n in range(3)])
+    assert allowed == [True, True, False]
+    assert limiter.stats()["blocked"] == 1
+
+
+def test_memory_backend_evicts_least_recently_used_buckets() -> None:
+    backend = project.rate_limiter.MemoryBackend(2)
+
+    async def run() -> None:
+        for key in ("a", "b", "c"):
+            await backend.take(key, 1, 1 / 60)
+
+    asyncio.run(run())
+    assert backend.size() == 2
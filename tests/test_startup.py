@@ -0,0 +1,38 @@
+"""
+Cold-start regression gate: a fresh process must import the app, run its lifespan startup and answer its first request
+within COLD_START_MAX_SECONDS.
+"""
+
+import os
+import pathlib
+import subprocess
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+MAX_SECONDS = float(os.getenv("COLD_START_MAX_SECONDS", "5"))
+
+
+def test_cold_start_within_budget(tmp_path: pathlib.Path) -> None:
+    env = dict(
+        os.environ,
+        STORAGE_BACKEND="sqlite",
+        SQLITE_PATH=str(tmp_path / "startup.db"),
+    )
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "project.launcher",
+            "--profile-startup",
+            "--max-seconds",
+            str(MAX_SECONDS),
+        ],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=max(60.0, MAX_SECONDS * 10),
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    assert "cold_start" in completed.stdout
@@ -0,0 +1,114 @@
+"""
+Concurrent and partial profile updates, and token revocation on password changes, against the SQLite storage
+backend.
+"""
+
+import asyncio
+import itertools
+
+import jwt
+import prisma.enums
+import project.auth
+import project.instrumentation
+import project.password_hasher
+import project.storage
+import pytest
+from project.updateUserDetails_service import updateUserDetails
+
+_emails = itertools.count()
+
+
+async def _create_user(password: str) -> tuple[project.storage.UserRecord, str]:
+    user = await project.storage.backend.create_user(
+        f"user{next(_emails)}@example.com",
+        await project.password_hasher.hash_password(password),
+        prisma.enums.Role.User,
+    )
+    return user, project.auth.issue_token(user)
+
+
+def _run(test) -> None:
+    async def run() -> None:
+        await project.storage.backend.connect()
+        try:
+            await test()
+        finally:
+            await project.storage.backend.disconnect()
+
+    asyncio.run(run())
+
+
+def test_concurrent_updates_to_the_same_email() -> None:
+    async def test() -> None:
+        (first, first_token), (second, second_token) = [
+            await _create_user("password") for _ in range(2)
+        ]
+        email = f"taken{next(_emails)}@example.com"
+        results = await asyncio.gather(
+            updateUserDetails(email, None, first_token),
+            updateUserDetails(email, None, second_token),
+        )
+        assert sorted(result.success for result in results) == [False, True]
+        loser = next(result for result in results if not result.success)
+        assert loser.message == "Email already in use."
+        owners = [
+            user.id
+            for user in [
+                await project.storage.backend.find_user_by_id(first.id),
+                await project.storage.backend.find_user_by_id(second.id),
+            ]
+            if user.email == email
+        ]
+        assert len(owners) == 1
+
+    _run(test)
+
+
+def test_partial_updates_leave_the_other_field_untouched() -> None:
+    async def test() -> None:
+        user, token = await _create_user("old password")
+        result = await updateUserDetails(None, "new password", token)
+        assert result.success
+        updated = await project.storage.backend.find_user_by_id(user.id)
+        assert updated.email == user.email
+        assert await project.password_hasher.check_password(
+            "new password", updated.password
+        )
+
+        # The password change revoked the token, so sign in again.
+        token = project.auth.issue_token(updated)
+        email = f"renamed{next(_emails)}@example.com"
+        result = await updateUserDetails(email, None, token)
+        assert result.success
+        renamed = await project.storage.backend.find_user_by_id(user.id)
+        assert renamed.email == email
+        assert renamed.password == updated.password
+
+    _run(test)
+
+
+def test_password_change_revokes_tokens_in_the_same_update() -> None:
+    async def test() -> None:
+        user, token = await _create_user("old password")
+        await project.auth.verify_token(token)
+
+        queries = project.instrumentation.db_query_count()
+        result = await updateUserDetails(None, "new password", token)
+        assert result.success
+        assert project.instrumentation.db_query_count() - queries == 1
+
+        updated = await project.storage.backend.find_user_by_id(user.id)
+        assert updated.tokenVersion == user.tokenVersion + 1
+        with pytest.raises(jwt.PyJWTError):
+            await project.auth.verify_token(token)
+        await project.auth.verify_token(project.auth.issue_token(updated))
+
+        # Changing only the email keeps the token valid.
+        token = project.auth.issue_token(updated)
+        result = await updateUserDetails(
+            f"kept{next(_emails)}@example.com", None, token
+        )
+        assert result.success
+        await project.auth.verify_token(token)
+
+    _run(test)